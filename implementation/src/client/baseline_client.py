@@ -8,6 +8,7 @@ class BaselineClient(ABC):
         :param model_path: Path to model (locally stored)
         """
         self.model_path = model_path
+        self.backend = "torch"
 
     @abstractmethod
     def get_relevance_scores(self, query, documents):
@@ -15,4 +16,46 @@ class BaselineClient(ABC):
 
     @abstractmethod
     def get_ranked_ids(self, relevance_scores, doc_ids):
-        pass
\ No newline at end of file
+        pass
+
+    def get_cache_key(self) -> str:
+        """
+        Get the key of the model in the score cache and the embedding store. Models with an optimized backend (e.g., int8) produce slightly different scores, so the backend is part of the key.
+
+        :return: Key of the model.
+        """
+        if self.backend == "torch":
+            return self.model_path
+        return f"{self.model_path}#{self.backend}"
+
+    def set_embedding_store(self, embedding_store_dir, folder_path_slrs, slr_name) -> None:
+        """
+        Select the store of document embeddings for an SLR. Only clients that encode documents independently of the query (e.g., ColBERT) use the store; the default ignores it.
+
+        :param embedding_store_dir: Root directory of the embedding stores (None to disable the store).
+        :param folder_path_slrs: Folder of the SLRs of the dataset.
+        :param slr_name: Name of the SLR.
+        """
+        pass
+
+    def get_cached_relevance_scores(self, query, documents, doc_ids, batch_size=32, score_cache=None):
+        """
+        Get relevance scores for the given query and documents. Scores that are stored in the score cache are reused; only the remaining documents are scored (and stored).
+
+        :param query: Query string
+        :param documents: List of document strings
+        :param doc_ids: List of document IDs
+        :param batch_size: The batch size for processing documents.
+        :param score_cache: RerankerScoreCache instance (None to score all documents).
+        :return: List of relevance scores
+        """
+        if score_cache is None:
+            return self.get_relevance_scores(query, documents, batch_size=batch_size)
+        relevance_scores = score_cache.get_scores(self.get_cache_key(), query, doc_ids, documents)
+        missing = [i for i, score in enumerate(relevance_scores) if score is None]
+        if len(missing) > 0:
+            missing_scores = self.get_relevance_scores(query, [documents[i] for i in missing], batch_size=batch_size)
+            score_cache.put_scores(self.get_cache_key(), query, [doc_ids[i] for i in missing], [documents[i] for i in missing], missing_scores)
+            for i, score in zip(missing, missing_scores):
+                relevance_scores[i] = score
+        return relevance_scores
@@ -0,0 +1,130 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+from typing import List
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.client.embedding_store import get_embedding_store
+from implementation.src.client.reranker_backend import DEFAULT_EXPORT_DIR, create_scoring_module, get_backend_device
+from implementation.src.client.token_batching import create_token_batches, get_token_budget, padding_statistics
+from implementation.src.utils.profiling import profiler
+
+MAX_LENGTH = 512
+
+
+class BiEncoderScoringModule(torch.nn.Module):
+    def __init__(self, model) -> None:
+        """
+        Initialize the BiEncoderScoringModule, which computes the normalized mean of the token embeddings (exported by the optimized backends).
+
+        :param model: Encoder model.
+        """
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        hidden_states = self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+        embeddings = (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return torch.nn.functional.normalize(embeddings, p=2, dim=1)
+
+
+class BiEncoderClient(BaselineClient):
+    def __init__(self, model_path, backend: str = "torch", export_dir: str = DEFAULT_EXPORT_DIR) -> None:
+        """
+        Initialize the BiEncoderClient (e.g., for SciBERT). Queries and documents are encoded independently into one vector (mean of the token embeddings),
+        and the relevance score is the cosine similarity of the vectors.
+
+        :param model_path: Path to the model directory
+        :param backend: Inference backend ("torch", "torch_int8", "onnx" or "onnx_int8").
+        :param export_dir: Directory of the exported models of the ONNX backends.
+        """
+        super().__init__(model_path)
+        self.backend = backend
+        self.device = get_backend_device(backend)
+        with profiler.span("reranker_load", model=self.model_path):
+            self.model = AutoModel.from_pretrained(self.model_path).to(self.device)
+            self.model.eval()
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+            example_inputs = dict(self.tokenizer(["example document"], return_tensors="pt"))
+            example_inputs = {name: example_inputs[name] for name in ["input_ids", "attention_mask"]}
+            self.scoring_module = create_scoring_module(BiEncoderScoringModule(self.model), example_inputs, {0: "batch"}, backend, self.model_path, type(self).__name__, export_dir)
+        self.dim = self.model.config.hidden_size
+        self.embedding_store = None
+
+    def set_embedding_store(self, embedding_store_dir, folder_path_slrs, slr_name) -> None:
+        """
+        Select the store of the document vectors of an SLR. Stored documents are not encoded again; only the query is encoded.
+
+        :param embedding_store_dir: Root directory of the embedding stores (None to disable the store).
+        :param folder_path_slrs: Folder of the SLRs of the dataset.
+        :param slr_name: Name of the SLR.
+        """
+        self.embedding_store = None
+        if embedding_store_dir is not None:
+            self.embedding_store = get_embedding_store(embedding_store_dir, self.get_cache_key(), folder_path_slrs, slr_name, self.dim)
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts into normalized vectors (mean pooling over the tokens that are not padding).
+
+        :param texts: A list of texts to encode.
+        :return: Array of shape (texts, dim).
+        """
+        with profiler.span("reranker_tokenization", items=len(texts)) as span:
+            inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="pt")
+            inputs = {key: value.to(self.device) for key, value in inputs.items()}
+            span["tokens"] = int(inputs["attention_mask"].sum())
+        with profiler.span("reranker_forward", items=len(texts), tokens=span["tokens"]):
+            with torch.no_grad():
+                embeddings = self.scoring_module(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+        return embeddings.float().cpu().numpy()
+
+    def encode_documents(self, documents: List[str], batch_size: int) -> np.ndarray:
+        """
+        Encode documents in batches of similar length (token budget of batch_size documents of maximal length).
+
+        :param documents: List of document strings.
+        :param batch_size: The batch size for encoding documents.
+        :return: Array of shape (documents, dim) in the order of the documents.
+        """
+        with profiler.span("reranker_tokenization", items=len(documents)):
+            lengths = [len(ids) for ids in self.tokenizer(documents, truncation=True, max_length=MAX_LENGTH)["input_ids"]]
+        embeddings = np.zeros((len(documents), self.dim), dtype=np.float32)
+        for batch_indices in create_token_batches(lengths, get_token_budget(batch_size, MAX_LENGTH)):
+            padding_statistics.update(type(self).__name__, [lengths[i] for i in batch_indices])
+            embeddings[batch_indices] = self.encode_texts([documents[i] for i in batch_indices])
+        return embeddings
+
+    def get_relevance_scores(self, query, documents, batch_size=32):
+        """
+        Get the relevance scores between the query and the documents.
+
+        :param query: The query (title + rqs or SLR).
+        :param documents: The documents (title + abstract for each paper).
+        :param batch_size: The batch size for encoding documents.
+        :return: The relevance scores.
+        """
+        query_embedding = self.encode_texts([query])[0]
+        if self.embedding_store is None:
+            return (self.encode_documents(documents, batch_size) @ query_embedding).tolist()
+
+        missing = [document for document, row in zip(documents, self.embedding_store.get_rows(documents)) if row is None]
+        if len(missing) > 0:
+            self.embedding_store.add(missing, list(self.encode_documents(missing, batch_size)))
+        with profiler.span("vector_similarity", items=len(documents)):
+            document_embeddings, _ = self.embedding_store.get_vectors(self.embedding_store.get_rows(documents))
+            return (document_embeddings @ query_embedding).tolist()
+
+    def get_ranked_ids(self, relevance_scores, doc_ids):
+        """
+        Create a list of document IDs ranked by relevance scores.
+
+        :param relevance_scores: The relevance scores.
+        :param doc_ids: The document IDs.
+        :return: The ranked document IDs.
+        """
+        ranked_indices = sorted(range(len(relevance_scores)), key=lambda i: relevance_scores[i], reverse=True)
+        return [doc_ids[i] for i in ranked_indices]
@@ -1,34 +1,47 @@
 import sys
 import os
 sys.path.append(os.getcwd())
-import bm25s
-import pandas as pd
+import numpy as np
 from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.utils.bm25_index import get_bm25_index
 
 class BM25Client(BaselineClient):
-    def __init__(self, model_path, ids) -> None:
+    def __init__(self, model_path, ids, index_root=None) -> None:
+        """
+        Initialize the BM25Client.
+
+        :param model_path: Not used here; only for compatibility
+        :param ids: Ids of the documents (in the order of the documents that are scored).
+        :param index_root: Directory of the saved BM25 indexes (None to keep the index only in memory).
+        """
         super().__init__(model_path)
         self.ids = ids
+        self.index_root = index_root
 
     def get_relevance_scores(self, query, documents, batch_size=None):
         """
-        Compute the relevance scores of the documents with respect to the query.
+        Compute the relevance scores of the documents with respect to the query. The documents are indexed once (per process, or once in total if an index root is set).
 
         :param query: The query string.
         :param documents: A list of document strings.
         :param batch_size: Not used here; only for compatibility
         :return: A list of relevance scores.
         """
-        corpus_json = []
-        for i in range(len(documents)):
-            corpus_json.append({"text": documents[i], "id": self.ids[i]})
-        corpus_text = [doc["text"] for doc in corpus_json]
-        corpus_tokens = bm25s.tokenize(corpus_text)
-        retriever = bm25s.BM25(corpus=corpus_json)
-        retriever.index(corpus_tokens)
+        index = get_bm25_index(self.ids, documents, self.index_root)
+        return index.get_scores(query).tolist()
+
+    def get_cached_relevance_scores(self, query, documents, doc_ids, batch_size=None, score_cache=None):
+        """
+        Compute the relevance scores of the documents with respect to the query. BM25 scores depend on the statistics of the whole corpus, so they are never cached.
 
-        results, _ = retriever.retrieve(bm25s.tokenize(query), k=len(documents))
-        return results
+        :param query: The query string.
+        :param documents: A list of document strings.
+        :param doc_ids: Not used here; only for compatibility
+        :param batch_size: Not used here; only for compatibility
+        :param score_cache: Not used here; only for compatibility
+        :return: A list of relevance scores.
+        """
+        return self.get_relevance_scores(query, documents, batch_size)
 
     def get_ranked_ids(self, relevance_scores, doc_ids):
         """
@@ -37,5 +50,5 @@ class BM25Client(BaselineClient):
         :param relevance_scores: A list of relevance scores.
         :param doc_ids: A list of document IDs.
         """
-        results = pd.DataFrame(relevance_scores[0].tolist())
-        return results["id"].astype(int).tolist()
\ No newline at end of file
+        ranked_indices = np.argsort(-np.asarray(relevance_scores), kind="stable")
+        return [int(doc_ids[i]) for i in ranked_indices]
@@ -1,54 +1,249 @@
 import sys
 import os
 sys.path.append(os.getcwd())
+import json
+import string
+from typing import Dict, List, Tuple
+import numpy as np
 import pandas as pd
 import torch
-from sklearn.metrics.pairwise import cosine_similarity
 import time
 from transformers import AutoTokenizer, AutoModel
 from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.client.embedding_store import get_embedding_store
+from implementation.src.client.reranker_backend import DEFAULT_EXPORT_DIR, create_scoring_module, get_backend_device
+from implementation.src.client.token_batching import create_token_batches, get_token_budget, padding_statistics, score_in_token_batches
+from implementation.src.utils.profiling import profiler
 
 MAX_LENGTH = 512
+# settings of ColBERTv2, used if the checkpoint does not provide its own (artifact.metadata)
+DEFAULT_COLBERT_SETTINGS = {
+    "dim": 128,
+    "query_maxlen": 32,
+    "doc_maxlen": 180,
+    "similarity": "cosine",
+    "mask_punctuation": True,
+    "attend_to_mask_tokens": False,
+    "query_token_id": "[unused0]",
+    "doc_token_id": "[unused1]",
+}
+
+
+def load_colbert_settings(model_path: str) -> Dict:
+    """
+    Load the settings of a ColBERT checkpoint (dimension of the projection, maximal query and document lengths, similarity function, ...).
+
+    :param model_path: Path to the ColBERT checkpoint.
+    :return: Dictionary with the settings.
+    """
+    settings = dict(DEFAULT_COLBERT_SETTINGS)
+    metadata_path = os.path.join(model_path, "artifact.metadata")
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r", encoding="utf-8") as file:
+            metadata = json.load(file)
+        settings.update({key: value for key, value in metadata.items() if key in settings})
+    return settings
+
+
+def load_projection_weight(model_path: str):
+    """
+    Load the weight of the linear projection of a ColBERT checkpoint (stored next to the BERT weights as "linear.weight").
+
+    :param model_path: Path to the ColBERT checkpoint.
+    :return: Weight tensor (dim x hidden size) or None if the checkpoint has no projection.
+    """
+    safetensors_path = os.path.join(model_path, "model.safetensors")
+    bin_path = os.path.join(model_path, "pytorch_model.bin")
+    if os.path.exists(safetensors_path):
+        from safetensors.torch import load_file
+        state_dict = load_file(safetensors_path)
+    elif os.path.exists(bin_path):
+        state_dict = torch.load(bin_path, map_location="cpu")
+    else:
+        return None
+    for key, value in state_dict.items():
+        if key == "linear.weight" or key.endswith(".linear.weight"):
+            return value
+    return None
+
+
+class ColBERTScoringModule(torch.nn.Module):
+    def __init__(self, model, projection) -> None:
+        """
+        Initialize the ColBERTScoringModule, which computes the projected and normalized token embeddings (exported by the optimized backends).
+
+        :param model: BERT model of the checkpoint.
+        :param projection: Linear projection of the checkpoint (None for no projection).
+        """
+        super().__init__()
+        self.model = model
+        self.projection = projection
+
+    def forward(self, input_ids, attention_mask):
+        embeddings = self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        if self.projection is not None:
+            embeddings = self.projection(embeddings)
+        return torch.nn.functional.normalize(embeddings, p=2, dim=2)
+
 
 class ColBERTClient(BaselineClient):
-    def __init__(self, model_path, dataframe: pd.DataFrame = None, query: str = None) -> None:
+    def __init__(self, model_path, dataframe: pd.DataFrame = None, query: str = None, backend: str = "torch", export_dir: str = DEFAULT_EXPORT_DIR) -> None:
         """
-        Initialize the ColBERTClient.
+        Initialize the ColBERTClient. Queries and documents are encoded into token embeddings (projected and normalized as configured in the checkpoint),
+        and the relevance score is the sum of the maximal similarity of each query token to the tokens of a document (late interaction).
+
+        :param model_path: Path to the ColBERT checkpoint.
+        :param dataframe: Dataframe of the papers (only needed for create_ranked_dataframe).
+        :param query: Query (only needed for create_ranked_dataframe).
+        :param backend: Inference backend ("torch", "torch_int8", "onnx" or "onnx_int8").
+        :param export_dir: Directory of the exported models of the ONNX backends.
         """
         super().__init__(model_path)
         self.dataframe = dataframe
         self.query = query
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = AutoModel.from_pretrained(self.model_path).to(self.device)
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        self.backend = backend
+        self.device = get_backend_device(backend)
+        self.settings = load_colbert_settings(self.model_path)
+        with profiler.span("reranker_load", model=self.model_path):
+            self.model = AutoModel.from_pretrained(self.model_path).to(self.device)
+            self.model.eval()
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+            weight = load_projection_weight(self.model_path)
+            self.projection = None
+            self.dim = self.model.config.hidden_size if weight is None else weight.shape[0]
+            self.embedding_store = None
+            if weight is not None:
+                self.projection = torch.nn.Linear(weight.shape[1], weight.shape[0], bias=False)
+                self.projection.weight.data.copy_(weight)
+                self.projection = self.projection.to(self.device)
+            else:
+                print(f"No ColBERT projection found in {self.model_path}; the hidden states are used without projection.")
+            example_inputs = dict(self.tokenizer(["example document"], return_tensors="pt"))
+            example_inputs = {name: example_inputs[name] for name in ["input_ids", "attention_mask"]}
+            self.scoring_module = create_scoring_module(
+                ColBERTScoringModule(self.model, self.projection), example_inputs, {0: "batch", 1: "sequence"}, backend, self.model_path, type(self).__name__, export_dir
+            )
+        self.query_marker_id = self.get_marker_id(self.settings["query_token_id"])
+        self.doc_marker_id = self.get_marker_id(self.settings["doc_token_id"])
+        self.skip_ids = set()
+        if self.settings["mask_punctuation"]:
+            for symbol in string.punctuation:
+                self.skip_ids.update(self.tokenizer.encode(symbol, add_special_tokens=False))
 
-    def colbert_late_interaction(self, query_embedding, document_embeddings):
+    def set_embedding_store(self, embedding_store_dir, folder_path_slrs, slr_name) -> None:
         """
-        Compute the relevance scores between the query and the documents using the ColBERT model.
+        Select the store of the token embeddings of the documents of an SLR. Stored documents are not encoded again; only the query is encoded.
 
-        :param query_embedding: The query embedding.
-        :param document_embeddings: The document embeddings.
+        :param embedding_store_dir: Root directory of the embedding stores (None to disable the store).
+        :param folder_path_slrs: Folder of the SLRs of the dataset.
+        :param slr_name: Name of the SLR.
         """
-        scores = []
-        query_embedding = query_embedding.squeeze(0)
-        query_embedding_np = query_embedding.cpu().numpy()
-
-        for doc_emb in document_embeddings:
-            doc_emb_np = doc_emb.cpu().numpy()
-            
-            if query_embedding_np.ndim == 1:
-                query_embedding_np = query_embedding_np.reshape(1, -1)
-            if doc_emb_np.ndim == 1:
-                doc_emb_np = doc_emb_np.reshape(1, -1)
-            
-            sim_matrix = cosine_similarity(query_embedding_np, doc_emb_np)
-            
-            max_sim = torch.tensor(sim_matrix.max(axis=1)).float()
-            
-            scores.append(torch.sum(max_sim).item())
-        
-        return scores
-    
+        self.embedding_store = None
+        if embedding_store_dir is not None:
+            self.embedding_store = get_embedding_store(embedding_store_dir, self.get_cache_key(), folder_path_slrs, slr_name, self.dim)
+
+    def get_marker_id(self, token) -> int:
+        """
+        Get the id of a marker token ([Q] or [D]), which is inserted after the [CLS] token.
+
+        :param token: Marker token or its id.
+        :return: Id of the marker token or None if the tokenizer does not know the token.
+        """
+        if isinstance(token, int):
+            return token
+        token_id = self.tokenizer.convert_tokens_to_ids(token)
+        if token_id is None or token_id == self.tokenizer.unk_token_id:
+            return None
+        return token_id
+
+    def tokenize(self, texts: List[str], marker_id, max_length: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Tokenize texts and insert the marker token after the [CLS] token.
+
+        :param texts: Texts that should be tokenized.
+        :param marker_id: Id of the marker token (None for no marker).
+        :param max_length: Maximal number of tokens (including the marker token).
+        :return: Input ids and attention mask.
+        """
+        num_markers = 1 if marker_id is not None else 0
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=max_length - num_markers, return_tensors="pt")
+        input_ids, attention_mask = inputs["input_ids"], inputs["attention_mask"]
+        if marker_id is not None:
+            markers = torch.full((input_ids.shape[0], 1), marker_id, dtype=input_ids.dtype)
+            input_ids = torch.cat([input_ids[:, :1], markers, input_ids[:, 1:]], dim=1)
+            attention_mask = torch.cat([attention_mask[:, :1], torch.ones_like(markers), attention_mask[:, 1:]], dim=1)
+        return input_ids, attention_mask
+
+    def embed(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """
+        Compute the normalized token embeddings.
+
+        :param input_ids: Input ids.
+        :param attention_mask: Attention mask.
+        :return: Tensor of shape (texts, tokens, dim).
+        """
+        with profiler.span("reranker_forward", items=input_ids.shape[0], tokens=int(attention_mask.sum())):
+            with torch.no_grad():
+                return self.scoring_module(input_ids=input_ids.to(self.device), attention_mask=attention_mask.to(self.device))
+
+    def encode_query(self, query: str) -> torch.Tensor:
+        """
+        Encode a query into token embeddings. The query is padded with [MASK] tokens to the maximal query length (query augmentation).
+
+        :param query: Query string.
+        :return: Tensor of shape (query tokens, dim).
+        """
+        with profiler.span("reranker_tokenization", items=1):
+            input_ids, attention_mask = self.tokenize([query], self.query_marker_id, self.settings["query_maxlen"])
+            padding = self.settings["query_maxlen"] - input_ids.shape[1]
+            if padding > 0:
+                input_ids = torch.cat([input_ids, torch.full((1, padding), self.tokenizer.mask_token_id, dtype=input_ids.dtype)], dim=1)
+                attention_mask = torch.cat([attention_mask, torch.full((1, padding), int(self.settings["attend_to_mask_tokens"]), dtype=attention_mask.dtype)], dim=1)
+        return self.embed(input_ids, attention_mask)[0]
+
+    def encode_documents(self, documents: List[str]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Encode documents into token embeddings.
+
+        :param documents: List of document strings.
+        :return: Tensor of shape (documents, tokens, dim) and mask of the tokens that take part in the late interaction (no padding and, if configured, no punctuation).
+        """
+        with profiler.span("reranker_tokenization", items=len(documents)):
+            input_ids, attention_mask = self.tokenize(documents, self.doc_marker_id, min(self.settings["doc_maxlen"], MAX_LENGTH))
+            mask = attention_mask.bool()
+            if len(self.skip_ids) > 0:
+                mask &= ~torch.isin(input_ids, torch.tensor(sorted(self.skip_ids), dtype=input_ids.dtype))
+        return self.embed(input_ids, attention_mask), mask.to(self.device)
+
+    def get_document_lengths(self, documents: List[str]) -> List[int]:
+        """
+        Get the number of tokens of each document (including the marker token), which is used to batch documents of similar length.
+
+        :param documents: List of document strings.
+        :return: List with the number of tokens of each document.
+        """
+        num_markers = 1 if self.doc_marker_id is not None else 0
+        max_length = min(self.settings["doc_maxlen"], MAX_LENGTH) - num_markers
+        with profiler.span("reranker_tokenization", items=len(documents)):
+            return [len(ids) + num_markers for ids in self.tokenizer(documents, truncation=True, max_length=max_length)["input_ids"]]
+
+    def colbert_late_interaction(self, query_embedding: torch.Tensor, document_embeddings: torch.Tensor, document_mask: torch.Tensor) -> List[float]:
+        """
+        Compute the relevance scores between the query and a batch of documents (MaxSim): for each query token the maximal similarity to the tokens of the
+        document is taken, and these maxima are summed up.
+
+        :param query_embedding: Query embeddings of shape (query tokens, dim).
+        :param document_embeddings: Document embeddings of shape (documents, tokens, dim).
+        :param document_mask: Mask of the document tokens of shape (documents, tokens).
+        :return: List of relevance scores.
+        """
+        query_embedding = query_embedding.to(document_embeddings.dtype)
+        similarities = torch.einsum("qd,btd->bqt", query_embedding, document_embeddings)
+        if self.settings["similarity"] == "l2":
+            similarities = 2 * similarities - (query_embedding ** 2).sum(-1)[None, :, None] - (document_embeddings ** 2).sum(-1)[:, None, :]
+        similarities = similarities.masked_fill(~document_mask[:, None, :], float("-inf"))
+        return similarities.max(dim=2).values.sum(dim=1).tolist()
+
     def create_ranked_dataframe(self):
         """
         Create a DataFrame of the ranked documents based on the relevance scores.
@@ -60,56 +255,64 @@ class ColBERTClient(BaselineClient):
         doc_texts = [str(row["title"]) + " " + str(row["abstract"]) for _, row in self.dataframe.iterrows()]
         doc_ids = self.dataframe["id"].apply(str).to_list()
 
-        query_embedding = self.encode_texts([self.query])
-        document_embeddings = self.encode_texts(doc_texts)
-        scores = self.colbert_late_interaction(query_embedding, document_embeddings)
-
-
-        ranked_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
-
-        result_ids = [doc_ids[i] for i in ranked_indices]
+        scores = self.get_relevance_scores(self.query, doc_texts)
+        result_ids = self.get_ranked_ids(scores, doc_ids)
         elapsed_time = time.time() - start_time
         result_df = pd.DataFrame({"id": result_ids})
         result_df["id"] = pd.to_numeric(result_df["id"])
         result_df = pd.merge(result_df, self.dataframe, how="inner", on="id")
         return result_df, elapsed_time
-    
-    def encode_texts(self, texts):
-        """
-        Encode a list of texts into embeddings.
-        
-        :param texts: A list of texts to encode.
-        :return: A tensor of embeddings.
-        """
-        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=512, return_tensors='pt')
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-        embeddings = outputs.last_hidden_state[:, 0, :]
-        return embeddings
-    
+
     def get_relevance_scores(self, query, documents, batch_size=32):
         """
         Get the relevance scores between the query and the documents.
 
         :param query: The query (title + rqs or SLR).
         :param documents: The documents (title + abstract for each paper).
-        :param batch_size: The batch size for encoding documents.
+        :param batch_size: The batch size for encoding documents (documents are batched by length with a token budget of batch_size documents of maximal length).
         :return: The relevance scores.
         """
-        query_embedding = self.encode_texts([query])
+        query_embedding = self.encode_query(query)
+        if self.embedding_store is not None:
+            return self.get_relevance_scores_from_store(query_embedding, documents, batch_size)
 
-        scores = []
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            batch_embeddings = self.encode_texts(batch)
+        def score_batch(batch_indices):
+            document_embeddings, document_mask = self.encode_documents([documents[i] for i in batch_indices])
+            with profiler.span("late_interaction", items=document_embeddings.shape[0]):
+                return self.colbert_late_interaction(query_embedding, document_embeddings, document_mask)
 
-            if batch_embeddings is None or len(batch_embeddings) == 0:
-                continue
-            
-            batch_scores = self.colbert_late_interaction(query_embedding, batch_embeddings)
-            scores.extend(batch_scores)
+        token_budget = get_token_budget(batch_size, min(self.settings["doc_maxlen"], MAX_LENGTH))
+        return score_in_token_batches(type(self).__name__, self.get_document_lengths(documents), score_batch, token_budget)
 
+    def get_relevance_scores_from_store(self, query_embedding: torch.Tensor, documents: List[str], batch_size: int, chunk_size: int = 1024) -> List[float]:
+        """
+        Get the relevance scores with the embedding store. Documents that are not stored yet are encoded and added (only the tokens that take part in the late interaction).
+        Afterwards, the query is multiplied with the stored token embeddings of all documents, and the maxima are taken per document segment.
+
+        :param query_embedding: Query embeddings of shape (query tokens, dim).
+        :param documents: The documents (title + abstract for each paper).
+        :param batch_size: The batch size for encoding documents.
+        :param chunk_size: Number of documents whose token embeddings are loaded at once.
+        :return: The relevance scores.
+        """
+        missing = [document for document, row in zip(documents, self.embedding_store.get_rows(documents)) if row is None]
+        lengths = self.get_document_lengths(missing)
+        for batch_indices in create_token_batches(lengths, get_token_budget(batch_size, min(self.settings["doc_maxlen"], MAX_LENGTH))):
+            padding_statistics.update(type(self).__name__, [lengths[i] for i in batch_indices])
+            batch = [missing[i] for i in batch_indices]
+            document_embeddings, document_mask = self.encode_documents(batch)
+            self.embedding_store.add(batch, [embeddings[mask].cpu().numpy() for embeddings, mask in zip(document_embeddings, document_mask)])
+
+        query_np = query_embedding.float().cpu().numpy()
+        rows = self.embedding_store.get_rows(documents)
+        scores = []
+        for i in range(0, len(rows), chunk_size):
+            with profiler.span("late_interaction", items=len(rows[i:i + chunk_size])):
+                vectors, segment_starts = self.embedding_store.get_vectors(rows[i:i + chunk_size])
+                similarities = vectors @ query_np.T
+                if self.settings["similarity"] == "l2":
+                    similarities = 2 * similarities - (query_np ** 2).sum(-1)[None, :] - (vectors ** 2).sum(-1)[:, None]
+                scores.extend(np.maximum.reduceat(similarities, segment_starts, axis=0).sum(axis=1).tolist())
         return scores
 
     def get_ranked_ids(self, relevance_scores, doc_ids):
@@ -122,4 +325,4 @@ class ColBERTClient(BaselineClient):
         """
         ranked_indices = sorted(range(len(relevance_scores)), key=lambda i: relevance_scores[i], reverse=True)
         result_ids = [doc_ids[i] for i in ranked_indices]
-        return result_ids
\ No newline at end of file
+        return result_ids
@@ -0,0 +1,156 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import fcntl
+import hashlib
+import json
+import tempfile
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+EMBEDDINGS_FILE = "embeddings.f16"
+OFFSETS_FILE = "offsets.npy"
+INDEX_FILE = "index.json"
+
+
+def hash_document(document: str) -> str:
+    """
+    Hash the text of a document (key of the embedding store).
+
+    :param document: Text of the document.
+    :return: SHA-256 hash of the text.
+    """
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+def get_dataset_name(folder_path_slrs: str) -> str:
+    """
+    Derive the name of a dataset from the folder of its SLRs (e.g., "./implementation/data/tar2019/qualitative/" -> "tar2019_qualitative").
+
+    :param folder_path_slrs: Folder of the SLRs of the dataset.
+    :return: Name of the dataset.
+    """
+    parts = os.path.normpath(folder_path_slrs).split(os.sep)
+    return "_".join(parts[-2:])
+
+
+class EmbeddingStore:
+    def __init__(self, store_dir: str, dim: int) -> None:
+        """
+        Initialize the EmbeddingStore class. Document embeddings are stored as one memory-mapped float16 array, and the rows of each document are given by offsets,
+        so that documents can have a variable number of vectors (token embeddings of ColBERT or a single vector of a bi-encoder). Documents are identified by the hash of their text.
+
+        :param store_dir: Directory of the store (one per model, dataset and SLR).
+        :param dim: Dimension of the embeddings.
+        """
+        self.store_dir = store_dir
+        self.dim = dim
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.embeddings: Optional[np.memmap] = None
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.index: Dict[str, int] = {}
+        self.load()
+
+    def load(self) -> None:
+        """
+        Load the offsets and the index of the store and map the embeddings into memory.
+        """
+        index_path = os.path.join(self.store_dir, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "r", encoding="utf-8") as file:
+            index = json.load(file)
+        if index["dim"] != self.dim:
+            raise ValueError(f"Embedding store {self.store_dir} has dimension {index['dim']}, expected {self.dim}")
+        self.offsets = np.load(os.path.join(self.store_dir, OFFSETS_FILE))
+        self.index = {document_hash: row for row, document_hash in enumerate(index["hashes"])}
+        self.embeddings = None
+        if self.offsets[-1] > 0:
+            self.embeddings = np.memmap(os.path.join(self.store_dir, EMBEDDINGS_FILE), dtype=np.float16, mode="r", shape=(int(self.offsets[-1]), self.dim))
+
+    def get_rows(self, documents: List[str]) -> List[Optional[int]]:
+        """
+        Look up the rows of documents.
+
+        :param documents: Texts of the documents.
+        :return: List with the row of each document (None if the document is not stored).
+        """
+        return [self.index.get(hash_document(document)) for document in documents]
+
+    def get_vectors(self, rows: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the embeddings of documents as one matrix.
+
+        :param rows: Rows of the documents.
+        :return: Float32 matrix with the vectors of all documents (concatenated) and the index of the first vector of each document in this matrix.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        starts, ends = self.offsets[rows], self.offsets[rows + 1]
+        lengths = ends - starts
+        segment_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        vector_ids = np.repeat(starts - segment_starts, lengths) + np.arange(int(lengths.sum()))
+        return np.asarray(self.embeddings[vector_ids], dtype=np.float32), segment_starts
+
+    def add(self, documents: List[str], embeddings: List[np.ndarray]) -> None:
+        """
+        Append the embeddings of documents to the store. Several processes can add to the same store; writers are serialized by a file lock,
+        and the offsets and the index are replaced atomically.
+
+        :param documents: Texts of the documents.
+        :param embeddings: Embeddings of each document (array of shape (vectors, dim)).
+        """
+        with open(os.path.join(self.store_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # other processes may have added documents in the meantime
+                self.load()
+                hashes = [None] * len(self.index)
+                for document_hash, row in self.index.items():
+                    hashes[row] = document_hash
+                offsets = list(self.offsets)
+                with open(os.path.join(self.store_dir, EMBEDDINGS_FILE), "ab") as file:
+                    # remove vectors of an interrupted write that are not referenced by the offsets
+                    file.truncate(int(offsets[-1]) * self.dim * np.dtype(np.float16).itemsize)
+                    for document, embedding in zip(documents, embeddings):
+                        document_hash = hash_document(document)
+                        if document_hash in self.index:
+                            continue
+                        embedding = np.asarray(embedding, dtype=np.float16).reshape(-1, self.dim)
+                        file.write(embedding.tobytes())
+                        self.index[document_hash] = len(hashes)
+                        hashes.append(document_hash)
+                        offsets.append(offsets[-1] + embedding.shape[0])
+                self.write_atomic(OFFSETS_FILE, lambda file: np.save(file, np.asarray(offsets, dtype=np.int64)))
+                self.write_atomic(INDEX_FILE, lambda file: file.write(json.dumps({"dim": self.dim, "hashes": hashes}).encode("utf-8")))
+                self.load()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write_atomic(self, file_name: str, write) -> None:
+        """
+        Write a file of the store to a temporary file and rename it afterwards.
+
+        :param file_name: Name of the file.
+        :param write: Function that writes the content to the (binary) file object.
+        """
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            write(file)
+        os.replace(temp_path, os.path.join(self.store_dir, file_name))
+
+
+def get_embedding_store(root_dir: str, model_path: str, folder_path_slrs: str, slr_name: str, dim: int) -> EmbeddingStore:
+    """
+    Get the embedding store of a model, dataset and SLR.
+
+    :param root_dir: Root directory of all embedding stores.
+    :param model_path: Path to the model.
+    :param folder_path_slrs: Folder of the SLRs of the dataset.
+    :param slr_name: Name of the SLR.
+    :param dim: Dimension of the embeddings.
+    :return: EmbeddingStore.
+    """
+    model_name = os.path.basename(os.path.normpath(model_path)) + "_" + hashlib.sha256(model_path.encode("utf-8")).hexdigest()[:8]
+    return EmbeddingStore(os.path.join(root_dir, model_name, get_dataset_name(folder_path_slrs), slr_name), dim)
@@ -4,6 +4,7 @@ sys.path.append(os.getcwd())
 from implementation.src.config.config import Config
 import torch
 from vllm import LLM, SamplingParams
+from implementation.src.client.response_cache import CachedLLM, ResponseCache
 
 class LocalClient():
     def __init__(self, config: Config) -> None:
@@ -17,6 +18,11 @@ class LocalClient():
         self.path_to_model = self.config.llm_client_config.path_to_model
         print(f"torch count: {torch.cuda.device_count()}")
         self.client = LLM(model=self.path_to_model, tokenizer=self.path_to_model, tensor_parallel_size=torch.cuda.device_count(), gpu_memory_utilization=0.95, max_model_len=20000, enable_prefix_caching=True, enable_chunked_prefill=True, max_num_batched_tokens=1024)
+        response_cache_dir = self.config.llm_client_config.response_cache_dir
+        if response_cache_dir is not None:
+            # deterministic responses are served from the cache instead of being generated again
+            response_cache = ResponseCache(response_cache_dir, int(self.config.llm_client_config.response_cache_max_size_gb * 1e9))
+            self.client = CachedLLM(self.client, response_cache, self.path_to_model)
 
     def send_test_prompt(self) -> None:
         """
@@ -4,50 +4,73 @@ import torch
 sys.path.append(os.getcwd())
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.client.reranker_backend import DEFAULT_EXPORT_DIR, create_scoring_module, get_backend_device
+from implementation.src.client.token_batching import get_token_budget, score_in_token_batches
+from implementation.src.utils.profiling import profiler
+
+class MonoBERTScoringModule(torch.nn.Module):
+    def __init__(self, model) -> None:
+        """
+        Initialize the MonoBERTScoringModule, which returns the logits of the classification model (exported by the optimized backends).
+
+        :param model: Sequence classification model.
+        """
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids).logits
+
 
 class MonoBERTClient(BaselineClient):
-    def __init__(self, model_path) -> None:
+    def __init__(self, model_path, backend: str = "torch", export_dir: str = DEFAULT_EXPORT_DIR) -> None:
         """
         Initialize the MonoBERTClient with the model path
 
         :param model_path: Path to the model directory
+        :param backend: Inference backend ("torch", "torch_int8", "onnx" or "onnx_int8").
+        :param export_dir: Directory of the exported models of the ONNX backends.
         """
         super().__init__(model_path)
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_path).to(self.device)
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        self.backend = backend
+        self.device = get_backend_device(backend)
+        with profiler.span("reranker_load", model=self.model_path):
+            self.model = AutoModelForSequenceClassification.from_pretrained(self.model_path).to(self.device)
+            self.model.eval()
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+            example_inputs = dict(self.tokenizer(["example query"], ["example document"], return_tensors="pt"))
+            example_inputs = {name: example_inputs[name] for name in ["input_ids", "attention_mask", "token_type_ids"] if name in example_inputs}
+            self.scoring_module = create_scoring_module(MonoBERTScoringModule(self.model), example_inputs, {0: "batch"}, backend, self.model_path, type(self).__name__, export_dir)
 
     def get_relevance_scores(self, query, documents, batch_size=32):
         """
-        Get relevance scores for the given query and documents
+        Get relevance scores for the given query and documents. The query-document pairs are tokenized once, sorted by their length and
+        batched by a token budget (batch_size sequences of maximal length), so that the batches contain little padding.
 
         :param query: Query string
         :param documents: List of document strings
         :param batch_size: The batch size for processing documents.
         :return: List of relevance scores
         """
-        relevance_scores = []
+        with profiler.span("reranker_tokenization", items=len(documents)) as span:
+            encodings = self.tokenizer([query] * len(documents), documents, truncation=True, max_length=512)
+            lengths = [len(ids) for ids in encodings["input_ids"]]
+            span["tokens"] = sum(lengths)
 
-        for i in range(0, len(documents), batch_size):
-            batch_documents = documents[i:i + batch_size]
-            
-            inputs = self.tokenizer([query] * len(batch_documents), batch_documents, padding=True, truncation=True, max_length=512, return_tensors='pt')
+        def score_batch(batch_indices):
+            inputs = self.tokenizer.pad({key: [values[i] for i in batch_indices] for key, values in encodings.items()}, return_tensors="pt")
             inputs = {key: value.to(self.device) for key, value in inputs.items()}
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-
-            logits = outputs.logits
+            with profiler.span("reranker_forward", items=len(batch_indices), tokens=sum(lengths[i] for i in batch_indices), padded_tokens=int(inputs["attention_mask"].numel())):
+                with torch.no_grad():
+                    logits = self.scoring_module(**inputs)
             if logits.dim() > 1:
                 logits = logits.squeeze(-1)
-
             batch_scores = logits.tolist()
             if isinstance(batch_scores, float):
                 batch_scores = [batch_scores]
+            return batch_scores
 
-            relevance_scores.extend(batch_scores)
-
-        return relevance_scores
+        return score_in_token_batches(type(self).__name__, lengths, score_batch, get_token_budget(batch_size))
 
     def get_ranked_ids(self, relevance_scores, doc_ids):
         """
@@ -2,46 +2,84 @@ import sys
 import os
 sys.path.append(os.getcwd())
 import torch
-from transformers import T5Tokenizer, T5ForConditionalGeneration
+from transformers import T5TokenizerFast, T5ForConditionalGeneration
 from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.client.reranker_backend import DEFAULT_EXPORT_DIR, create_scoring_module, get_backend_device
+from implementation.src.client.token_batching import get_token_budget, score_in_token_batches
+from implementation.src.utils.profiling import profiler
+
+class MonoT5ScoringModule(torch.nn.Module):
+    def __init__(self, model, true_token_id: int, false_token_id: int, decoder_start_token_id: int) -> None:
+        """
+        Initialize the MonoT5ScoringModule, which computes the difference of the logits of "true" and "false" in the first decoder step (exported by the optimized backends).
+
+        :param model: T5 model.
+        :param true_token_id: Id of the "true" token.
+        :param false_token_id: Id of the "false" token.
+        :param decoder_start_token_id: Id of the start token of the decoder.
+        """
+        super().__init__()
+        self.model = model
+        self.true_token_id = true_token_id
+        self.false_token_id = false_token_id
+        self.decoder_start_token_id = decoder_start_token_id
+
+    def forward(self, input_ids, attention_mask):
+        decoder_input_ids = torch.ones_like(input_ids[:, :1]) * self.decoder_start_token_id
+        logits = self.model(input_ids=input_ids, attention_mask=attention_mask, decoder_input_ids=decoder_input_ids).logits[:, 0, :]
+        return logits[:, self.true_token_id] - logits[:, self.false_token_id]
+
 
 class MonoT5Client(BaselineClient):
-    def __init__(self, model_path) -> None:
+    def __init__(self, model_path, backend: str = "torch", export_dir: str = DEFAULT_EXPORT_DIR) -> None:
+        """
+        Initialize the MonoT5Client with the model path. The ids of the "true" and "false" tokens and the start token of the decoder are resolved once.
+
+        :param model_path: Path to the model directory
+        :param backend: Inference backend ("torch", "torch_int8", "onnx" or "onnx_int8").
+        :param export_dir: Directory of the exported models of the ONNX backends.
+        """
         super().__init__(model_path)
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = T5ForConditionalGeneration.from_pretrained(self.model_path).to(self.device)
-        self.tokenizer = T5Tokenizer.from_pretrained(self.model_path, legacy=False)
+        self.backend = backend
+        self.device = get_backend_device(backend)
+        with profiler.span("reranker_load", model=self.model_path):
+            self.model = T5ForConditionalGeneration.from_pretrained(self.model_path).to(self.device)
+            self.model.eval()
+            self.tokenizer = T5TokenizerFast.from_pretrained(self.model_path)
+            self.true_token_id = self.tokenizer.convert_tokens_to_ids("▁true")
+            self.false_token_id = self.tokenizer.convert_tokens_to_ids("▁false")
+            self.decoder_start_token_id = self.model.config.decoder_start_token_id
+            example_inputs = dict(self.tokenizer(["Query: example query Document: example document Relevant:"], return_tensors="pt"))
+            example_inputs = {name: example_inputs[name] for name in ["input_ids", "attention_mask"]}
+            scoring_module = MonoT5ScoringModule(self.model, self.true_token_id, self.false_token_id, self.decoder_start_token_id)
+            self.scoring_module = create_scoring_module(scoring_module, example_inputs, {0: "batch"}, backend, self.model_path, type(self).__name__, export_dir)
 
     def get_relevance_scores(self, query, documents, batch_size=32):
         """
-        Get relevance scores for each document in the list of documents
+        Get relevance scores for each document in the list of documents. The score is the difference of the logits of "true" and "false"
+        in the first decoder step (the same scores as the first step of generate). Documents are sorted by their length and batched by a token budget
+        (batch_size sequences of maximal length), so that the batches contain little padding.
 
         :param query: The query string
         :param documents: A list of document strings
         :param batch_size: The size of each batch
         :return: A list of relevance scores for each document
         """
-        relevance_scores = []
-        for doc in documents:
-            input_text = f"Query: {query} Document: {doc} Relevant:"
-            inputs = self.tokenizer.encode(input_text, return_tensors="pt", truncation=True, max_length=512)
-            inputs = inputs.to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model.generate(inputs, max_length=2, return_dict_in_generate=True, output_scores=True)
-
-            logits = outputs.scores[0].squeeze()
-
-            true_token_id = self.tokenizer.convert_tokens_to_ids("▁true")
-            false_token_id = self.tokenizer.convert_tokens_to_ids("▁false")
-            
-            true_logit = logits[true_token_id].item()
-            false_logit = logits[false_token_id].item()
-            
-            relevance_score = true_logit - false_logit
-            relevance_scores.append(relevance_score)
-        
-        return relevance_scores
+        input_texts = [f"Query: {query} Document: {doc} Relevant:" for doc in documents]
+        with profiler.span("reranker_tokenization", items=len(input_texts)) as span:
+            input_ids = self.tokenizer(input_texts, truncation=True, max_length=512)["input_ids"]
+            lengths = [len(ids) for ids in input_ids]
+            span["tokens"] = sum(lengths)
+
+        def score_batch(batch_indices):
+            inputs = self.tokenizer.pad({"input_ids": [input_ids[i] for i in batch_indices]}, return_tensors="pt")
+            inputs = {key: value.to(self.device) for key, value in inputs.items()}
+
+            with profiler.span("reranker_forward", items=len(batch_indices), tokens=sum(lengths[i] for i in batch_indices), padded_tokens=int(inputs["attention_mask"].numel())):
+                with torch.no_grad():
+                    return self.scoring_module(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]).tolist()
+
+        return score_in_token_batches(type(self).__name__, lengths, score_batch, get_token_budget(batch_size))
 
 
     def get_ranked_ids(self, relevance_scores, doc_ids):
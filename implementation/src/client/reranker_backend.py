@@ -0,0 +1,251 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import hashlib
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+import torch
+from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.utils.profiling import profiler
+
+RERANKER_BACKENDS = ["torch", "torch_int8", "onnx", "onnx_int8"]
+ONNX_OPSET_VERSION = 17
+DEFAULT_EXPORT_DIR = "./cache/reranker_exports"
+# protobuf can not serialize models of 2 GB or more (e.g., monoT5-3B), their weights are stored in an external data file next to the model
+MAX_PROTOBUF_SIZE = 2 ** 31
+
+
+def get_backend_device(backend: str) -> torch.device:
+    """
+    Get the device of a backend. Only the plain PyTorch backend uses the GPU; the other backends are optimized for CPU inference.
+
+    :param backend: Name of the backend.
+    :return: Device of the model.
+    """
+    if backend not in RERANKER_BACKENDS:
+        raise ValueError(f"Unknown reranker backend {backend}, expected one of {RERANKER_BACKENDS}")
+    if backend == "torch" and torch.cuda.is_available():
+        return torch.device("cuda")
+    return torch.device("cpu")
+
+
+def get_export_path(export_dir: str, model_path: str, name: str, quantized: bool) -> str:
+    """
+    Get the path of the exported ONNX model of a reranker.
+
+    :param export_dir: Directory of the exported models.
+    :param model_path: Path to the reranker model.
+    :param name: Name of the exported module (e.g., the name of the client).
+    :param quantized: True for the int8 model.
+    :return: Path of the ONNX file.
+    """
+    model_name = os.path.basename(os.path.normpath(model_path)) + "_" + hashlib.sha256(model_path.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(export_dir, model_name, name + ("_int8" if quantized else "") + ".onnx")
+
+
+class OnnxScoringModule:
+    def __init__(self, model_file: str, input_names: List[str]) -> None:
+        """
+        Initialize the OnnxScoringModule class, which runs an exported reranker with ONNX Runtime and can be called like the PyTorch module it replaces.
+
+        :param model_file: Path of the ONNX file.
+        :param input_names: Names of the inputs of the model.
+        """
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_file, session_options, providers=["CPUExecutionProvider"])
+        self.input_names = input_names
+
+    def __call__(self, **inputs) -> torch.Tensor:
+        """
+        Run the model.
+
+        :param inputs: Input tensors (inputs that the exported model does not use are ignored).
+        :return: Output tensor.
+        """
+        feeds = {name: inputs[name].cpu().numpy() for name in self.input_names}
+        return torch.from_numpy(self.session.run(None, feeds)[0])
+
+
+def get_module_size(module: torch.nn.Module) -> int:
+    """
+    Get the size of the parameters and buffers of a module.
+
+    :param module: PyTorch module.
+    :return: Size in bytes.
+    """
+    return sum(tensor.numel() * tensor.element_size() for tensor in list(module.parameters()) + list(module.buffers()))
+
+
+def get_external_data_path(model_file: str) -> str:
+    """
+    Get the path of the external data file of an ONNX model (the file name is stored relative to the model in the model).
+
+    :param model_file: Path of the ONNX file.
+    :return: Path of the external data file.
+    """
+    return model_file + ".data"
+
+
+def move_onnx_files(temp_dir: str, model_file: str) -> None:
+    """
+    Move an ONNX model that was written to a temporary directory (with the final file name) to its path. The external data file is moved before the model,
+    so that the model is only found once its weights are complete.
+
+    :param temp_dir: Temporary directory.
+    :param model_file: Path of the ONNX file.
+    """
+    temp_path = os.path.join(temp_dir, os.path.basename(model_file))
+    if os.path.exists(get_external_data_path(temp_path)):
+        os.replace(get_external_data_path(temp_path), get_external_data_path(model_file))
+    os.replace(temp_path, model_file)
+
+
+def export_to_onnx(module: torch.nn.Module, example_inputs: Dict[str, torch.Tensor], output_axes: Dict[int, str], model_file: str) -> None:
+    """
+    Export a scoring module to ONNX with dynamic batch and sequence dimensions. The model is written to a temporary directory of this export and moved afterwards,
+    so that concurrent exports of the same model (e.g., by several workers) do not write to the same files.
+    Models of 2 GB or more are saved with their weights in one external data file.
+
+    :param module: Scoring module (its forward takes the example inputs in their order).
+    :param example_inputs: Example inputs (e.g., a tokenized query-document pair).
+    :param output_axes: Dynamic axes of the output.
+    :param model_file: Path of the ONNX file.
+    """
+    os.makedirs(os.path.dirname(model_file), exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=os.path.dirname(model_file), suffix=".tmp")
+    temp_path = os.path.join(temp_dir, os.path.basename(model_file))
+    try:
+        with profiler.span("reranker_export", model=model_file):
+            with torch.no_grad():
+                # large models are exported with one file per weight tensor in the directory of the model
+                torch.onnx.export(
+                    module,
+                    tuple(example_inputs.values()),
+                    temp_path,
+                    input_names=list(example_inputs.keys()),
+                    output_names=["output"],
+                    dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in example_inputs}, "output": output_axes},
+                    opset_version=ONNX_OPSET_VERSION,
+                )
+            if get_module_size(module) >= MAX_PROTOBUF_SIZE:
+                import onnx
+                # combine the weight tensors in one data file, which is moved together with the model
+                onnx.save_model(
+                    onnx.load(temp_path),
+                    temp_path,
+                    save_as_external_data=True,
+                    all_tensors_to_one_file=True,
+                    location=os.path.basename(get_external_data_path(temp_path)),
+                )
+        move_onnx_files(temp_dir, model_file)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def quantize_onnx_model(model_file: str, quantized_file: str) -> None:
+    """
+    Quantize an exported ONNX model with int8 dynamic quantization. The quantization writes intermediate files next to its input (e.g., the model with inferred shapes),
+    so concurrent quantizations of the same model (e.g., by several workers) are serialized with a file lock; like export_to_onnx, the model is written to a temporary
+    directory and moved afterwards. If the weights of the model are stored in an external data file, the quantized model is saved with external data as well.
+
+    :param model_file: Path of the ONNX file.
+    :param quantized_file: Path of the quantized ONNX file.
+    """
+    import fcntl
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    with open(quantized_file + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if os.path.exists(quantized_file):
+            # quantized by another process in the meantime
+            return
+        temp_dir = tempfile.mkdtemp(dir=os.path.dirname(quantized_file), suffix=".tmp")
+        try:
+            with profiler.span("reranker_quantization", model=quantized_file):
+                quantize_dynamic(
+                    model_file,
+                    os.path.join(temp_dir, os.path.basename(quantized_file)),
+                    weight_type=QuantType.QInt8,
+                    use_external_data_format=os.path.exists(get_external_data_path(model_file)),
+                )
+            move_onnx_files(temp_dir, quantized_file)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def create_scoring_module(module: torch.nn.Module, example_inputs: Dict[str, torch.Tensor], output_axes: Dict[int, str], backend: str, model_path: str, name: str, export_dir: str):
+    """
+    Create the module that computes the scores (or embeddings) of a reranker with the selected backend:
+    "torch" (plain PyTorch), "torch_int8" (PyTorch with int8 dynamic quantization of the linear layers), "onnx" (ONNX Runtime) or "onnx_int8" (ONNX Runtime with int8 dynamic quantization).
+    Exported ONNX models are cached in the export directory and reused by later runs.
+
+    :param module: Scoring module in PyTorch.
+    :param example_inputs: Example inputs for the export.
+    :param output_axes: Dynamic axes of the output.
+    :param backend: Name of the backend.
+    :param model_path: Path to the reranker model.
+    :param name: Name of the exported module (e.g., the name of the client).
+    :param export_dir: Directory of the exported models.
+    :return: Callable scoring module.
+    """
+    if backend == "torch":
+        return module
+    if backend == "torch_int8":
+        return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend in ["onnx", "onnx_int8"]:
+        model_file = get_export_path(export_dir, model_path, name, quantized=False)
+        if not os.path.exists(model_file):
+            print(f"Exporting {model_path} to {model_file} ...")
+            export_to_onnx(module, example_inputs, output_axes, model_file)
+        if backend == "onnx_int8":
+            quantized_file = get_export_path(export_dir, model_path, name, quantized=True)
+            if not os.path.exists(quantized_file):
+                print(f"Quantizing {model_file} to {quantized_file} ...")
+                quantize_onnx_model(model_file, quantized_file)
+            model_file = quantized_file
+        return OnnxScoringModule(model_file, list(example_inputs.keys()))
+    raise ValueError(f"Unknown reranker backend {backend}, expected one of {RERANKER_BACKENDS}")
+
+
+def compute_rank_correlation(reference_ranking: List, ranking: List) -> float:
+    """
+    Compute the Spearman rank correlation of two rankings of the same documents.
+
+    :param reference_ranking: Ranked document ids of the reference.
+    :param ranking: Ranked document ids that are compared.
+    :return: Spearman rank correlation.
+    """
+    reference_positions = pd.Series(range(len(reference_ranking)), index=reference_ranking)
+    positions = pd.Series(range(len(ranking)), index=ranking)
+    if len(reference_ranking) < 2:
+        return 1.0
+    return float(np.corrcoef(reference_positions.to_numpy(), positions.loc[reference_positions.index].to_numpy())[0, 1])
+
+
+def check_backend_parity(reference_client: BaselineClient, client: BaselineClient, query: str, documents: List[str], doc_ids: List[str], batch_size: int = 32) -> Dict:
+    """
+    Compare the ranking of a reranker with an optimized backend to the ranking of the fp32 PyTorch reference.
+
+    :param reference_client: Reranker client with the "torch" backend.
+    :param client: Reranker client with the backend that is checked.
+    :param query: Query string.
+    :param documents: List of document strings.
+    :param doc_ids: List of document IDs.
+    :param batch_size: The batch size for processing documents.
+    :return: Dictionary with the Spearman rank correlation and the scoring time of both clients.
+    """
+    results = {}
+    rankings = []
+    for label, current_client in [("reference", reference_client), ("backend", client)]:
+        start_time = time.time()
+        relevance_scores = current_client.get_relevance_scores(query, documents, batch_size=batch_size)
+        results[f"{label}_time"] = time.time() - start_time
+        rankings.append(current_client.get_ranked_ids(relevance_scores, doc_ids))
+    results["spearman"] = compute_rank_correlation(rankings[0], rankings[1])
+    results["speedup"] = results["reference_time"] / results["backend_time"] if results["backend_time"] > 0 else None
+    return results
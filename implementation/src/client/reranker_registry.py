@@ -0,0 +1,152 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import gc
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Type
+import torch
+from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.client.bi_encoder_client import BiEncoderClient
+from implementation.src.client.colbert_client import ColBERTClient
+from implementation.src.client.monoBERT_client import MonoBERTClient
+from implementation.src.client.monoT5_client import MonoT5Client
+from implementation.src.client.reranker_backend import DEFAULT_EXPORT_DIR
+
+# client class of each reranker, selected by the name in the model path (e.g., "path/to/monoT5_3B" or "path/to/colbert")
+CLIENT_CLASSES: Dict[str, Type[BaselineClient]] = {
+    "monoBERT": MonoBERTClient,
+    "monoT5": MonoT5Client,
+    "ColBERT": ColBERTClient,
+    "SciBERT": BiEncoderClient,
+}
+
+
+class RerankerRegistry:
+    def __init__(self, memory_budget_gb: Optional[float] = None, backend: str = "torch", export_dir: str = DEFAULT_EXPORT_DIR) -> None:
+        """
+        Initialize the RerankerRegistry class. The registry loads each reranker model once per process and hands the loaded instance to every caller.
+        If a memory budget is set, the least recently used models are removed once the loaded models exceed the budget.
+
+        :param memory_budget_gb: Maximal memory of the loaded models in GB (None for no limit).
+        :param backend: Inference backend of the loaded models ("torch", "torch_int8", "onnx" or "onnx_int8").
+        :param export_dir: Directory of the exported models of the ONNX backends.
+        """
+        self.memory_budget_gb = memory_budget_gb
+        self.backend = backend
+        self.export_dir = export_dir
+        self.clients: OrderedDict = OrderedDict()
+        self.memory = {}
+        self.statistics: Dict[str, Dict] = {}
+
+    def configure(self, memory_budget_gb: Optional[float], backend: str = "torch", export_dir: str = DEFAULT_EXPORT_DIR) -> None:
+        """
+        Set the memory budget and the inference backend of the registry.
+
+        :param memory_budget_gb: Maximal memory of the loaded models in GB (None for no limit).
+        :param backend: Inference backend of models that are loaded afterwards.
+        :param export_dir: Directory of the exported models of the ONNX backends.
+        """
+        self.memory_budget_gb = memory_budget_gb
+        self.backend = backend
+        self.export_dir = export_dir
+        self.evict()
+
+    @staticmethod
+    def get_client_class(model_path: str) -> Type[BaselineClient]:
+        """
+        Select the client class based on the model path (same naming convention as in the configuration, the case of the name is ignored).
+
+        :param model_path: Path to the reranker model.
+        :return: Client class.
+        """
+        for name, client_class in CLIENT_CLASSES.items():
+            if name.lower() in model_path.lower():
+                return client_class
+        raise ValueError(f"No reranker client found for model path {model_path}")
+
+    @staticmethod
+    def estimate_memory(client: BaselineClient) -> int:
+        """
+        Estimate the memory of the parameters and buffers of the model of a client.
+
+        :param client: Reranker client.
+        :return: Memory in bytes.
+        """
+        model = getattr(client, "model", None)
+        if model is None or not hasattr(model, "parameters"):
+            return 0
+        memory = sum(parameter.numel() * parameter.element_size() for parameter in model.parameters())
+        if hasattr(model, "buffers"):
+            memory += sum(buffer.numel() * buffer.element_size() for buffer in model.buffers())
+        return memory
+
+    def get(self, model_path: str, client_class: Optional[Type[BaselineClient]] = None) -> BaselineClient:
+        """
+        Get the client of a reranker model. The model is loaded on the first request and reused afterwards.
+
+        :param model_path: Path to the reranker model.
+        :param client_class: Client class (selected based on the model path if not provided).
+        :return: Reranker client.
+        """
+        client_class = client_class if client_class is not None else self.get_client_class(model_path)
+        key = (client_class.__name__, model_path, self.backend)
+        statistics = self.statistics.setdefault(f"{client_class.__name__}:{model_path}:{self.backend}", {"loads": 0, "load_time": 0.0, "hits": 0})
+        if key in self.clients:
+            self.clients.move_to_end(key)
+            statistics["hits"] += 1
+            return self.clients[key]
+
+        start_time = time.time()
+        client = client_class(model_path, backend=self.backend, export_dir=self.export_dir)
+        load_time = time.time() - start_time
+        statistics["loads"] += 1
+        statistics["load_time"] += load_time
+        print(f"Loaded reranker {model_path} in {load_time:.2f}s (load {statistics['loads']})")
+        self.clients[key] = client
+        self.memory[key] = self.estimate_memory(client)
+        self.evict()
+        return client
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used models until the loaded models fit into the memory budget. The most recently used model is never removed.
+        """
+        if self.memory_budget_gb is None:
+            return
+        while len(self.clients) > 1 and sum(self.memory.values()) > self.memory_budget_gb * 1e9:
+            key, _ = self.clients.popitem(last=False)
+            del self.memory[key]
+            print(f"Removed reranker {key[1]} from memory")
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def clear(self) -> None:
+        """
+        Remove all loaded models.
+        """
+        self.clients.clear()
+        self.memory.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def get_statistics(self) -> Dict[str, Dict]:
+        """
+        Get the number of loads, the total load time and the number of reuses of each model.
+
+        :return: Dictionary with the statistics of each model.
+        """
+        return {name: dict(statistics) for name, statistics in self.statistics.items()}
+
+    def print_statistics(self) -> None:
+        """
+        Print the number of loads, the total load time and the number of reuses of each model.
+        """
+        for name, statistics in self.statistics.items():
+            print(f"{name}: {statistics['loads']} loads ({statistics['load_time']:.2f}s), {statistics['hits']} reuses")
+
+
+# registry that is shared by all callers of a process
+reranker_registry = RerankerRegistry()
@@ -0,0 +1,355 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import fcntl
+import hashlib
+import json
+import tempfile
+from typing import Dict, List, Optional
+
+# number of entries that a process writes before it scans the cache directory, even if the estimated size is below the maximal size
+EVICTION_SCAN_INTERVAL = 10000
+
+
+class CachedLogprob:
+    def __init__(self, logprob: float, rank: Optional[int], decoded_token: Optional[str]) -> None:
+        """
+        Logprob of a token restored from the response cache (same attributes as the logprobs of vllm).
+
+        :param logprob: Log probability of the token.
+        :param rank: Rank of the token.
+        :param decoded_token: Decoded token.
+        """
+        self.logprob = logprob
+        self.rank = rank
+        self.decoded_token = decoded_token
+
+
+class CachedCompletionOutput:
+    def __init__(self, index: int, text: str, token_ids: List[int], finish_reason: Optional[str], stop_reason, logprobs) -> None:
+        """
+        Output of a sample restored from the response cache (same attributes as the CompletionOutput of vllm).
+
+        :param index: Index of the sample.
+        :param text: Generated text.
+        :param token_ids: Ids of the generated tokens.
+        :param finish_reason: Reason why the generation finished.
+        :param stop_reason: Stop string or token that finished the generation.
+        :param logprobs: Logprobs of the generated tokens (list of dicts from token id to CachedLogprob) or None.
+        """
+        self.index = index
+        self.text = text
+        self.token_ids = token_ids
+        self.finish_reason = finish_reason
+        self.stop_reason = stop_reason
+        self.logprobs = logprobs
+
+
+class CachedRequestOutput:
+    def __init__(self, prompt_token_ids: List[int], outputs: List[CachedCompletionOutput], num_cached_tokens: Optional[int]) -> None:
+        """
+        Response restored from the response cache (same attributes as the RequestOutput of vllm that are used by the PromptHandler).
+
+        :param prompt_token_ids: Ids of the prompt tokens.
+        :param outputs: Outputs of the samples.
+        :param num_cached_tokens: Number of prompt tokens that were served from the prefix cache when the response was generated.
+        """
+        self.prompt_token_ids = prompt_token_ids
+        self.outputs = outputs
+        self.num_cached_tokens = num_cached_tokens
+        self.finished = True
+
+
+def serialize_request_output(response) -> Dict:
+    """
+    Convert a response of the LLM into a JSON serializable dictionary.
+
+    :param response: RequestOutput of vllm (or CachedRequestOutput).
+    :return: Dictionary with the data of the response.
+    """
+    outputs = []
+    for output in response.outputs:
+        logprobs = None
+        if output.logprobs is not None:
+            logprobs = [
+                [[token_id, logprob.logprob, logprob.rank, logprob.decoded_token] for token_id, logprob in position.items()]
+                for position in output.logprobs
+            ]
+        outputs.append({
+            "index": output.index,
+            "text": output.text,
+            "token_ids": list(output.token_ids),
+            "finish_reason": output.finish_reason,
+            "stop_reason": output.stop_reason,
+            "logprobs": logprobs,
+        })
+    return {
+        "prompt_token_ids": list(response.prompt_token_ids),
+        "num_cached_tokens": getattr(response, "num_cached_tokens", None),
+        "outputs": outputs,
+    }
+
+
+def deserialize_request_output(data: Dict) -> CachedRequestOutput:
+    """
+    Restore a response from its dictionary representation.
+
+    :param data: Dictionary with the data of the response.
+    :return: CachedRequestOutput.
+    """
+    outputs = []
+    for output in data["outputs"]:
+        logprobs = None
+        if output["logprobs"] is not None:
+            logprobs = [
+                {token_id: CachedLogprob(logprob, rank, decoded_token) for token_id, logprob, rank, decoded_token in position}
+                for position in output["logprobs"]
+            ]
+        outputs.append(CachedCompletionOutput(
+            index=output["index"],
+            text=output["text"],
+            token_ids=output["token_ids"],
+            finish_reason=output["finish_reason"],
+            stop_reason=output["stop_reason"],
+            logprobs=logprobs,
+        ))
+    return CachedRequestOutput(prompt_token_ids=data["prompt_token_ids"], outputs=outputs, num_cached_tokens=data["num_cached_tokens"])
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str, max_size_bytes: int) -> None:
+        """
+        Initialize the ResponseCache class. Every response is stored in its own file, named by the SHA-256 hash of the request, so that several processes
+        (e.g., SLURM array tasks on the same node) can read and write the cache concurrently. Files are written to a temporary file and renamed atomically.
+        If the cache exceeds its maximal size, the least recently used entries are removed. The size of the cache is kept in a size file, which is set by each scan
+        and to which every process adds the size of the entries it has written, so that the cache directory is only scanned when it may exceed its maximal size.
+        The cache directory must be on a local disk: the size file and the eviction are serialized with flock, which does not exclude processes on other nodes on network file systems
+        (e.g., NFS), and the least recently used order relies on modification times that are set by different clients. Jobs on different nodes should use
+        one cache directory per node.
+
+        :param cache_dir: Directory of the cache (on a local disk).
+        :param max_size_bytes: Maximal size of the cache in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        # size of the entries that were not added to the size file yet and number of entries written since the last scan
+        self.bytes_written = 0
+        self.entries_written = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def create_key(path_to_model: str, message_list: List[Dict[str, str]], sampling_params, chat_options: Dict) -> str:
+        """
+        Create the key of a request.
+
+        :param path_to_model: Path to the model.
+        :param message_list: Message list of the prompt.
+        :param sampling_params: Sampling parameters of the request.
+        :param chat_options: Further options of the chat call (e.g., continue_final_message).
+        :return: SHA-256 hash of the request.
+        """
+        request = {
+            "model": path_to_model,
+            "messages": message_list,
+            "sampling_params": {
+                name: getattr(sampling_params, name, None)
+                for name in ["n", "temperature", "top_p", "top_k", "max_tokens", "seed", "logprobs", "stop", "include_stop_str_in_output"]
+            },
+            "chat_options": chat_options,
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get_file_path(self, key: str) -> str:
+        """
+        Get the path of the file of a cache entry. The entries are distributed to subdirectories to keep the directories small.
+
+        :param key: Key of the entry.
+        :return: Path of the file.
+        """
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Load a cache entry and mark it as recently used.
+
+        :param key: Key of the entry.
+        :return: Cached data or None (if the entry does not exist or cannot be read).
+        """
+        file_path = self.get_file_path(key)
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            os.utime(file_path)
+        except (OSError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: Dict) -> None:
+        """
+        Store a cache entry. The entry is written to a temporary file first and then renamed, so that readers never see partially written entries.
+
+        :param key: Key of the entry.
+        :param data: Data that should be stored.
+        """
+        file_path = self.get_file_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        text = json.dumps(data)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+                file.write(text)
+            os.replace(temp_path, file_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.bytes_written += len(text.encode("utf-8"))
+        self.entries_written += 1
+
+    def read_size(self) -> Optional[int]:
+        """
+        Read the size of the cache from the size file.
+
+        :return: Size of the cache in bytes (None if the cache has not been scanned yet).
+        """
+        try:
+            with open(os.path.join(self.cache_dir, ".size"), "r") as file:
+                return int(file.read())
+        except (OSError, ValueError):
+            return None
+
+    def write_size(self, total_size: int) -> None:
+        """
+        Write the size of the cache to the size file.
+
+        :param total_size: Size of the cache in bytes.
+        """
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w") as file:
+            file.write(str(total_size))
+        os.replace(temp_path, os.path.join(self.cache_dir, ".size"))
+
+    def maybe_evict(self) -> None:
+        """
+        Add the size of the entries written by this process to the size file and evict entries if the cache exceeds its maximal size, if the cache has not been
+        scanned yet or if this process has written EVICTION_SCAN_INTERVAL entries since its last scan. Processes wait for the lock, so that no written entry is missed.
+        """
+        if self.entries_written == 0:
+            return
+        with open(os.path.join(self.cache_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                size = self.read_size()
+                if size is not None and size + self.bytes_written <= self.max_size_bytes and self.entries_written < EVICTION_SCAN_INTERVAL:
+                    self.write_size(size + self.bytes_written)
+                    self.bytes_written = 0
+                    return
+                self.evict()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def evict(self) -> None:
+        """
+        Scan the cache directory and remove the least recently used entries until the cache is at most 90% of its maximal size. The caller holds the lock of the cache.
+        """
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+                total_size += stat.st_size
+        self.bytes_written = 0
+        self.entries_written = 0
+        if total_size <= self.max_size_bytes:
+            self.write_size(total_size)
+            return
+        entries.sort()
+        for _, size, file_path in entries:
+            if total_size <= 0.9 * self.max_size_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        self.write_size(total_size)
+        print(f"Response cache: evicted entries, current size {total_size / 1e9:.2f} GB")
+
+
+class CachedLLM:
+    def __init__(self, client, response_cache: ResponseCache, path_to_model: str) -> None:
+        """
+        Initialize the CachedLLM class. It wraps a vllm LLM instance and consults the response cache before prompts are submitted.
+        Only deterministic requests (temperature 0 or a fixed seed) are served from the cache; all other requests are passed through.
+
+        :param client: vllm LLM instance.
+        :param response_cache: ResponseCache instance.
+        :param path_to_model: Path to the model (part of the cache key).
+        """
+        self.client = client
+        self.response_cache = response_cache
+        self.path_to_model = path_to_model
+
+    def get_tokenizer(self):
+        """
+        Get the tokenizer of the wrapped LLM.
+
+        :return: Tokenizer of the LLM.
+        """
+        return self.client.get_tokenizer()
+
+    @staticmethod
+    def is_cacheable(sampling_params) -> bool:
+        """
+        Check if a request is deterministic and can therefore be served from the cache.
+
+        :param sampling_params: Sampling parameters of the request.
+        :return: True if the request can be cached.
+        """
+        return getattr(sampling_params, "temperature", 1.0) == 0 or getattr(sampling_params, "seed", None) is not None
+
+    def chat(self, messages, sampling_params, **kwargs):
+        """
+        Submit message lists to the LLM. Cached responses are returned directly; only the remaining prompts are submitted (in one call).
+
+        :param messages: Message list or list of message lists.
+        :param sampling_params: Sampling parameters (one for all prompts or one per prompt).
+        :param kwargs: Further options of the chat call.
+        :return: Responses of the LLM (one per message list).
+        """
+        if len(messages) > 0 and isinstance(messages[0], dict):
+            messages = [messages]
+        params = sampling_params if isinstance(sampling_params, list) else [sampling_params] * len(messages)
+        responses = [None] * len(messages)
+        keys = [None] * len(messages)
+        missing = []
+        for k, (message_list, prompt_params) in enumerate(zip(messages, params)):
+            if self.is_cacheable(prompt_params):
+                keys[k] = self.response_cache.create_key(self.path_to_model, message_list, prompt_params, kwargs)
+                data = self.response_cache.get(keys[k])
+                if data is not None:
+                    responses[k] = deserialize_request_output(data)
+                    # the prompt of a cached response is not processed by the engine, so it has no prefix cache hits
+                    responses[k].num_cached_tokens = None
+                    continue
+            missing.append(k)
+
+        if len(missing) > 0:
+            missing_params = [params[k] for k in missing] if isinstance(sampling_params, list) else sampling_params
+            outputs = self.client.chat(messages=[messages[k] for k in missing], sampling_params=missing_params, **kwargs)
+            for k, output in zip(missing, outputs):
+                responses[k] = output
+                if keys[k] is not None:
+                    self.response_cache.put(keys[k], serialize_request_output(output))
+            self.response_cache.maybe_evict()
+        return responses
@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import hashlib
+import json
+import sqlite3
+from typing import Dict, List, Optional, Union
+
+# maximal number of documents per SQL statement (sqlite limits the number of variables)
+CHUNK_SIZE = 500
+
+
+def hash_text(text: str) -> str:
+    """
+    Hash a text (query or document) for the keys of the score cache.
+
+    :param text: Text that should be hashed.
+    :return: SHA-256 hash of the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RerankerScoreCache:
+    def __init__(self, db_path: str) -> None:
+        """
+        Initialize the RerankerScoreCache class. The scores of reranker models are stored in an SQLite database, keyed by the model path, the hash of the query,
+        the id of the document and the hash of the document text, so that the same documents do not have to be scored again for every experiment.
+        Several jobs can share the database only if it is on a local disk: SQLite relies on file locks, which are unreliable on network file systems (e.g., NFS),
+        so concurrent writers may corrupt the database or fail to acquire the lock. On a cluster with a shared file system, use one database per job
+        (or copy the database to the local disk of the node).
+
+        :param db_path: Path to the SQLite database (on a local disk if it is shared by several jobs).
+        """
+        self.db_path = db_path
+        if os.path.dirname(db_path) != "":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # long timeout, since several jobs on the same machine may write to the same database (the locking requires a local disk)
+        self.connection = sqlite3.connect(db_path, timeout=600)
+        # scores are stored as JSON, since some rerankers return several logits per document (e.g., two-class monoBERT)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores (model_path TEXT, query_hash TEXT, doc_id TEXT, text_hash TEXT, score TEXT, "
+            "PRIMARY KEY (model_path, query_hash, doc_id, text_hash))"
+        )
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_scores(self, model_path: str, query: str, doc_ids: List[str], documents: List[str]) -> List[Optional[Union[float, List[float]]]]:
+        """
+        Look up the scores of documents.
+
+        :param model_path: Path to the reranker model.
+        :param query: Query of the ranking.
+        :param doc_ids: Ids of the documents.
+        :param documents: Texts of the documents.
+        :return: List with the score of each document (None if the document is not cached).
+        """
+        query_hash = hash_text(query)
+        keys = [(str(doc_id), hash_text(document)) for doc_id, document in zip(doc_ids, documents)]
+        found: Dict = {}
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            placeholders = ",".join("?" for _ in chunk)
+            rows = self.connection.execute(
+                f"SELECT doc_id, text_hash, score FROM scores WHERE model_path = ? AND query_hash = ? AND doc_id IN ({placeholders})",
+                [model_path, query_hash] + [doc_id for doc_id, _ in chunk],
+            ).fetchall()
+            found.update({(doc_id, text_hash): json.loads(score) for doc_id, text_hash, score in rows})
+        scores = [found.get(key) for key in keys]
+        self.hits += sum(score is not None for score in scores)
+        self.misses += sum(score is None for score in scores)
+        return scores
+
+    def put_scores(self, model_path: str, query: str, doc_ids: List[str], documents: List[str], scores: List[Union[float, List[float]]]) -> None:
+        """
+        Store the scores of documents.
+
+        :param model_path: Path to the reranker model.
+        :param query: Query of the ranking.
+        :param doc_ids: Ids of the documents.
+        :param documents: Texts of the documents.
+        :param scores: Scores of the documents.
+        """
+        query_hash = hash_text(query)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO scores (model_path, query_hash, doc_id, text_hash, score) VALUES (?, ?, ?, ?, ?)",
+                [(model_path, query_hash, str(doc_id), hash_text(document), json.dumps(score)) for doc_id, document, score in zip(doc_ids, documents, scores)],
+            )
+
+    def print_statistics(self) -> None:
+        """
+        Print the number of cache hits and misses.
+        """
+        print(f"Reranker score cache: {self.hits} hits, {self.misses} misses")
+
+
+# caches that are shared by all callers of a process (one per database)
+score_caches: Dict[str, RerankerScoreCache] = {}
+
+
+def get_score_cache(db_path: Optional[str]) -> Optional[RerankerScoreCache]:
+    """
+    Get the score cache of a database (opened once per process).
+
+    :param db_path: Path to the SQLite database (None if no cache should be used).
+    :return: RerankerScoreCache or None.
+    """
+    if db_path is None:
+        return None
+    if db_path not in score_caches:
+        score_caches[db_path] = RerankerScoreCache(db_path)
+    return score_caches[db_path]
@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+from typing import Callable, Dict, List, Optional, Sequence
+
+MAX_LENGTH = 512
+
+
+def get_token_budget(batch_size: int, max_length: int = MAX_LENGTH) -> int:
+    """
+    Convert a batch size into a token budget. The budget corresponds to a batch of sequences with maximal length, so that the peak memory of a batch
+    does not exceed the one of the fixed-size batches, while batches of short sequences contain more sequences.
+
+    :param batch_size: Number of sequences of maximal length per batch.
+    :param max_length: Maximal length of a sequence.
+    :return: Maximal number of (padded) tokens per batch.
+    """
+    return batch_size * max_length
+
+
+def create_token_batches(lengths: Sequence[int], max_batch_tokens: int, max_batch_size: Optional[int] = None) -> List[List[int]]:
+    """
+    Group sequences into batches by their length. The sequences are sorted by length, and each batch is filled as long as the padded size of the batch
+    (number of sequences times the length of the longest sequence) fits into the token budget.
+
+    :param lengths: Number of tokens of each sequence.
+    :param max_batch_tokens: Maximal number of padded tokens per batch (a single longer sequence forms its own batch).
+    :param max_batch_size: Maximal number of sequences per batch (None for no limit).
+    :return: List of batches (indices of the sequences in the input order).
+    """
+    length_order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch: List[int] = []
+    for i in length_order:
+        # the current sequence is the longest of the batch, since the sequences are sorted
+        full = max_batch_size is not None and len(batch) >= max_batch_size
+        if len(batch) > 0 and (full or (len(batch) + 1) * max(lengths[i], 1) > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+class PaddingStatistics:
+    def __init__(self) -> None:
+        """
+        Initialize the PaddingStatistics class, which counts the real and padded tokens of the batches of each client.
+        """
+        self.statistics: Dict[str, Dict[str, int]] = {}
+
+    def update(self, name: str, lengths: Sequence[int]) -> None:
+        """
+        Add a batch.
+
+        :param name: Name of the client.
+        :param lengths: Number of tokens of the sequences of the batch.
+        """
+        statistics = self.statistics.setdefault(name, {"batches": 0, "sequences": 0, "tokens": 0, "padded_tokens": 0})
+        statistics["batches"] += 1
+        statistics["sequences"] += len(lengths)
+        statistics["tokens"] += sum(lengths)
+        statistics["padded_tokens"] += len(lengths) * max(lengths, default=0)
+
+    def get_statistics(self) -> Dict[str, Dict]:
+        """
+        Get the statistics of each client, including the padding efficiency (share of real tokens in the padded batches).
+
+        :return: Dictionary with the statistics of each client.
+        """
+        return {
+            name: {**statistics, "padding_efficiency": statistics["tokens"] / statistics["padded_tokens"] if statistics["padded_tokens"] > 0 else None}
+            for name, statistics in self.statistics.items()
+        }
+
+    def print_statistics(self) -> None:
+        """
+        Print the padding efficiency of each client.
+        """
+        for name, statistics in self.get_statistics().items():
+            if statistics["padding_efficiency"] is not None:
+                print(f"{name}: {statistics['batches']} batches, {statistics['sequences']} sequences, padding efficiency {statistics['padding_efficiency']:.1%}")
+
+
+# statistics that are shared by all clients of a process
+padding_statistics = PaddingStatistics()
+
+
+def score_in_token_batches(
+    name: str,
+    lengths: Sequence[int],
+    score_batch: Callable[[List[int]], List[float]],
+    max_batch_tokens: int,
+    max_batch_size: Optional[int] = None,
+) -> List[float]:
+    """
+    Score sequences in length-sorted batches with a token budget and return the scores in the input order.
+
+    :param name: Name of the client (for the padding statistics).
+    :param lengths: Number of tokens of each sequence.
+    :param score_batch: Function that scores the sequences with the given indices (returns one score per index).
+    :param max_batch_tokens: Maximal number of padded tokens per batch.
+    :param max_batch_size: Maximal number of sequences per batch (None for no limit).
+    :return: List of scores in the order of the sequences.
+    """
+    scores = [0.0] * len(lengths)
+    for batch in create_token_batches(lengths, max_batch_tokens, max_batch_size):
+        padding_statistics.update(name, [lengths[i] for i in batch])
+        for i, score in zip(batch, score_batch(batch)):
+            scores[i] = score
+    return scores
@@ -49,3 +49,51 @@ class LLMClientConfig(BaseModel):
     different_examples: bool = Field(
         ..., description="Determines whether different examples should be used for each self-consistency run (should only be set to true, if we have multiple runs)", examples=[True]
     )
+    scoring_mode: Literal["generate", "logprobs"] = Field(
+        "generate", description="Determines how the decision is obtained: 'generate' parses the decision from the generated text, 'logprobs' reads the top-k logprobs of the number tokens after the decision prefix and stores the expected relevance", examples=["logprobs"]
+    )
+    num_logprobs: int = Field(
+        20, ge=1, description="Number of top logprobs that are requested per generated token (only used if scoring_mode is 'logprobs')", examples=[20]
+    )
+    self_consistency_mode: Literal["repeated_runs", "n_samples"] = Field(
+        "repeated_runs", description="Determines how self-consistency paths are generated: 'repeated_runs' resubmits the whole dataset once per path (one log file per path), 'n_samples' requests number_consistency_path + 1 samples per prompt in a single pass (one log file with all samples)", examples=["n_samples"]
+    )
+    prompt_layout: Literal["default", "prefix_cached"] = Field(
+        "default", description="Layout of the prompts: 'default' places title and abstract before the criteria, 'prefix_cached' places all SLR-constant content (criteria, scale instructions, few-shot turns) first and title and abstract last, so that prefix caching can reuse the shared prefix", examples=["prefix_cached"]
+    )
+    shard_size: Optional[int] = Field(
+        None, ge=1, description="Optional number of papers per shard. If set, the dataset is processed shard by shard, the results of each shard are appended to a JSONL checkpoint, and an interrupted run is resumed from its checkpoint.", examples=[2000]
+    )
+    response_cache_dir: Optional[str] = Field(
+        None, description="Optional directory of the persistent response cache. If set, responses of deterministic requests (temperature 0 or fixed seed) are stored per request and reused instead of being generated again. The directory must be on a local disk (the eviction lock does not work across nodes on network file systems such as NFS); jobs on different nodes should use one directory per node.", examples=["./cache/llm_responses/"]
+    )
+    response_cache_max_size_gb: float = Field(
+        50, gt=0, description="Maximal size of the response cache in GB. If it is exceeded, the least recently used entries are removed.", examples=[50]
+    )
+    stop_at_decision: bool = Field(
+        False, description="Determines whether the generation is stopped once a valid decision ('Decision: N' followed by a line break, punctuation or space) has been emitted", examples=[True]
+    )
+    max_response_tokens: int = Field(
+        1024, ge=1, description="Maximal number of generated tokens per response (also used for the retries of failed responses)", examples=[1024]
+    )
+    token_budget_percentile: Optional[float] = Field(
+        None, gt=0, le=100, description="Optional percentile of the response lengths of previous runs (log files with the same model and prompt template in the output directory) that is used as token budget of the first request. Retries use max_response_tokens.", examples=[99]
+    )
+    export_chrome_trace: bool = Field(
+        False, description="Determines whether the profiled stages of each run are additionally exported as Chrome trace (trace_i.json, can be opened with chrome://tracing or Perfetto)", examples=[True]
+    )
+    reranker_memory_budget_gb: Optional[float] = Field(
+        None, gt=0, description="Optional memory budget in GB for the reranker models that are kept loaded (per process). If it is exceeded, the least recently used model is removed; without budget, every model stays loaded once it was used.", examples=[24]
+    )
+    reranker_score_cache_path: Optional[str] = Field(
+        None, description="Optional path to an SQLite database that stores the scores of the reranker models (keyed by model path, query, document id and document text). Cached scores are reused across experiments; only missing documents are scored. BM25 scores are not cached. The database must be on a local disk if several jobs share it (SQLite locking is unreliable on network file systems such as NFS); otherwise use one database per job.", examples=["./cache/reranker_scores.sqlite"]
+    )
+    embedding_store_dir: Optional[str] = Field(
+        None, description="Optional root directory of the document embedding stores of ColBERT and bi-encoder models (one store per model, dataset and SLR). Stored documents are not encoded again when only the query changes.", examples=["./cache/embeddings"]
+    )
+    reranker_backend: Literal["torch", "torch_int8", "onnx", "onnx_int8"] = Field(
+        "torch", description="Inference backend of the reranker models: plain PyTorch, PyTorch with int8 dynamic quantization, ONNX Runtime or ONNX Runtime with int8 dynamic quantization. All backends except torch run on CPU.", examples=["onnx_int8"]
+    )
+    reranker_export_dir: str = Field(
+        "./cache/reranker_exports", description="Directory of the exported ONNX models of the rerankers (the export is created once and reused).", examples=["./cache/reranker_exports"]
+    )
@@ -5,8 +5,9 @@ import sys
 import os
 import numpy as np
 sys.path.append(os.getcwd())
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 from implementation.src.config.config import Config
+from implementation.src.prompts.prompt_builder import PromptBuilder
 from implementation.src.utils.file_utils import ensure_directory_exists, load_json_file, save_to_json
 
 class ResultHandler:
@@ -40,6 +41,40 @@ class ResultHandler:
         perc_failed = len(json_data["failed_responses"]) if len(json_data["papers"]) == 0 else len(json_data["failed_responses"]) / len(json_data["papers"])
         return llm_df, perc_failed, json_data["path_of_additional_ranker"]
     
+    def recompute_relevance_from_logprobs(self, json_file_path: str, prompt_builder: PromptBuilder, value_mapping: Dict[int, float] = None) -> pd.DataFrame:
+        """
+        Recomputes the relevance of all papers from the stored top logprobs of a run with scoring mode 'logprobs', without regenerating the responses.
+        For runs of self-consistency mode 'n_samples', the relevance of each sample is recomputed and the relevance of the paper is their mean (as in the PromptHandler).
+
+        :param json_file_path: Path to the JSON result file.
+        :param prompt_builder: PromptBuilder instance that defines the scale.
+        :param value_mapping: Optional mapping of the values of the scale to new values (e.g., to merge or reweight values of the scale); values without mapping are kept.
+        :return: DataFrame containing LLM responses with the recomputed relevance for all papers.
+        """
+        llm_df, _, _ = self.process_json_to_dataframe(json_file_path)
+        json_data = load_json_file(json_file_path)
+
+        def compute_relevance(top_logprobs: Dict[str, float]) -> float:
+            distribution = prompt_builder.extract_decision_distribution(top_logprobs)
+            if value_mapping is not None:
+                mapped_distribution = {}
+                for value, probability in distribution.items():
+                    mapped_value = value_mapping.get(value, value)
+                    mapped_distribution[mapped_value] = mapped_distribution.get(mapped_value, 0.0) + probability
+                distribution = mapped_distribution
+            return prompt_builder.compute_expected_relevance(distribution)
+
+        relevance = []
+        for paper_id in llm_df["id"]:
+            paper = json_data["papers"][paper_id]
+            if "samples" in paper:
+                sample_relevance = [compute_relevance(sample.get("top_logprobs", {})) for sample in paper["samples"]]
+                relevance.append(sum(sample_relevance) / len(sample_relevance))
+            else:
+                relevance.append(compute_relevance(paper.get("top_logprobs", {})))
+        llm_df["relevance_of_paper"] = relevance
+        return llm_df
+
     def process_ranked_df_json_to_df(self, json_file_path: str) -> Tuple[pd.DataFrame, float]:
         """
         Reads a JSON file, extracts sorted list of papers, and converts them to a DataFrame.
@@ -90,6 +125,40 @@ class ResultHandler:
         json_results["ranked_df"] = result_df.to_json(orient="records")
         save_to_json(json_results, "logfile.json", self.folder_path)
 
+    def export_samples_to_run_logs(self, file_name: str, output_dir: str) -> List[str]:
+        """
+        Splits a log file of self-consistency mode 'n_samples' into one log file per sample (log_file_0.json, log_file_1.json, ...), i.e., the layout of repeated self-consistency runs.
+
+        :param file_name: Name of the log file with all samples (located in the folder of the result handler).
+        :param output_dir: Directory to which the log files of the individual samples are written.
+        :return: Names of the created log files.
+        """
+        json_data = load_json_file(self.folder_path + file_name)
+        header = {key: value for key, value in json_data.items() if key not in ["papers", "failed_responses", "number_of_samples"]}
+        file_names = []
+        for i in range(json_data["number_of_samples"]):
+            run_data = {**header, "self_consistency_mode": "repeated_runs", "papers": {}, "failed_responses": {}}
+            for paper_id, paper in json_data["papers"].items():
+                if i >= len(paper["samples"]):
+                    continue
+                sample = paper["samples"][i]
+                run_data["papers"][paper_id] = {
+                    "question": paper["question"],
+                    "response": sample["response"],
+                    "decision_of_llm": sample["decision_of_llm"],
+                    "relevance_of_paper": sample["relevance_of_paper"],
+                    "ground_truth": paper["ground_truth"],
+                    "prompt_tokens": paper["prompt_tokens"],
+                    "response_tokens": sample["response_tokens"],
+                }
+            for key, failed_response in json_data["failed_responses"].items():
+                paper_id, sample_number, try_number = key.rsplit("_", 2)
+                if int(sample_number) == i:
+                    run_data["failed_responses"][f"{paper_id}_{try_number}"] = failed_response
+            file_names.append(f"log_file_{i}.json")
+            save_to_json(run_data, file_names[-1], output_dir)
+        return file_names
+
     def create_self_consistency_df(self, file_names: List[str]) -> pd.DataFrame:
         """
         Creates the combined result dataframe from multiple runs by averageing the scores
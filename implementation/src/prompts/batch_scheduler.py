@@ -0,0 +1,140 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+from typing import Dict, List, Optional, Tuple
+from implementation.src.prompts.prompt_handler import PromptHandler
+from implementation.src.utils.profiling import profiler
+
+
+class BatchScheduler:
+    def __init__(self, client, max_batch_size: Optional[int] = None) -> None:
+        """
+        Initialize the BatchScheduler class. The scheduler collects the prompts of several experiment cells (e.g., different SLRs, scales or prompting techniques)
+        that are evaluated with the same loaded LLM and submits them together, so that small SLRs do not leave the engine's batch mostly empty.
+
+        :param client: LLM client (vllm LLM instance) that is shared by all cells.
+        :param max_batch_size: Maximal number of prompts per submission to the LLM (None submits all prompts of a run at once).
+        """
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.cells: List[Tuple[PromptHandler, int]] = []
+
+    def add_cell(self, prompt_handler: PromptHandler, index: int) -> None:
+        """
+        Add an experiment cell to the scheduler.
+
+        :param prompt_handler: PromptHandler of the cell (with its own config, dataset and output directory).
+        :param index: Index of the run (used for the name of the results folder).
+        """
+        self.cells.append((prompt_handler, index))
+
+    @staticmethod
+    def get_prefix_key(message_list: List[Dict[str, str]]) -> Tuple[str, ...]:
+        """
+        Create the sort key of the shared prefix of a message list (all messages except the last user turn, which contains the paper). Sorting by it places
+        prompts with the same system message, few-shot examples and template next to each other, so that they share cached prefixes.
+
+        :param message_list: Message list of a prompt.
+        :return: Sort key.
+        """
+        return tuple(message["content"] for message in message_list[:-1])
+
+    def submit(self, jobs: List[Tuple[int, int, List[Dict[str, str]]]], num_samples: List[int]) -> List:
+        """
+        Submit the prompts of several cells to the LLM. Cells with different sampling parameters are combined by passing one sampling parameter object per prompt.
+        Prompts that continue the assistant turn (logprobs mode) are submitted separately from prompts with a generation prompt.
+
+        :param jobs: List of (cell number, position in the cell, message list) tuples.
+        :param num_samples: Number of samples per prompt of each cell.
+        :return: Responses of the LLM (one per job).
+        """
+        responses = [None] * len(jobs)
+        groups: Dict[bool, List[int]] = {}
+        for j, (cell_number, _, _) in enumerate(jobs):
+            groups.setdefault(self.cells[cell_number][0].scoring_mode == "logprobs", []).append(j)
+        for continue_final_message, job_numbers in groups.items():
+            messages = []
+            sampling_params = []
+            for j in job_numbers:
+                cell_number, _, message_list = jobs[j]
+                prompt_handler = self.cells[cell_number][0]
+                messages.extend(prompt_handler.prepare_chat_messages([message_list]))
+                sampling_params.append(prompt_handler.create_sampling_params(
+                    temperature=prompt_handler.config.llm_client_config.temperature,
+                    n=num_samples[cell_number]
+                ))
+            with profiler.span("engine_submission", items=len(messages), cells=len({jobs[j][0] for j in job_numbers})) as span:
+                try:
+                    if continue_final_message:
+                        outputs = self.client.chat(messages=messages, sampling_params=sampling_params, add_generation_prompt=False, continue_final_message=True)
+                    else:
+                        outputs = self.client.chat(messages=messages, sampling_params=sampling_params)
+                except Exception as e:
+                    outputs = [{"error": str(e)} for _ in messages]
+                span["tokens"] = PromptHandler.count_response_tokens(outputs)
+            for j, output in zip(job_numbers, outputs):
+                responses[j] = output
+        return responses
+
+    def run(self) -> List[Tuple[str, List[str]]]:
+        """
+        Evaluate all cells. The runs of all cells with the same run number are processed together: the prompts of all cells are sorted by shared prefix,
+        submitted in batches of at most max_batch_size prompts and the responses are routed back to the PromptHandler of their cell, which stores them in its own results folder.
+
+        :return: Name of the results folder and list of file names of each cell (in the order the cells were added).
+        """
+        plans = [prompt_handler.prepare_evaluation(index) for prompt_handler, index in self.cells]
+        folder_paths = [prompt_handler.llm_client_output_directory_path + foldername for (prompt_handler, _), (foldername, _, _) in zip(self.cells, plans)]
+        if len(set(folder_paths)) != len(folder_paths):
+            raise ValueError("Several cells write to the same results folder. Use a distinct output directory for each configuration of an SLR.")
+        file_names = [[] for _ in self.cells]
+        num_samples = [num_samples for _, _, num_samples in plans]
+
+        for res_number in range(max((num_runs for _, num_runs, _ in plans), default=0)):
+            active_cells = []
+            for cell_number, (prompt_handler, _) in enumerate(self.cells):
+                foldername, num_runs, _ = plans[cell_number]
+                if res_number >= num_runs:
+                    continue
+                if prompt_handler.start_run(res_number, foldername):
+                    active_cells.append(cell_number)
+                else:
+                    file_names[cell_number].append(f"log_file_{res_number}.json")
+
+            cell_messages = {}
+            cell_prefix_keys = {}
+            jobs = []
+            for cell_number in active_cells:
+                messages, row_batch = self.cells[cell_number][0].build_messages(res_number)
+                cell_messages[cell_number] = (messages, row_batch)
+                cell_prefix_keys[cell_number] = self.get_prefix_key(messages[0]) if len(messages) > 0 else ()
+                jobs.extend((cell_number, k, message_list) for k, message_list in enumerate(messages))
+            # cells are grouped by their shared prefix; within a cell the prompts keep the dataset order, so that the responses are stored in the same order
+            # as in sequential mode (also when the prompts are split into several batches)
+            jobs.sort(key=lambda job: (cell_prefix_keys[job[0]], job[0], job[1]))
+            print(f"Run {res_number + 1}: scheduling {len(jobs)} prompts of {len(active_cells)} cells ...")
+
+            batch_size = self.max_batch_size if self.max_batch_size is not None else max(len(jobs), 1)
+            for start in range(0, len(jobs), batch_size):
+                batch = jobs[start:start + batch_size]
+                responses = self.submit(batch, num_samples)
+                # route the responses back to their cells (in dataset order of the cell)
+                routed: Dict[int, List[Tuple[int, object]]] = {}
+                for (cell_number, k, _), response in zip(batch, responses):
+                    routed.setdefault(cell_number, []).append((k, response))
+                for cell_number, cell_responses in routed.items():
+                    cell_responses.sort(key=lambda item: item[0])
+                    messages, row_batch = cell_messages[cell_number]
+                    self.cells[cell_number][0].process_batch(
+                        responses=[response for _, response in cell_responses],
+                        row_batch=[row_batch[k] for k, _ in cell_responses],
+                        messages=[messages[k] for k, _ in cell_responses],
+                        num_samples=num_samples[cell_number],
+                        res_number=res_number,
+                        foldername=plans[cell_number][0]
+                    )
+
+            for cell_number in active_cells:
+                file_names[cell_number].append(self.cells[cell_number][0].finish_run(res_number, plans[cell_number][0]))
+
+        return [(foldername, file_names[cell_number]) for cell_number, (foldername, _, _) in enumerate(plans)]
@@ -5,15 +5,46 @@ import pandas as pd
 from typing import Dict
 from implementation.src.config.config import Config
 import re
+import math
 from typing import Union, List
 import string
 
+DECISION_PREFIX = "Decision:"
+
+
+def extract_decision_top_logprobs(output) -> Dict[str, float]:
+    """
+    Extract the top logprobs of the decision token from a generated output. The decision prefix ends without a space, which most tokenizers
+    (e.g., Llama-3, Qwen2.5 and Mistral) emit as a separate token before the digit, so the first generated token that is not whitespace is the decision.
+
+    :param output: Generated output (CompletionOutput of vllm or CachedCompletionOutput) with the ids and logprobs of the generated tokens.
+    :return: Dictionary with the decoded tokens as keys and their logprobs as values (empty if no generated token is the decision).
+    """
+    for token_id, position in zip(output.token_ids, output.logprobs):
+        if token_id in position:
+            generated_token = position[token_id].decoded_token
+        else:
+            generated_token = max(position.values(), key=lambda logprob: logprob.logprob).decoded_token
+        if generated_token is None or generated_token.strip() == "" or generated_token == "\u2581":
+            continue
+        top_logprobs = {}
+        for logprob in position.values():
+            token = logprob.decoded_token
+            if token in top_logprobs:
+                # different token ids can decode to the same text; combine their probabilities
+                top_logprobs[token] = math.log(math.exp(top_logprobs[token]) + math.exp(logprob.logprob))
+            else:
+                top_logprobs[token] = logprob.logprob
+        return top_logprobs
+    return {}
+
 class PromptBuilder:
     def __init__(self, config: Config) -> None:
         self.config = config
         self.file_path_slr_infos = self.config.file_path_slr_infos
         self.is_few_shot = self.config.llm_client_config.is_few_shot
         self.prompting_technique = self.config.llm_client_config.prompting_technique
+        self.prompt_layout = self.config.llm_client_config.prompt_layout
 
         self.seed = self.config.llm_client_config.few_shot_example_seed
         self.relevance_lower_value = config.relevance_lower_value
@@ -48,7 +79,83 @@ class PromptBuilder:
                 return value
         return -1.0
 
-    
+
+    def create_decision_stop_strings(self) -> List[str]:
+        """
+        Create the stop strings that end the generation once a valid decision has been emitted. Every value of the scale is combined with the characters
+        that can follow a complete decision, so that e.g. "Decision: 1" does not stop the generation of "Decision: 12".
+
+        :return: List of stop strings.
+        """
+        terminators = ["\n", ".", ",", " ", "*", "`"]
+        return [
+            f"{DECISION_PREFIX} {value}{terminator}"
+            for value in range(int(self.relevance_lower_value), int(self.relevance_upper_value) + 1)
+            for terminator in terminators
+        ]
+
+    def extract_decision_end(self, input_string: str) -> int:
+        """
+        Extract the position in a string after the decision.
+
+        :param input_string: Input string containing the decision value.
+        :return: Position after the decision or -1 (if the string contains no decision).
+        """
+        match = re.search(r"Decision: (\d+)", input_string)
+        return match.end() if match else -1
+
+    def find_multi_token_values(self, tokenizer) -> List[int]:
+        """
+        Find the values of the scale that a tokenizer does not encode as a single token after the decision prefix. In logprobs mode the decision is read
+        from one generated token, so every value of the scale must be a single token (whitespace tokens before the value, e.g. a separate space token, are ignored).
+        E.g., the tokenizer of Llama-3 encodes the values 0-19 as single tokens, while tokenizers that split numbers into digits only support scales up to 9.
+
+        :param tokenizer: Tokenizer of the LLM (e.g., from LLM.get_tokenizer of vllm).
+        :return: Values of the scale that are encoded as several tokens.
+        """
+        prefix_ids = tokenizer.encode(DECISION_PREFIX, add_special_tokens=False)
+        multi_token_values = []
+        for value in range(int(self.relevance_lower_value), int(self.relevance_upper_value) + 1):
+            token_ids = tokenizer.encode(f"{DECISION_PREFIX} {value}", add_special_tokens=False)
+            if token_ids[:len(prefix_ids)] == prefix_ids:
+                token_ids = token_ids[len(prefix_ids):]
+            else:
+                # the end of the prefix is merged with the following text; encode the value on its own
+                token_ids = tokenizer.encode(f" {value}", add_special_tokens=False)
+            tokens = [tokenizer.decode([token_id]) for token_id in token_ids]
+            if sum(token.strip() not in ["", "\u2581"] for token in tokens) != 1:
+                multi_token_values.append(value)
+        return multi_token_values
+
+    def extract_decision_distribution(self, top_logprobs: Dict[str, float]) -> Dict[int, float]:
+        """
+        Extract the probability distribution over the values of the scale from the top logprobs of the first token after the decision prefix.
+
+        :param top_logprobs: Dictionary with the decoded tokens as keys and their logprobs as values.
+        :return: Normalized probabilities of all values of the scale that occur in the top logprobs.
+        """
+        lower_value = int(self.relevance_lower_value)
+        upper_value = int(self.relevance_upper_value)
+
+        distribution = {}
+        for token, logprob in top_logprobs.items():
+            token = token.strip()
+            if token.isdigit() and lower_value <= int(token) <= upper_value:
+                distribution[int(token)] = distribution.get(int(token), 0.0) + math.exp(logprob)
+        total = sum(distribution.values())
+        return {value: probability / total for value, probability in sorted(distribution.items())} if total > 0 else {}
+
+    def compute_expected_relevance(self, distribution: Dict[int, float]) -> float:
+        """
+        Compute the expected relevance from a probability distribution over the values of the scale.
+
+        :param distribution: Normalized probabilities of the values of the scale.
+        :return: Expected relevance or -1.0 if the distribution is empty.
+        """
+        if len(distribution) == 0:
+            return -1.0
+        return sum(value * probability for value, probability in distribution.items())
+
     def create_prompt(
         self,
         paper: Dict,
@@ -109,9 +216,13 @@ class PromptBuilder:
 
         if self.is_few_shot:
             for example in few_shot_examples:
+                question = example["question"]
+                if self.prompt_layout == "prefix_cached" and "title" in example and "abstract" in example:
+                    # render the example in the same layout as the prompt of the paper
+                    question = self.create_prompt(paper=example, prompt_template=prompt_template, slr_context=slr_context)
                 message_list.extend(
                     [
-                        {"role": "user", "content": example["question"]},
+                        {"role": "user", "content": question},
                         {"role": "assistant", "content": example["response"]},
                     ]
                 )
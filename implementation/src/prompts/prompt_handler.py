@@ -3,16 +3,66 @@ import os
 sys.path.append(os.getcwd())
 import pandas as pd
 import datetime
+import math
 import time
-from typing import Dict, List, Tuple
+import numpy as np
+from typing import Dict, List, Optional, Tuple
 from implementation.src.config.config import Config
-from implementation.src.prompts.prompt_builder import PromptBuilder
+from implementation.src.prompts.prompt_builder import PromptBuilder, DECISION_PREFIX, extract_decision_top_logprobs
 from implementation.src.client.local_client import LocalClient
 from vllm import SamplingParams
 from implementation.src.utils.file_utils import (
+    append_to_jsonl,
+    find_resumable_foldername,
     generate_foldername,
+    load_json_file,
+    load_jsonl_file,
     save_to_json,
 )
+from implementation.src.utils.profiling import profiler
+
+# response lengths of the previous runs by output directory, model and prompt template (collected once per process and shared by all PromptHandlers)
+previous_run_statistics: Dict[Tuple[str, str, str], Tuple[List[int], List[float]]] = {}
+
+
+def get_previous_run_statistics(output_directory_path: str, model_id: str, prompt_template: str, prompt_builder: PromptBuilder) -> Tuple[List[int], List[float]]:
+    """
+    Collect the response lengths of the valid responses of the log files in the output directory that were created with the same model and prompt template,
+    and the number of tokens that were generated after the decision (from runs without stop rule). The log files are read once per process; runs that are
+    created later by the same process are not taken into account, so all PromptHandlers of a script use the same token budget.
+
+    :param output_directory_path: Output directory of the runs.
+    :param model_id: Model of the runs.
+    :param prompt_template: Prompt template of the runs.
+    :param prompt_builder: PromptBuilder that extracts the decision from a response.
+    :return: Response lengths and numbers of tokens after the decision.
+    """
+    key = (output_directory_path, model_id, prompt_template)
+    if key in previous_run_statistics:
+        return previous_run_statistics[key]
+    response_tokens = []
+    tokens_after_decision = []
+    for root, _, files in os.walk(output_directory_path):
+        for name in files:
+            if not (name.startswith("log_file_") and name.endswith(".json")):
+                continue
+            try:
+                log_file = load_json_file(os.path.join(root, name))
+            except Exception:
+                continue
+            if log_file.get("deployment_name") != model_id or log_file.get("prompt_template") != prompt_template:
+                continue
+            for paper in log_file.get("papers", {}).values():
+                for sample in paper.get("samples", [paper]):
+                    if sample.get("relevance_of_paper", -1) == -1 or not isinstance(sample.get("response_tokens"), int):
+                        continue
+                    response_tokens.append(sample["response_tokens"])
+                    decision_end = prompt_builder.extract_decision_end(sample.get("response", ""))
+                    if not log_file.get("stop_at_decision", False) and decision_end != -1:
+                        tokens_after_decision.append(sample["response_tokens"] * (1 - decision_end / len(sample["response"])))
+    previous_run_statistics[key] = (response_tokens, tokens_after_decision)
+    return previous_run_statistics[key]
+
 
 class PromptHandler:
     def __init__(self, 
@@ -59,11 +109,40 @@ class PromptHandler:
         self.number_consistency_path = config.llm_client_config.number_consistency_path
         self.ordering_few_shot_examples = self.config.llm_client_config.ordering_few_shot_examples
         self.num_of_max_requests = self.config.llm_client_config.num_of_max_requests
+        self.shard_size = self.config.llm_client_config.shard_size
+        self.scoring_mode = self.config.llm_client_config.scoring_mode
+        self.num_logprobs = self.config.llm_client_config.num_logprobs
+        if self.scoring_mode == "logprobs" and self.prompting_technique == "CoT":
+            raise ValueError("Scoring mode 'logprobs' forces the decision as first token and cannot be combined with CoT prompting.")
+        # the values of the scale are checked with the tokenizer of the LLM (clients without tokenizer are not checked)
+        tokenizer = self.client.get_tokenizer() if self.scoring_mode == "logprobs" and hasattr(self.client, "get_tokenizer") else None
+        if tokenizer is not None:
+            multi_token_values = self.prompt_builder.find_multi_token_values(tokenizer)
+            if len(multi_token_values) > 0:
+                raise ValueError(f"Scoring mode 'logprobs' reads the decision from a single token, but the tokenizer of {self.name_of_model} encodes the values {multi_token_values} of the scale as several tokens.")
+        self.self_consistency_mode = self.config.llm_client_config.self_consistency_mode
+        if self.self_consistency_mode == "n_samples" and self.number_consistency_path > 0 and self.config.llm_client_config.different_examples:
+            raise ValueError("Self-consistency mode 'n_samples' uses the same prompt for all paths and cannot be combined with different few-shot examples per path.")
+
+        self.stop_at_decision = self.config.llm_client_config.stop_at_decision
+        self.max_response_tokens = self.config.llm_client_config.max_response_tokens
+        self.token_budget_percentile = self.config.llm_client_config.token_budget_percentile
+        self.response_token_budget, self.estimated_tokens_after_decision = self.analyse_previous_runs()
 
         self.total_prompt_tokens = 0
         self.total_response_tokens = 0
+        self.total_cached_prompt_tokens = None
+        self.total_engine_prompt_tokens = 0
+        self.num_stopped_at_decision = 0
+        self.num_truncated_responses = 0
         self.few_shot_examples = few_shot_examples
         self.start_time = 0
+        self.completed_ids = set()
+        # keys of the failed responses of each paper (used to write the checkpoint without scanning all failed responses)
+        self.failed_response_keys: Dict[str, List[str]] = {}
+        self.response_cache_counts = None
+        self.export_chrome_trace = self.config.llm_client_config.export_chrome_trace
+        self.profile_start = profiler.mark()
         self.responses = self._initialize_responses()
 
 
@@ -88,7 +167,13 @@ class PromptHandler:
             "total_prompt_tokens": self.total_prompt_tokens,
             "total_response_tokens": self.total_response_tokens,
             "total_computation_time": 0,
-            "num_of_max_requests": self.num_of_max_requests
+            "num_of_max_requests": self.num_of_max_requests,
+            "scoring_mode": self.scoring_mode,
+            "self_consistency_mode": self.self_consistency_mode,
+            "prompt_layout": self.config.llm_client_config.prompt_layout,
+            "stop_at_decision": self.stop_at_decision,
+            "max_response_tokens": self.max_response_tokens,
+            "response_token_budget": self.response_token_budget
         }
 
         if self.is_few_shot:
@@ -103,51 +188,171 @@ class PromptHandler:
 
         return responses
 
-    def send_prompt_to_llm(self, message_list: List[Dict[str, str]]):
+    def analyse_previous_runs(self) -> Tuple[int, Optional[float]]:
+        """
+        Analyse the response lengths of previous runs, i.e., the log files in the output directory that were created with the same model and prompt template.
+        The token budget of the first request is the configured percentile of the response lengths of valid responses (capped by max_response_tokens).
+        Additionally, the mean number of tokens that were generated after the decision is estimated (from runs without stop rule) to estimate the tokens saved by stopping at the decision.
+
+        :return: Token budget of the first request and estimated mean number of tokens after the decision (None if no previous runs were found).
+        """
+        if self.token_budget_percentile is None and not self.stop_at_decision:
+            return self.max_response_tokens, None
+        response_tokens, tokens_after_decision = get_previous_run_statistics(self.llm_client_output_directory_path, self.model_id, self.prompt_template, self.prompt_builder)
+
+        response_token_budget = self.max_response_tokens
+        if self.token_budget_percentile is not None and len(response_tokens) > 0:
+            response_token_budget = min(self.max_response_tokens, math.ceil(np.percentile(response_tokens, self.token_budget_percentile)))
+            print(f"Token budget (p{self.token_budget_percentile:g} of {len(response_tokens)} previous responses): {response_token_budget}")
+        estimated_tokens_after_decision = float(np.mean(tokens_after_decision)) if len(tokens_after_decision) > 0 else None
+        return response_token_budget, estimated_tokens_after_decision
+
+    def send_failed_prompts_to_llm(self, messages: List[List[Dict[str, str]]], truncated: Optional[List[bool]] = None):
         """
-        Send a prompt to the LLM and track the response time.
+        Resend a batch of prompts whose responses could not be parsed. All prompts are submitted in one call, so that the engine can batch them.
 
-        :param message_list: List of message dictionaries to send as a prompt.
-        :return: Response from the LLM.
+        :param messages: List of message lists (one per failed prompt).
+        :param truncated: Whether the response of each prompt was truncated by the token budget (None if no response was truncated).
+        :return: Responses of the LLM (one per message list).
         """
         try:
-            sampling_params = SamplingParams(max_tokens=1024, temperature=0.5, top_p=1) # temperature=0.5 because it is for failed requests that might need higher temperature
-            return self.client.chat(messages=message_list, sampling_params=sampling_params)
+            # temperature=0.5 because it is for failed requests that might need higher temperature; the full token budget is used in case the response was truncated.
+            # Truncated responses are resent with the original temperature, so that the token budget does not change the decisions.
+            truncated = truncated if truncated is not None else [False] * len(messages)
+            sampling_params = [
+                self.create_sampling_params(temperature=self.client_temperature if is_truncated else 0.5, max_tokens=self.max_response_tokens)
+                for is_truncated in truncated
+            ]
+            return self.chat(messages=messages, sampling_params=sampling_params)
         except Exception as e:
-            return {"error": str(e)}
+            return [{"error": str(e)} for _ in messages]
         
-    def send_prompts_to_llm(self, messages: List[List[Dict[str, str]]]):
+    def send_prompts_to_llm(self, messages: List[List[Dict[str, str]]], n: int = 1):
         """
         Send a batch of prompts to the LLM using the transformers library and track the response time for each.
 
         :param message_batch: List of message lists (each list corresponds to a single prompt) to send as a prompt batch.
+        :param n: Number of samples that are generated per prompt.
         :return: Response of the LLM
         """
         try:
-            sampling_params = SamplingParams(max_tokens=1024, temperature=self.config.llm_client_config.temperature, top_p=1)
-            return self.client.chat(messages=messages, sampling_params=sampling_params)
+            sampling_params = self.create_sampling_params(temperature=self.config.llm_client_config.temperature, n=n)
+            return self.chat(messages=messages, sampling_params=sampling_params)
         except Exception as e:
             return [{"error": str(e)} for _ in messages]
 
+    def create_sampling_params(self, temperature: float, n: int = 1, max_tokens: Optional[int] = None) -> SamplingParams:
+        """
+        Create the sampling parameters for the current scoring mode. In logprobs mode only the number token after the decision prefix (and a preceding space token) is needed, so at most two tokens are generated.
+        Otherwise, the generation is limited by the token budget and (if enabled) stopped once a valid decision has been emitted.
+
+        :param temperature: Temperature used for sampling.
+        :param n: Number of samples that are generated per prompt.
+        :param max_tokens: Maximal number of generated tokens (defaults to the token budget).
+        :return: Sampling parameters.
+        """
+        if self.scoring_mode == "logprobs":
+            return SamplingParams(n=n, max_tokens=2, temperature=temperature, top_p=1, logprobs=self.num_logprobs)
+        max_tokens = self.response_token_budget if max_tokens is None else max_tokens
+        if self.stop_at_decision:
+            return SamplingParams(n=n, max_tokens=max_tokens, temperature=temperature, top_p=1, stop=self.prompt_builder.create_decision_stop_strings(), include_stop_str_in_output=True)
+        return SamplingParams(n=n, max_tokens=max_tokens, temperature=temperature, top_p=1)
+
+    def chat(self, messages: List[List[Dict[str, str]]], sampling_params: SamplingParams):
+        """
+        Submit message lists to the LLM. In logprobs mode the assistant turn is started with the decision prefix, so that the first generated token is the decision.
+
+        :param messages: List of message lists (each list corresponds to a single prompt).
+        :param sampling_params: Sampling parameters.
+        :return: Response of the LLM
+        """
+        if self.scoring_mode == "logprobs":
+            return self.client.chat(messages=self.prepare_chat_messages(messages), sampling_params=sampling_params, add_generation_prompt=False, continue_final_message=True)
+        return self.client.chat(messages=messages, sampling_params=sampling_params)
+
+    def prepare_chat_messages(self, messages: List[List[Dict[str, str]]]) -> List[List[Dict[str, str]]]:
+        """
+        Prepare message lists for submission. In logprobs mode the decision prefix is appended as the start of the assistant turn.
+
+        :param messages: List of message lists (each list corresponds to a single prompt).
+        :return: List of message lists that are submitted to the LLM.
+        """
+        if self.scoring_mode == "logprobs":
+            return [message_list + [{"role": "assistant", "content": DECISION_PREFIX}] for message_list in messages]
+        return messages
+
         
-    def extract_response_data(self, response: Dict) -> Tuple[str, int, int]:
+    def extract_response_data(self, response: Dict, output_index: int = 0) -> Tuple[str, int, int]:
         """
         Extract response data from the LLM response.
 
         :param response: Response dictionary from the LLM.
+        :param output_index: Index of the sample in the response (only > 0 if multiple samples were requested).
         :return: Extracted response text, prompt tokens, and completion tokens.
         """
         try:
             response_text, response_prompt_tokens, response_completion_tokens = "", "", ""
-            response_text = response.outputs[0].text
+            response_text = response.outputs[output_index].text
             response_prompt_tokens = len(response.prompt_token_ids)
-            response_completion_tokens = len(response.outputs[0].token_ids)
+            response_completion_tokens = len(response.outputs[output_index].token_ids)
         except Exception as e:
             print(f"Error: {e}, response: {response}")
             response_text = "An unexpected error occurred."
             response_prompt_tokens = 0
             response_completion_tokens = 0
         return response_text, response_prompt_tokens, response_completion_tokens
+
+    def extract_cached_tokens(self, response: Dict) -> int:
+        """
+        Extract the number of prompt tokens that were served from the prefix cache of the engine.
+
+        :param response: Response dictionary from the LLM.
+        :return: Number of cached prompt tokens or None if the engine does not report it.
+        """
+        return getattr(response, "num_cached_tokens", None)
+
+    def extract_response_logprobs(self, response: Dict, output_index: int = 0) -> Dict[str, float]:
+        """
+        Extract the top logprobs of the decision token (first generated token that is not whitespace) from the LLM response.
+
+        :param response: Response dictionary from the LLM.
+        :param output_index: Index of the sample in the response (only > 0 if multiple samples were requested).
+        :return: Dictionary with the decoded tokens as keys and their logprobs as values.
+        """
+        top_logprobs = {}
+        try:
+            top_logprobs = extract_decision_top_logprobs(response.outputs[output_index])
+        except Exception as e:
+            print(f"Error: {e}, response: {response}")
+        return top_logprobs
+
+    def parse_response(self, response: Dict, output_index: int = 0) -> Dict:
+        """
+        Parse the decision of the LLM from a response according to the scoring mode.
+
+        :param response: Response dictionary from the LLM.
+        :param output_index: Index of the sample in the response (only > 0 if multiple samples were requested).
+        :return: Dictionary with the parsed response data.
+        """
+        response_text, response_prompt_tokens, response_completion_tokens = self.extract_response_data(response, output_index)
+        result = {
+            "response_text": response_text,
+            "response_prompt_tokens": response_prompt_tokens,
+            "response_completion_tokens": response_completion_tokens,
+        }
+        if self.scoring_mode == "logprobs":
+            top_logprobs = self.extract_response_logprobs(response, output_index)
+            distribution = self.prompt_builder.extract_decision_distribution(top_logprobs)
+            result["threshold_value"] = self.prompt_builder.compute_expected_relevance(distribution)
+            result["relevance_of_paper"] = f"{DECISION_PREFIX} {max(distribution, key=distribution.get)}" if len(distribution) > 0 else ""
+            result["additional_data"] = {
+                "decision_distribution": distribution,
+                "top_logprobs": top_logprobs,
+            }
+        else:
+            result["relevance_of_paper"] = self.prompt_builder.extract_decision(response_text)
+            result["threshold_value"] = self.prompt_builder.extract_threshold_value(result["relevance_of_paper"])
+        return result
     
     def save_response(
         self,
@@ -158,6 +363,7 @@ class PromptHandler:
         threshold_value: float,
         response_prompt_tokens: int,
         response_completion_tokens: int,
+        additional_data: Dict = None,
     ) -> None:
         """
         Save the response data to the responses dictionary.
@@ -169,8 +375,9 @@ class PromptHandler:
         :param threshold_value: Threshold value extracted from the response.
         :param response_prompt_tokens: Number of tokens in the prompt.
         :param response_completion_tokens: Number of tokens in the response.
+        :param additional_data: Additional data of the response that should be stored (e.g., logprobs).
         """
-        self.responses["papers"][row["id"]] = {
+        self.responses["papers"][str(row["id"])] = {
             "question": message_list[-1]["content"],
             "response": response_text,
             "decision_of_llm": relevance_of_paper,
@@ -179,6 +386,8 @@ class PromptHandler:
             "prompt_tokens": response_prompt_tokens,
             "response_tokens": response_completion_tokens,
         }
+        if additional_data is not None:
+            self.responses["papers"][str(row["id"])].update(additional_data)
 
     def save_response_failed(
         self,
@@ -189,7 +398,8 @@ class PromptHandler:
         threshold_value: float,
         response_prompt_tokens: int,
         response_completion_tokens: int,
-        try_number: int
+        try_number: int,
+        additional_data: Dict = None,
     ) -> None:
         """
         Save the response data to the responses dictionary for failed requests.
@@ -202,14 +412,77 @@ class PromptHandler:
         :param response_prompt_tokens: Number of tokens in the prompt.
         :param response_completion_tokens: Number of tokens in the response.
         :param try_number: The number of the try.
+        :param additional_data: Additional data of the response that should be stored (e.g., logprobs).
         """
-        self.responses["failed_responses"][str(row["id"]) + "_" + str(try_number)] = {
+        self.add_failed_response(str(row["id"]), str(row["id"]) + "_" + str(try_number), {
             "question": message_list[-1]["content"],
             "response": response_text,
             "decision_of_llm": relevance_of_paper,
             "relevance_of_paper": threshold_value,
             "prompt_tokens": response_prompt_tokens,
             "response_tokens": response_completion_tokens,
+            **(additional_data if additional_data is not None else {}),
+        })
+
+    def add_failed_response(self, paper_id: str, key: str, failed_response: Dict) -> None:
+        """
+        Add a failed response to the responses dictionary and to the keys of the failed responses of its paper.
+
+        :param paper_id: Id of the paper.
+        :param key: Key of the failed response.
+        :param failed_response: Data of the failed response.
+        """
+        self.responses["failed_responses"][key] = failed_response
+        keys = self.failed_response_keys.setdefault(paper_id, [])
+        if key not in keys:
+            keys.append(key)
+
+    def save_response_samples(
+        self,
+        row: pd.Series,
+        message_list: str,
+        sample_results: List[Dict],
+        failed_sample_results: List[List[Dict]],
+    ) -> None:
+        """
+        Save all samples of a paper (self-consistency mode 'n_samples') to the responses dictionary. The relevance of the paper is the mean of the relevance of all samples, like the average over the log files of repeated runs.
+
+        :param row: A row from the dataset containing paper details.
+        :param message_list: List of message dictionaries sent as a prompt.
+        :param sample_results: Parsed final result of each sample.
+        :param failed_sample_results: Parsed failed results of each sample (one list of tries per sample).
+        """
+        for sample_number, failed_results in enumerate(failed_sample_results):
+            for try_number, result in enumerate(failed_results):
+                self.add_failed_response(str(row["id"]), f"{row['id']}_{sample_number}_{try_number}", {
+                    "question": message_list[-1]["content"],
+                    "response": result["response_text"],
+                    "decision_of_llm": result["relevance_of_paper"],
+                    "relevance_of_paper": result["threshold_value"],
+                    "prompt_tokens": result["response_prompt_tokens"],
+                    "response_tokens": result["response_completion_tokens"],
+                    **result.get("additional_data", {}),
+                })
+
+        samples = [
+            {
+                "response": result["response_text"],
+                "decision_of_llm": result["relevance_of_paper"],
+                "relevance_of_paper": result["threshold_value"],
+                "response_tokens": result["response_completion_tokens"],
+                **result.get("additional_data", {}),
+            }
+            for result in sample_results if result is not None
+        ]
+        if len(samples) == 0:
+            return
+        self.responses["papers"][str(row["id"])] = {
+            "question": message_list[-1]["content"],
+            "samples": samples,
+            "relevance_of_paper": sum(sample["relevance_of_paper"] for sample in samples) / len(samples),
+            "ground_truth": row["label"],
+            "prompt_tokens": sample_results[0]["response_prompt_tokens"] if sample_results[0] is not None else 0,
+            "response_tokens": sum(sample["response_tokens"] for sample in samples),
         }
 
     def update_token_counts(
@@ -224,6 +497,99 @@ class PromptHandler:
         self.total_prompt_tokens += response_prompt_tokens
         self.total_response_tokens += response_completion_tokens
 
+    def update_generation_statistics(self, response: Dict, output_index: int = 0) -> None:
+        """
+        Count the responses that were stopped at the decision and the responses that were truncated by the token budget.
+
+        :param response: Response dictionary from the LLM.
+        :param output_index: Index of the sample in the response.
+        """
+        try:
+            output = response.outputs[output_index]
+        except Exception:
+            return
+        if output.finish_reason == "stop" and isinstance(output.stop_reason, str):
+            self.num_stopped_at_decision += 1
+        elif output.finish_reason == "length":
+            self.num_truncated_responses += 1
+
+    @staticmethod
+    def is_truncated_response(response: Dict, output_index: int = 0) -> bool:
+        """
+        Check whether a response was truncated by the token budget.
+
+        :param response: Response dictionary from the LLM.
+        :param output_index: Index of the sample in the response.
+        :return: Whether the generation of the sample reached max_tokens.
+        """
+        try:
+            return response.outputs[output_index].finish_reason == "length"
+        except Exception:
+            return False
+
+    @staticmethod
+    def count_response_tokens(responses: List) -> int:
+        """
+        Count the prompt and generated tokens of responses (used for the throughput of the profiled stages).
+
+        :param responses: Responses of the LLM.
+        :return: Number of prompt and generated tokens.
+        """
+        tokens = 0
+        for response in responses:
+            try:
+                tokens += len(response.prompt_token_ids) + sum(len(output.token_ids) for output in response.outputs)
+            except Exception:
+                continue
+        return tokens
+
+    def update_cached_token_count(self, response: Dict) -> None:
+        """
+        Update the total count of prompt tokens that were served from the prefix cache and of the prompt tokens of the responses for which the engine reports it
+        (responses from the response cache report None and are not counted).
+
+        :param response: Response dictionary from the LLM.
+        """
+        cached_tokens = self.extract_cached_tokens(response)
+        if cached_tokens is not None:
+            self.total_cached_prompt_tokens = (self.total_cached_prompt_tokens or 0) + cached_tokens
+            self.total_engine_prompt_tokens += len(response.prompt_token_ids)
+
+    def get_response_cache_counts(self) -> Optional[Tuple[int, int]]:
+        """
+        Get the hit and miss counts of the response cache of the client.
+
+        :return: Number of hits and misses or None (if the client does not use a response cache).
+        """
+        response_cache = getattr(self.client, "response_cache", None)
+        if response_cache is None:
+            return None
+        return response_cache.hits, response_cache.misses
+
+    def update_run_statistics(self) -> None:
+        """
+        Store the token counts, the prefix cache hit rate and the response cache hits and misses of the current run in the responses dictionary.
+        """
+        self.responses["total_prompt_tokens"] = self.total_prompt_tokens
+        self.responses["total_response_tokens"] = self.total_response_tokens
+        self.responses["total_cached_prompt_tokens"] = self.total_cached_prompt_tokens
+        self.responses["prefix_cache_hit_rate"] = None
+        if self.total_cached_prompt_tokens is not None and self.total_engine_prompt_tokens > 0:
+            self.responses["prefix_cache_hit_rate"] = self.total_cached_prompt_tokens / self.total_engine_prompt_tokens
+            print(f"Prefix cache hit rate: {self.responses['prefix_cache_hit_rate']:.2%}")
+        if self.scoring_mode == "generate":
+            self.responses["num_stopped_at_decision"] = self.num_stopped_at_decision
+            self.responses["num_truncated_responses"] = self.num_truncated_responses
+            self.responses["estimated_saved_response_tokens"] = None
+            if self.estimated_tokens_after_decision is not None:
+                self.responses["estimated_saved_response_tokens"] = round(self.num_stopped_at_decision * self.estimated_tokens_after_decision)
+                print(f"Stopped {self.num_stopped_at_decision} responses at the decision (estimated {self.responses['estimated_saved_response_tokens']} saved tokens)")
+        response_cache_counts = self.get_response_cache_counts()
+        if response_cache_counts is not None and self.response_cache_counts is not None:
+            self.responses["response_cache_hits"] = response_cache_counts[0] - self.response_cache_counts[0]
+            self.responses["response_cache_misses"] = response_cache_counts[1] - self.response_cache_counts[1]
+            print(f"Response cache: {self.responses['response_cache_hits']} hits, {self.responses['response_cache_misses']} misses")
+
     def save_final_results(self, res_number: int, foldername: str) -> str:
         """
         Save the final results of the analysis to a JSON file.
@@ -243,32 +609,208 @@ class PromptHandler:
         )
         return file_name
 
-    def evaluate_papers_by_llm_client(self, index) -> tuple[str, List[str]]:
+    def process_responses(self, responses: List, row_batch: List[pd.Series], messages: List[List[Dict[str, str]]], num_samples: int = 1) -> List[Dict]:
         """
-        Evaluate the papers of the dataset using the LLM client. This method processes a dataset of titles and abstracts by constructing prompts, sending them to the LLM client, and saving the responses.
+        Parse the responses of one run and save them. Responses without a valid decision are collected and resent together in retry rounds (one batched request per round) until num_of_max_requests is reached.
+
+        :param responses: Responses of the LLM (one per message list).
+        :param row_batch: Rows of the dataset that belong to the responses.
+        :param messages: Message lists that were sent to the LLM.
+        :param num_samples: Number of samples per response (> 1 for self-consistency mode 'n_samples').
+        :return: Token counts of each paper (including retries).
+        """
+        paper_token_counts = [{"prompt_tokens": 0, "response_tokens": 0, "cached_prompt_tokens": None, "engine_prompt_tokens": 0} for _ in responses]
+        final_results = [[None] * num_samples for _ in responses]
+        failed_results = [[[] for _ in range(num_samples)] for _ in responses]
+        pending = [(k, s) for k in range(len(responses)) for s in range(num_samples)]
+        outputs = [(response, s) for response in responses for s in range(num_samples)]
+        for j in range(self.num_of_max_requests):
+            failed = []
+            truncated = []
+            with profiler.span("response_parsing", items=len(pending), retry_round=j):
+                for (k, s), (response, output_index) in zip(pending, outputs):
+                    result = self.parse_response(response, output_index)
+                    # the prompt is processed once per request, regardless of the number of samples
+                    response_prompt_tokens = result["response_prompt_tokens"] if output_index == 0 else 0
+                    self.update_token_counts(response_prompt_tokens, result["response_completion_tokens"])
+                    self.update_generation_statistics(response, output_index)
+                    paper_token_counts[k]["prompt_tokens"] += response_prompt_tokens
+                    paper_token_counts[k]["response_tokens"] += result["response_completion_tokens"]
+                    if output_index == 0:
+                        self.update_cached_token_count(response)
+                        cached_tokens = self.extract_cached_tokens(response)
+                        if cached_tokens is not None:
+                            paper_token_counts[k]["cached_prompt_tokens"] = (paper_token_counts[k]["cached_prompt_tokens"] or 0) + cached_tokens
+                            paper_token_counts[k]["engine_prompt_tokens"] += len(response.prompt_token_ids)
+                    if result["threshold_value"] != -1 or j == self.num_of_max_requests - 1:
+                        final_results[k][s] = result
+                    else:
+                        failed_results[k][s].append(result)
+                        failed.append((k, s))
+                        truncated.append(self.is_truncated_response(response, output_index))
+            pending = failed
+            if len(pending) == 0:
+                break
+            # Resend all prompts that failed in this round according to num_of_max_requests (one sample per failed prompt)
+            print(f"Retry round {j + 1}: resending {len(pending)} prompts ...")
+            with profiler.span("retry_submission", items=len(pending), retry_round=j + 1) as span:
+                outputs = [(response, 0) for response in self.send_failed_prompts_to_llm([messages[k] for k, _ in pending], truncated)]
+                span["tokens"] = self.count_response_tokens([response for response, _ in outputs])
+
+        # save in the order of the dataset, so that the log file does not depend on the retry rounds
+        for k, (row, message_list) in enumerate(zip(row_batch, messages)):
+            if num_samples > 1:
+                self.save_response_samples(
+                    row=row,
+                    message_list=message_list,
+                    sample_results=final_results[k],
+                    failed_sample_results=failed_results[k]
+                )
+                continue
+            for try_number, result in enumerate(failed_results[k][0]):
+                self.save_response_failed(
+                    row=row,
+                    message_list=message_list,
+                    try_number=try_number,
+                    **result
+                )
+            if final_results[k][0] is not None:
+                self.save_response(
+                    row=row,
+                    message_list=message_list,
+                    **final_results[k][0]
+                )
+        return paper_token_counts
+
+    def save_checkpoint(self, row_batch: List[pd.Series], paper_token_counts: List[Dict], res_number: int, foldername: str) -> None:
+        """
+        Append the results of the given papers (one line per paper) to the JSONL checkpoint of the run.
+
+        :param row_batch: Rows of the dataset whose results should be appended.
+        :param paper_token_counts: Token counts of each paper.
+        :param res_number: Number of the run (important for self-consistency).
+        :param foldername: Name of the folder where the results are stored.
+        """
+        entries = []
+        for row, token_counts in zip(row_batch, paper_token_counts):
+            paper_id = str(row["id"])
+            entries.append({
+                "id": paper_id,
+                "paper": self.responses["papers"].get(paper_id),
+                "failed_responses": {key: self.responses["failed_responses"][key] for key in self.failed_response_keys.get(paper_id, [])},
+                **token_counts,
+            })
+        append_to_jsonl(entries, f"checkpoint_{res_number}.jsonl", self.llm_client_output_directory_path + foldername)
+
+    def load_checkpoint(self, res_number: int, foldername: str) -> set:
+        """
+        Restore the results and token counts of already scored papers from the JSONL checkpoint of the run.
+
+        :param res_number: Number of the run (important for self-consistency).
+        :param foldername: Name of the folder where the results are stored.
+        :return: Set of ids of the papers that are already scored.
+        """
+        completed_ids = set()
+        for entry in load_jsonl_file(self.llm_client_output_directory_path + foldername + f"checkpoint_{res_number}.jsonl"):
+            if entry["paper"] is not None:
+                self.responses["papers"][entry["id"]] = entry["paper"]
+            for key, failed_response in entry["failed_responses"].items():
+                self.add_failed_response(entry["id"], key, failed_response)
+            self.update_token_counts(entry["prompt_tokens"], entry["response_tokens"])
+            if entry["cached_prompt_tokens"] is not None:
+                self.total_cached_prompt_tokens = (self.total_cached_prompt_tokens or 0) + entry["cached_prompt_tokens"]
+                self.total_engine_prompt_tokens += entry.get("engine_prompt_tokens", entry["prompt_tokens"])
+            completed_ids.add(entry["id"])
+        if len(completed_ids) > 0:
+            print(f"Restored {len(completed_ids)} papers from checkpoint of run {res_number + 1}")
+        return completed_ids
+
+    def prepare_evaluation(self, index) -> Tuple[str, int, int]:
+        """
+        Determine the results folder and the number of runs and samples of the evaluation. If a shard size is configured, the latest unfinished folder of the same configuration is resumed.
 
         :param index: Index of the run.
-        :return: Folderpath of the results folder and a list of finalnames (one name for each run).
+        :return: Name of the results folder, number of runs and number of samples per prompt.
         """
         count = self.count if isinstance(self.count, int) else len(self.dataset)
 
-        foldername = generate_foldername(
-            slr_tag=self.slr_tag,
-            name_of_model=self.name_of_model,
-            is_few_shot=self.is_few_shot,
-            length=count,
-            index=index,
-        )
-        file_names = []
+        # in self-consistency mode 'n_samples' all paths are sampled from the same prompt in one pass
+        num_runs, num_samples = self.number_consistency_path + 1, 1
+        if self.self_consistency_mode == "n_samples":
+            num_runs, num_samples = 1, self.number_consistency_path + 1
+            self.responses["number_of_samples"] = num_samples
 
-        for i in range(self.number_consistency_path + 1):
-            print(f"Starting run {i + 1} ...")
-            self.total_prompt_tokens = 0
-            self.total_response_tokens = 0
-            messages = []
-            row_batch = []
-            few_shot_example = self.few_shot_examples[i] if self.few_shot_examples else None
-            for idx, (index, row) in enumerate(self.dataset.head(count).iterrows(), start=1):
+        foldername = None
+        if self.shard_size is not None:
+            foldername = find_resumable_foldername(
+                output_dir=self.llm_client_output_directory_path,
+                slr_tag=self.slr_tag,
+                name_of_model=self.name_of_model,
+                is_few_shot=self.is_few_shot,
+                length=count,
+                index=index,
+                final_filename=f"log_file_{num_runs - 1}.json",
+            )
+            if foldername is not None:
+                print(f"Resuming interrupted run in {foldername}")
+        if foldername is None:
+            foldername = generate_foldername(
+                slr_tag=self.slr_tag,
+                name_of_model=self.name_of_model,
+                is_few_shot=self.is_few_shot,
+                length=count,
+                index=index,
+            )
+        return foldername, num_runs, num_samples
+
+    def start_run(self, res_number: int, foldername: str) -> bool:
+        """
+        Reset the statistics for a new run. If checkpointing is enabled, already finished runs are restored from their log file and finished papers from the checkpoint.
+
+        :param res_number: Number of the run (important for self-consistency).
+        :param foldername: Name of the folder where the results are stored.
+        :return: False if the run is already complete, True otherwise.
+        """
+        if self.shard_size is not None and os.path.exists(self.llm_client_output_directory_path + foldername + f"log_file_{res_number}.json"):
+            # run is already complete; restore its state, since the log files of later runs build on it
+            print(f"Run {res_number + 1} is already complete.")
+            self.responses = load_json_file(self.llm_client_output_directory_path + foldername + f"log_file_{res_number}.json")
+            # keys of repeated runs are "<id>_<try>" (self-consistency mode 'n_samples' has only one run)
+            self.failed_response_keys = {}
+            for key in self.responses["failed_responses"]:
+                self.failed_response_keys.setdefault(key.rsplit("_", 1)[0], []).append(key)
+            return False
+        print(f"Starting run {res_number + 1} ...")
+        self.total_prompt_tokens = 0
+        self.total_response_tokens = 0
+        self.total_cached_prompt_tokens = None
+        self.total_engine_prompt_tokens = 0
+        self.num_stopped_at_decision = 0
+        self.num_truncated_responses = 0
+        self.start_time = time.time()
+        self.profile_start = profiler.mark()
+        self.completed_ids = self.load_checkpoint(res_number, foldername) if self.shard_size is not None else set()
+        self.response_cache_counts = self.get_response_cache_counts()
+        return True
+
+    def build_messages(self, res_number: int, start: int = 0, stop: int = None) -> Tuple[List[List[Dict[str, str]]], List[pd.Series]]:
+        """
+        Build the message lists for the papers of the dataset in the given range that are not scored yet.
+
+        :param res_number: Number of the run (selects the few-shot examples).
+        :param start: Position of the first paper.
+        :param stop: Position after the last paper (defaults to the configured count).
+        :return: Message lists and the rows of the dataset that belong to them.
+        """
+        count = self.count if isinstance(self.count, int) else len(self.dataset)
+        stop = count if stop is None else min(stop, count)
+        few_shot_example = self.few_shot_examples[res_number] if self.few_shot_examples else None
+        messages = []
+        row_batch = []
+        with profiler.span("prompt_building") as span:
+            for _, row in self.dataset.iloc[start:stop].iterrows():
+                if str(row["id"]) in self.completed_ids:
+                    continue
                 prompt_message_list = self.prompt_builder.build_prompt_and_message_list(
                     row=row,
                     prompt_template=self.prompt_template[0],
@@ -278,43 +820,72 @@ class PromptHandler:
                 )
                 messages.append(prompt_message_list)
                 row_batch.append(row)
-            self.start_time = time.time()
-            responses = self.send_prompts_to_llm(messages)
-
-            for response, row, message_list in zip(responses, row_batch, messages):
-                for j in range(self.num_of_max_requests):
-                    response_text, response_prompt_tokens, response_completion_tokens = self.extract_response_data(response)
-
-                    relevance_of_paper = self.prompt_builder.extract_decision(response_text)
-                    threshold_value = self.prompt_builder.extract_threshold_value(relevance_of_paper)
-                    self.update_token_counts(response_prompt_tokens, response_completion_tokens)
-                    if threshold_value != -1 or j == self.num_of_max_requests - 1:
-                        self.save_response(
-                            row=row,
-                            message_list=message_list,
-                            response_text=response_text,
-                            relevance_of_paper=relevance_of_paper,
-                            threshold_value=threshold_value,
-                            response_prompt_tokens=response_prompt_tokens,
-                            response_completion_tokens=response_completion_tokens,
-                        )
-                        break
-                    else:
-                        self.save_response_failed(
-                            row=row,
-                            message_list=message_list,
-                            response_text=response_text,
-                            relevance_of_paper=relevance_of_paper,
-                            threshold_value=threshold_value,
-                            response_prompt_tokens=response_prompt_tokens,
-                            response_completion_tokens=response_completion_tokens,
-                            try_number=j
-                        )
-                        # Resend the prompt if it failed according to num_of_max_requests
-                        response = self.send_prompt_to_llm(message_list)[0]
-
-            final_filename = self.save_final_results(res_number=i, foldername=foldername)
-            file_names.append(final_filename)
-            self.responses["total_computation_time"] = time.time() - self.start_time
+            span["items"] = len(messages)
+        return messages, row_batch
+
+    def process_batch(self, responses: List, row_batch: List[pd.Series], messages: List[List[Dict[str, str]]], num_samples: int, res_number: int, foldername: str) -> None:
+        """
+        Process the responses of a batch of papers and append them to the checkpoint (if checkpointing is enabled).
+
+        :param responses: Responses of the LLM (one per message list).
+        :param row_batch: Rows of the dataset that belong to the responses.
+        :param messages: Message lists that were sent to the LLM.
+        :param num_samples: Number of samples per response.
+        :param res_number: Number of the run (important for self-consistency).
+        :param foldername: Name of the folder where the results are stored.
+        """
+        paper_token_counts = self.process_responses(responses, row_batch, messages, num_samples)
+        if self.shard_size is not None:
+            with profiler.span("checkpoint_writing", items=len(row_batch)):
+                self.save_checkpoint(row_batch, paper_token_counts, res_number, foldername)
+
+    def finish_run(self, res_number: int, foldername: str) -> str:
+        """
+        Store the statistics of the run and save its log file and its profile (profile_i.json with the time spent in each stage, and optionally a Chrome trace).
+        If the run was evaluated by a BatchScheduler, the profile contains the stages of all cells of the run.
+
+        :param res_number: Number of the run (important for self-consistency).
+        :param foldername: Name of the folder where the results are stored.
+        :return: file name of result file
+        """
+        self.update_run_statistics()
+        self.responses["total_computation_time"] = time.time() - self.start_time
+        with profiler.span("log_writing", items=len(self.responses["papers"])):
+            final_filename = self.save_final_results(res_number=res_number, foldername=foldername)
+        output_dir = self.llm_client_output_directory_path + foldername
+        profiler.print_summary(self.profile_start)
+        profiler.save_profile(f"profile_{res_number}.json", output_dir, self.profile_start)
+        if self.export_chrome_trace:
+            profiler.export_chrome_trace(f"trace_{res_number}.json", output_dir, self.profile_start)
+        return final_filename
+
+    def evaluate_papers_by_llm_client(self, index) -> tuple[str, List[str]]:
+        """
+        Evaluate the papers of the dataset using the LLM client. This method processes a dataset of titles and abstracts by constructing prompts, sending them to the LLM client, and saving the responses.
+        If a shard size is configured, the dataset is processed shard by shard and the results of each shard are appended to a checkpoint, so that an interrupted run can be resumed.
+
+        :param index: Index of the run.
+        :return: Folderpath of the results folder and a list of finalnames (one name for each run).
+        """
+        count = self.count if isinstance(self.count, int) else len(self.dataset)
+        foldername, num_runs, num_samples = self.prepare_evaluation(index)
+        file_names = []
+
+        for i in range(num_runs):
+            if not self.start_run(i, foldername):
+                file_names.append(f"log_file_{i}.json")
+                continue
+            shard_size = self.shard_size if self.shard_size is not None else count
+            for start in range(0, count, shard_size):
+                messages, row_batch = self.build_messages(i, start, start + shard_size)
+                if len(messages) == 0:
+                    continue
+                if self.shard_size is not None:
+                    print(f"Processing shard {start // shard_size + 1} of {-(-count // shard_size)} ...")
+                with profiler.span("engine_submission", items=len(messages)) as span:
+                    responses = self.send_prompts_to_llm(messages, n=num_samples)
+                    span["tokens"] = self.count_response_tokens(responses)
+                self.process_batch(responses, row_batch, messages, num_samples, i, foldername)
+            file_names.append(self.finish_run(i, foldername))
 
         return foldername, file_names
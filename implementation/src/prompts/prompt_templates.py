@@ -48,4 +48,58 @@ Decision: {relevance_lower_value} - {relevance_upper_value}
 ```
 
 Explanation:
-"""
\ No newline at end of file
+"""
+
+# Templates for the prompt layout 'prefix_cached': all content that is constant for an SLR (task, scale instructions, criteria and answer format)
+# precedes the title and abstract, so that it is part of the prefix that is shared by all prompts of an SLR (and can be reused by prefix caching).
+zero_shot_prompt_template_prefix = """
+Task:
+You will be presented with a paper's title and abstract. Your task is to decide how relevant the given paper is to the review. Return a number for you decision ranging from '{relevance_lower_value}' to '{relevance_upper_value}', where '{relevance_lower_value}' means that you are absolutely sure that the paper should be excluded, where '{relevance_upper_value}' means that you are absolutely sure that the paper should be included, and where an intermediate value means that you are unsure. Please read the title and the abstract carefully and then make your decision based on the provided inclusion and exclusion criteria.
+
+Inclusion criteria: '{inclusion_criteria}'
+Exclusion criteria: '{exclusion_criteria}'
+
+Give your answer in the following format:
+```
+Decision: {relevance_lower_value} - {relevance_upper_value}
+```
+
+Title: '{title_paper}'
+Abstract: '{abstract}'
+"""
+
+zero_shot_prompt_template_binary_prefix = """
+Task:
+You will be presented with a paper's title and abstract. Your task is to decide if the given paper is relevant to the review. Use the inclusion and exclusion criteria provided below to inform your decision. If any exclusion criteria are met or not all inclusion criteria are met, the paper should be excluded. If all inclusion criteria are met and no exclusion criterion is met, the paper should be included. Return '{relevance_lower_value}' if the paper should be excluded and '{relevance_upper_value}' if the paper should be included. Please read the title and the abstract carefully and then make your decision based on the provided criteria.
+
+Inclusion criteria: '{inclusion_criteria}'
+Exclusion criteria: '{exclusion_criteria}'
+
+Give your answer in the following format:
+```
+Decision: {relevance_lower_value} or {relevance_upper_value}
+```
+
+Title: '{title_paper}'
+Abstract: '{abstract}'
+"""
+
+CoT_prompt_template_prefix = """
+Task:
+You will be presented with a paper's title and abstract. Your task is to decide how relevant the given paper is to the review. Return a number for you decision ranging from '{relevance_lower_value}' to '{relevance_upper_value}', where '{relevance_lower_value}' means that you are absolutely sure that the paper should be excluded, where '{relevance_upper_value}' means that you are absolutely sure that the paper should be included, and where an intermediate value means that you are unsure. Please read the title and the abstract carefully and then make your decision based on the provided inclusion and exclusion criteria. Think step by step.
+
+Inclusion criteria: '{inclusion_criteria}'
+Exclusion criteria: '{exclusion_criteria}'
+
+Give your answer in the following format:
+```
+Explanation: "Let's think step by step..."
+---
+Decision: {relevance_lower_value} - {relevance_upper_value}
+```
+
+Title: '{title_paper}'
+Abstract: '{abstract}'
+
+Explanation:
+"""
@@ -0,0 +1,59 @@
+import argparse
+import sys
+import os
+sys.path.append(os.getcwd())
+from implementation.src.client.reranker_backend import check_backend_parity
+from implementation.src.client.reranker_registry import CLIENT_CLASSES, RerankerRegistry
+from implementation.src.config.config_loader import ConfigLoader
+from implementation.src.data.guo_data_provider import GuoDataProvider
+from implementation.src.data.synergy_data_provider import SynergyDataProvider
+from implementation.src.data.tar_data_provider import TarDataProvider
+from implementation.src.utils.file_utils import load_json_file, save_to_json, scan_folder_for_csv
+
+
+CONFIG_PATH = "./config.json"
+
+def main(backend, num_documents, client_name=None):
+    """
+    Compare the ranking of the configured reranker (config.llm_client_config.path_to_reranker) with an optimized backend to the fp32 PyTorch ranking
+    on the first papers of each SLR of the dataset. The Spearman rank correlation and the speedup are printed and saved next to the exported models.
+
+    :param backend: Backend that is checked.
+    :param num_documents: Number of papers per SLR.
+    :param client_name: Name of the reranker client (selected based on the model path if not provided).
+    """
+    config_loader = ConfigLoader(CONFIG_PATH)
+    config = config_loader.config
+    path_to_reranker = config.llm_client_config.path_to_reranker
+    folder_path = os.path.dirname(config.folder_path_slrs) + "/"
+    data_provider = SynergyDataProvider(config)
+    if "tar2019" in config.folder_path_slrs:
+        data_provider = TarDataProvider(config)
+    elif "guo" in config.folder_path_slrs:
+        data_provider = GuoDataProvider(config)
+
+    client_class = CLIENT_CLASSES[client_name] if client_name is not None else RerankerRegistry.get_client_class(path_to_reranker)
+    reference_client = client_class(path_to_reranker, backend="torch")
+    client = client_class(path_to_reranker, backend=backend, export_dir=config.llm_client_config.reranker_export_dir)
+
+    results = {}
+    for slr in scan_folder_for_csv(folder_path):
+        slr_name = os.path.basename(slr).split(".csv")[0]
+        slr_df = data_provider.create_dataframe(f"{slr_name}.csv").head(num_documents)
+        query = load_json_file(config.file_path_slr_infos)[slr_name]["title"]
+        documents = [str(row["title"]) + " " + str(row["abstract"]) for _, row in slr_df.iterrows()]
+        doc_ids = slr_df["id"].apply(str).to_list()
+        results[slr_name] = check_backend_parity(reference_client, client, query, documents, doc_ids)
+        # the speedup is None if the optimized backend was too fast to be measured
+        speedup = results[slr_name]["speedup"]
+        print(f"{slr_name}: Spearman {results[slr_name]['spearman']:.4f}, speedup {f'{speedup:.2f}x' if speedup is not None else 'n/a'}")
+    save_to_json(results, f"parity_{client_class.__name__}_{backend}.json", config.llm_client_config.reranker_export_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the ranking of an optimized reranker backend against the fp32 PyTorch model.')
+    parser.add_argument('--backend', type=str, required=True, choices=["torch_int8", "onnx", "onnx_int8"], help='Backend that is checked')
+    parser.add_argument('--num_documents', type=int, default=500, help='Number of papers per SLR')
+    parser.add_argument('--client', type=str, default=None, choices=list(CLIENT_CLASSES), help='Reranker client (default: selected based on path_to_reranker)')
+    args = parser.parse_args()
+    main(args.backend, args.num_documents, args.client)
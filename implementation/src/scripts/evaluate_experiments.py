@@ -1,22 +1,26 @@
+import argparse
 import os
 import sys
+from typing import Optional
 import pandas as pd
 sys.path.append(os.getcwd())
 from implementation.src.data.guo_data_provider import GuoDataProvider
-from implementation.src.utils.evaluation_utils import create_run_label_exp1, create_run_label_exp2, create_run_label_exp3, extract_number, extract_prefix
+from implementation.src.utils.evaluation_utils import create_run_label_exp1, create_run_label_exp2, create_run_label_exp3, extract_number
 from implementation.src.data.tar_data_provider import TarDataProvider
-import re
-import time
-from implementation.src.utils.file_utils import load_json_file, save_ranked_df_with_reranker
 from implementation.src.config.config_loader import ConfigLoader
 from implementation.src.data.results_handler import ResultHandler
 from implementation.src.data.synergy_data_provider import SynergyDataProvider
-from implementation.src.utils.data_utils import create_ranking_pointwise
-from implementation.src.utils.tar_utils import create_tar_output_files, get_tar_metrics, remove_tar_output_files
+from implementation.src.utils.parallel_reranking import rerank_runs
+from implementation.src.utils.parallel_evaluation import DEFAULT_METRICS_CACHE_PATH, evaluate_runs, get_run_files
+from implementation.src.utils.tar_utils import average_expected_tar_metrics, get_tar_metrics_from_run_metrics
+from implementation.src.utils.profiling import profiler
+from implementation.src.client.reranker_registry import reranker_registry
+from implementation.src.client.score_cache import score_caches
+from implementation.src.client.token_batching import padding_statistics
 
 CONFIG_PATH = "config.json"
 
-def main(name_label, sort: bool, is_lm_only: bool = False, rerank: bool = False):
+def main(name_label, sort: bool, is_lm_only: bool = False, rerank: bool = False, num_workers: int = 1, metrics_cache_path: Optional[str] = DEFAULT_METRICS_CACHE_PATH):
     # load and validate config
     config_loader = ConfigLoader(CONFIG_PATH)
     config = config_loader.config
@@ -25,6 +29,7 @@ def main(name_label, sort: bool, is_lm_only: bool = False, rerank: bool = False)
 
     folder_path = config.llm_client_output_directory_path
     combined_metrics = {}
+    tie_expected_metrics = {}
     experiment_folder_paths = [f.path for f in os.scandir(folder_path) if f.is_dir()]
     if sort:
         experiment_folder_paths = sorted(experiment_folder_paths, key=extract_number)
@@ -33,39 +38,26 @@ def main(name_label, sort: bool, is_lm_only: bool = False, rerank: bool = False)
         data_provider = TarDataProvider(config)
     elif "guo" in config.folder_path_slrs:
         data_provider = GuoDataProvider(config)
+    if rerank:
+        # the reranker is configured once per process (the workers configure it in their initializer)
+        reranker_registry.configure(config.llm_client_config.reranker_memory_budget_gb, config.llm_client_config.reranker_backend, config.llm_client_config.reranker_export_dir)
+        # the runs of all experiments are independent and are re-ranked by one pool of workers
+        profile_start = profiler.mark()
+        runs = [f.path.replace("\\", "/") for experiment in experiment_folder_paths for f in os.scandir(experiment) if f.is_dir()]
+        rerank_runs(runs, config, data_provider, num_workers)
+        profiler.save_profile("reranking_profile.json", folder_path, profile_start)
+    # the runs of all experiments are evaluated at once (unchanged runs are loaded from the metrics cache)
+    profile_start = profiler.mark()
+    runs = {experiment: [f.path.replace("\\", "/") for f in os.scandir(experiment) if f.is_dir()] for experiment in experiment_folder_paths}
+    all_runs = [(run, config.folder_path_slrs) for experiment in experiment_folder_paths for run in runs[experiment]]
+    run_metrics = dict(zip([run for run, _ in all_runs], evaluate_runs(all_runs, config, "ranking", is_lm_only, num_workers, metrics_cache_path)))
+    tie_run_metrics = {}
+    if not is_lm_only:
+        # expected metrics of a random reranker for the ties of the LLM relevance (closed form), only for runs with LLM log files (not, e.g., for BM25 or ColBERT runs)
+        tie_runs = [(run, folder_path_slrs) for run, folder_path_slrs in all_runs if len(get_run_files(run, "tie_expected", is_lm_only)) > 0]
+        tie_run_metrics = dict(zip([run for run, _ in tie_runs], evaluate_runs(tie_runs, config, "tie_expected", is_lm_only, num_workers, metrics_cache_path)))
     for experiment in experiment_folder_paths:
-        sub_folder_paths = [f.path.replace("\\", "/") for f in os.scandir(experiment) if f.is_dir()]
-        if rerank:
-            for run in sub_folder_paths:
-                print(f"run: {run}")
-                slr_name = extract_prefix(run)
-                slr_infos_df = load_json_file(config.file_path_slr_infos)[slr_name]
-                slr_df = data_provider.create_dataframe(f"{slr_name}.csv")
-                run = run + "/"
-                result_handler = ResultHandler(
-                    config=config,
-                    folder_path=run,
-                )
-                file_names = [f for f in os.listdir(run) if re.match(r'log_file_\d+\.json', f)]
-                result_df = None
-                if len(file_names) == 1:
-                    file_path = run + file_names[0]
-                    result_df, _, _ = result_handler.process_json_to_dataframe(file_path)
-                else:
-                    result_df, _ = result_handler.create_self_consistency_df(file_names)
-                if "abstract" not in result_df.columns:
-                    abstracts = slr_df[["abstract", "id", "title"]]
-                    result_df["id"] = result_df["id"].astype(int)
-                    result_df = pd.merge(abstracts, result_df, on="id", validate="one_to_one")
-                start_time = time.time()
-                result_df = create_ranking_pointwise(result_df, slr_infos_df, config)
-                total_time = time.time() - start_time
-
-                save_ranked_df_with_reranker(result_df["id"].tolist(), config.llm_client_config.path_to_reranker, run + "ranked_df.json", config.llm_client_config.system_message_type, total_time)
-
-        res_file_path, label_file_path = create_tar_output_files(folder_path=experiment, config=config, is_lm_only=is_lm_only)
-        tar_metrics = get_tar_metrics(label_file_path, res_file_path)
-        remove_tar_output_files(res_file_path, label_file_path)
+        tar_metrics = get_tar_metrics_from_run_metrics([run_metrics[run] for run in runs[experiment]])
         mean_metrics_df = pd.Series(tar_metrics)
 
         result_handler = ResultHandler(config=config, folder_path=experiment)
@@ -74,12 +66,33 @@ def main(name_label, sort: bool, is_lm_only: bool = False, rerank: bool = False)
             result_handler.store_mean_metrics_and_std(metrics=mean_metrics_df, std=None, tag=name_label(experiment.split("/")[-1]), with_std=False)
 
         combined_metrics[name_label(experiment.split("/")[-1])] = mean_metrics_df.apply(lambda mean: f"{mean:.2f}")
+        expected_metrics = average_expected_tar_metrics([tie_run_metrics[run] for run in runs[experiment] if run in tie_run_metrics])
+        if len(expected_metrics) > 0:
+            tie_expected_metrics_df = pd.Series(expected_metrics)
+            print("Expected metrics of random tie-breaking:")
+            print(tie_expected_metrics_df)
+            tie_expected_metrics[name_label(experiment.split("/")[-1])] = tie_expected_metrics_df.apply(lambda mean: f"{mean:.2f}")
+    profiler.print_summary(profile_start)
+    profiler.save_profile("evaluation_profile.json", folder_path, profile_start)
+    if config.llm_client_config.export_chrome_trace:
+        profiler.export_chrome_trace("evaluation_trace.json", folder_path, profile_start)
 
     desired_order = ["MAP", "TNR@95%", "R@1%", "R@5%", "R@10%", "R@20%", "R@50%", "WSS@95%", "WSS@100%"]
     combined_metrics = pd.DataFrame(combined_metrics).T
     combined_metrics = combined_metrics.reindex(columns=desired_order)
     combined_metrics.to_csv(folder_path + f"/{folder_path.split("/")[-2]}_all_metrics.csv")
+    if len(tie_expected_metrics) > 0:
+        tie_expected_metrics = pd.DataFrame(tie_expected_metrics).T.reindex(columns=desired_order)
+        tie_expected_metrics.to_csv(folder_path + f"/{folder_path.split("/")[-2]}_tie_expected_metrics.csv")
+    reranker_registry.print_statistics()
+    padding_statistics.print_statistics()
+    for score_cache in score_caches.values():
+        score_cache.print_statistics()
 
 
 if __name__ == "__main__":
-    main(create_run_label_exp1, True, False, False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Re-rank and evaluate experiments.')
+    parser.add_argument('--num_workers', type=int, default=1, help='Number of worker processes for re-ranking and evaluating the runs')
+    parser.add_argument('--no_metrics_cache', action='store_true', help='Evaluate all runs again instead of loading the metrics of unchanged runs from the cache')
+    args = parser.parse_args()
+    main(create_run_label_exp1, True, False, False, args.num_workers, None if args.no_metrics_cache else DEFAULT_METRICS_CACHE_PATH)
\ No newline at end of file
@@ -1,14 +1,17 @@
+import argparse
 import os
 import sys
+from typing import Optional
 import pandas as pd
 sys.path.append(os.getcwd())
 from implementation.src.config.config_loader import ConfigLoader
 from implementation.src.utils.evaluation_utils import create_run_label_exp1, create_run_label_exp2, create_run_label_exp3, extract_number
-from implementation.src.utils.tar_utils import create_tar_output_tar_slrs, get_tar_metrics, remove_tar_output_files
+from implementation.src.utils.parallel_evaluation import DEFAULT_METRICS_CACHE_PATH, evaluate_runs
+from implementation.src.utils.tar_utils import get_tar_metrics_from_run_metrics, get_tar_slrs_runs
 
 CONFIG_PATH = "config.json"
 
-def main(name_label, sort: bool, is_lm_only: bool = False):
+def main(name_label, sort: bool, is_lm_only: bool = False, num_workers: int = 1, metrics_cache_path: Optional[str] = DEFAULT_METRICS_CACHE_PATH):
     # load and validate config
     config_loader = ConfigLoader(CONFIG_PATH)
     config = config_loader.config
@@ -18,13 +21,14 @@ def main(name_label, sort: bool, is_lm_only: bool = False):
     labels = [os.path.basename(f) for f in os.scandir(subdir) if f.is_dir()]
     if sort:
         labels = sorted(labels, key=extract_number)
+    labels = [label for label in labels if label not in ["0s", "Llama3.3-70B", "Llama3.3-70B (Ti+RQ)"]]
+    # the runs of all labels are evaluated at once (unchanged runs are loaded from the metrics cache)
+    runs = {label: get_tar_slrs_runs(folder_path, label) for label in labels}
+    all_runs = [run for label in labels for run in runs[label]]
+    run_metrics = dict(zip([run for run, _ in all_runs], evaluate_runs(all_runs, config, "ranking", is_lm_only, num_workers, metrics_cache_path)))
     for label in labels:
         print(f"Label: {label}")
-        if label == "0s" or label == "Llama3.3-70B" or label == "Llama3.3-70B (Ti+RQ)":
-            continue
-        res_file_path, label_file_path = create_tar_output_tar_slrs(folder_path, config, label, is_lm_only)
-        tar_metrics = get_tar_metrics(label_file_path, res_file_path)
-        remove_tar_output_files(res_file_path, label_file_path)
+        tar_metrics = get_tar_metrics_from_run_metrics([run_metrics[run] for run, _ in runs[label]])
         combined_metrics[name_label(label)] = tar_metrics
     desired_order = ["MAP", "TNR@95%", "R@1%", "R@5%", "R@10%", "R@20%", "R@50%", "WSS@95%", "WSS@100%"]
     combined_metrics = pd.DataFrame(combined_metrics).T
@@ -34,4 +38,8 @@ def main(name_label, sort: bool, is_lm_only: bool = False):
 
 
 if __name__ == "__main__":
-    main(create_run_label_exp3, False, False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Evaluate the experiments of all TAR datasets.')
+    parser.add_argument('--num_workers', type=int, default=1, help='Number of worker processes for evaluating the runs')
+    parser.add_argument('--no_metrics_cache', action='store_true', help='Evaluate all runs again instead of loading the metrics of unchanged runs from the cache')
+    args = parser.parse_args()
+    main(create_run_label_exp3, False, False, args.num_workers, None if args.no_metrics_cache else DEFAULT_METRICS_CACHE_PATH)
\ No newline at end of file
@@ -7,10 +7,11 @@ from implementation.src.utils.file_utils import scan_folder_for_csv
 import torch
 from implementation.src.utils.experiment_utils import run_experiment_with_evaluation
 from implementation.src.config.config_loader import ConfigLoader
+from implementation.src.prompts.batch_scheduler import BatchScheduler
 CONFIG_PATH = "config.json"
 
 
-def main(index):
+def main(index, batched: bool = False, max_batch_size: int = None):
     config_loader = ConfigLoader(CONFIG_PATH)
     config = config_loader.config
 
@@ -42,6 +43,8 @@ def main(index):
 
     print("LLM client created successfully.", end="\n")
     client = client.client
+    # collect the prompts of all experiments and submit them together
+    scheduler = BatchScheduler(client, max_batch_size) if batched else None
     print("Prompting Technique Experiment")
     config.relevance_lower_value = "0"
     config.relevance_upper_value = "19"
@@ -55,11 +58,16 @@ def main(index):
     for slr in slr_files:
         print(f"current file: {slr}")
         slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-        run_experiment_with_evaluation(config, client, 0, slr_name)
+        run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
         torch.cuda.empty_cache()
+    if scheduler is not None:
+        scheduler.run()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Process some integers.')
     parser.add_argument('--index', type=int, required=True, help='Index of the job')
+    parser.add_argument('--batched', action='store_true', help='Evaluate all experiments of the job together with one scheduler')
+    parser.add_argument('--max_batch_size', type=int, default=None, help='Maximal number of prompts per submission in batched mode')
     args = parser.parse_args()
-    main(args.index)
+    main(args.index, args.batched, args.max_batch_size)
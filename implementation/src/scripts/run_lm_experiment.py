@@ -4,9 +4,14 @@ import os
 sys.path.append(os.getcwd())
 from implementation.src.data.guo_data_provider import GuoDataProvider
 from implementation.src.client.bm25_client import BM25Client
+from implementation.src.utils.bm25_index import get_bm25_index_root
 from implementation.src.client.monoBERT_client import MonoBERTClient
 from implementation.src.client.monoT5_client import MonoT5Client
 from implementation.src.client.colbert_client import ColBERTClient
+from implementation.src.client.bi_encoder_client import BiEncoderClient
+from implementation.src.client.reranker_registry import reranker_registry
+from implementation.src.client.score_cache import score_caches
+from implementation.src.client.token_batching import padding_statistics
 from implementation.src.data.synergy_data_provider import SynergyDataProvider
 from implementation.src.utils.file_utils import scan_folder_for_csv
 import torch
@@ -35,6 +40,8 @@ def main(index):
         data_provider = TarDataProvider(config)
     elif "guo" in config.folder_path_slrs:
         data_provider = GuoDataProvider(config)
+    # the models are loaded once and reused for all SLRs (as far as the memory budget allows)
+    reranker_registry.configure(config.llm_client_config.reranker_memory_budget_gb, config.llm_client_config.reranker_backend, config.llm_client_config.reranker_export_dir)
     for slr in slr_files:
         print(f"current file: {slr}")
         slr_name = os.path.basename(slr).split(".csv")[0]
@@ -43,29 +50,39 @@ def main(index):
 
 
         print("Run 0: BM25")
-        client = BM25Client(model_path="", ids=slr_df["id"].astype(str).tolist())
+        client = BM25Client(model_path="", ids=slr_df["id"].astype(str).tolist(), index_root=get_bm25_index_root(config.folder_path_slrs))
         config.llm_client_output_directory_path = output_path + "BM25" + add_to_path
         run_experiment_bert_0_shot(config, client, "BM25", 0, slr_name)
         torch.cuda.empty_cache()
 
         print("Run 1: 0-shot ColBERT")
-        client = ColBERTClient(model_path="path/to/colbert")
+        client = reranker_registry.get("path/to/colbert", ColBERTClient)
         config.llm_client_output_directory_path = output_path + "ColBERT" + add_to_path
         run_experiment_bert_0_shot(config, client, "BM25", 0, slr_name)
         torch.cuda.empty_cache()
 
         print("Run 2: 0-shot monoBERT")
-        client = MonoBERTClient(model_path="path/to/monoBERT")
+        client = reranker_registry.get("path/to/monoBERT", MonoBERTClient)
         config.llm_client_output_directory_path = output_path + "monoBERT" + add_to_path
         run_experiment_bert_0_shot(config, client, "BM25", 0, slr_name)
         torch.cuda.empty_cache()
 
         print("Run 3: 0-shot monoT5")
-        client = MonoT5Client(model_path="path/to/monoT5_3B")
+        client = reranker_registry.get("path/to/monoT5_3B", MonoT5Client)
         config.llm_client_output_directory_path = output_path + "monoT5_3B" + add_to_path
         run_experiment_bert_0_shot(config, client, "BM25", 0, slr_name)
         torch.cuda.empty_cache()
 
+        print("Run 4: 0-shot SciBERT")
+        client = reranker_registry.get("path/to/scibert", BiEncoderClient)
+        config.llm_client_output_directory_path = output_path + "SciBERT" + add_to_path
+        run_experiment_bert_0_shot(config, client, "BM25", 0, slr_name)
+        torch.cuda.empty_cache()
+    reranker_registry.print_statistics()
+    padding_statistics.print_statistics()
+    for score_cache in score_caches.values():
+        score_cache.print_statistics()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Process some integers.')
@@ -7,10 +7,11 @@ from implementation.src.utils.file_utils import scan_folder_for_csv
 import torch
 from implementation.src.utils.experiment_utils import create_few_shot_examples, run_experiment_with_evaluation
 from implementation.src.config.config_loader import ConfigLoader
+from implementation.src.prompts.batch_scheduler import BatchScheduler
 CONFIG_PATH = "config.json"
 
 
-def main(index, generate_examples: bool):
+def main(index, generate_examples: bool, batched: bool = False, max_batch_size: int = None):
     config_loader = ConfigLoader(CONFIG_PATH)
     config = config_loader.config
     folder_path = os.path.dirname(config.folder_path_slrs) + "/"
@@ -25,6 +26,8 @@ def main(index, generate_examples: bool):
 
     print("LLM client created successfully.", end="\n")
     client = client.client
+    # collect the prompts of all experiments and submit them together
+    scheduler = BatchScheduler(client, max_batch_size) if batched else None
     print("Prompting Technique Experiment")
     for slr in slr_files:
         print(f"current file: {slr}")
@@ -62,7 +65,7 @@ def main(index, generate_examples: bool):
                 config.llm_client_config.ordering_few_shot_examples = "PN"
                 config.llm_client_output_directory_path = output_path + "2s/"
                 slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-                run_experiment_with_evaluation(config, client, 0, slr_name)
+                run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
                 torch.cuda.empty_cache()
             elif index == 1:
                 print("CoT")
@@ -73,7 +76,7 @@ def main(index, generate_examples: bool):
                 config.llm_client_config.ordering_few_shot_examples = ""
                 config.llm_client_output_directory_path = output_path + "CoT/"
                 slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-                run_experiment_with_evaluation(config, client, 0, slr_name)
+                run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
                 torch.cuda.empty_cache()
             elif index == 2:
                 print("CoT (n=3)")
@@ -84,7 +87,7 @@ def main(index, generate_examples: bool):
                 config.llm_client_config.ordering_few_shot_examples = ""
                 config.llm_client_output_directory_path = output_path + "CoT_sc/"
                 slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-                run_experiment_with_evaluation(config, client, 0, slr_name)
+                run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
                 torch.cuda.empty_cache()
             elif index == 3:
                 print("2-shot CoT")
@@ -95,7 +98,7 @@ def main(index, generate_examples: bool):
                 config.llm_client_config.ordering_few_shot_examples = "PN"
                 config.llm_client_output_directory_path = output_path + "2s_CoT/"
                 slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-                run_experiment_with_evaluation(config, client, 0, slr_name)
+                run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
                 torch.cuda.empty_cache()
             elif index == 4:
                 print("2-shot CoT (n=3)")
@@ -106,11 +109,16 @@ def main(index, generate_examples: bool):
                 config.llm_client_config.ordering_few_shot_examples = "PN"
                 config.llm_client_output_directory_path = output_path + "2s_CoT_sc/"
                 slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-                run_experiment_with_evaluation(config, client, 0, slr_name)
+                run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
                 torch.cuda.empty_cache()
+    if scheduler is not None:
+        scheduler.run()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Process some integers.')
     parser.add_argument('--index', type=int, required=True, help='Index of the job')
+    parser.add_argument('--batched', action='store_true', help='Evaluate all experiments of the job together with one scheduler')
+    parser.add_argument('--max_batch_size', type=int, default=None, help='Maximal number of prompts per submission in batched mode')
     args = parser.parse_args()
-    main(args.index, False)
+    main(args.index, False, args.batched, args.max_batch_size)
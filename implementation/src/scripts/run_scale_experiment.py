@@ -7,10 +7,11 @@ from implementation.src.utils.file_utils import scan_folder_for_csv
 import torch
 from implementation.src.utils.experiment_utils import run_experiment_with_evaluation
 from implementation.src.config.config_loader import ConfigLoader
+from implementation.src.prompts.batch_scheduler import BatchScheduler
 CONFIG_PATH = "config.json"
 
 
-def main(index):
+def main(index, batched: bool = False, max_batch_size: int = None):
     config_loader = ConfigLoader(CONFIG_PATH)
     config = config_loader.config
 
@@ -26,6 +27,8 @@ def main(index):
 
     print("LLM client created successfully.", end="\n")
     client = client.client
+    # collect the prompts of all experiments and submit them together
+    scheduler = BatchScheduler(client, max_batch_size) if batched else None
 
     for slr in slr_files:
         print(f"current file: {slr}")
@@ -41,42 +44,42 @@ def main(index):
         config.llm_client_output_directory_path = output_path + "0-1/"
         if index == 0:
             slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-            run_experiment_with_evaluation(config, client, 0, slr_name)
+            run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
             torch.cuda.empty_cache()
 
             print("Run 2: zero-shot, sm with rqs, scale: 0-2, re-ranker: default")
             config.relevance_upper_value = "2"
             config.llm_client_output_directory_path = output_path + "0-2/"
             slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-            run_experiment_with_evaluation(config, client, 0, slr_name)
+            run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
             torch.cuda.empty_cache()
         if index == 1:
             print("Run 3: zero-shot, sm with rqs, scale: 0-4, re-ranker: default")
             config.relevance_upper_value = "4"
             config.llm_client_output_directory_path = output_path + "0-4/"
             slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-            run_experiment_with_evaluation(config, client, 0, slr_name)
+            run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
             torch.cuda.empty_cache()
 
             print("Run 4: zero-shot, sm with rqs, scale: 0-9, re-ranker: default")
             config.relevance_upper_value = "9"
             config.llm_client_output_directory_path = output_path + "0-9/"
             slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-            run_experiment_with_evaluation(config, client, 0, slr_name)
+            run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
             torch.cuda.empty_cache()
         if index == 2:
             print("Run 5: zero-shot, sm with rqs, scale: 0-14, re-ranker: default")
             config.relevance_upper_value = "14"
             config.llm_client_output_directory_path = output_path + "0-14/"
             slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-            run_experiment_with_evaluation(config, client, 0, slr_name)
+            run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
             torch.cuda.empty_cache()
 
             print("Run 6: zero-shot, sm with rqs, scale: 0-19, re-ranker: default")
             config.relevance_upper_value = "19"
             config.llm_client_output_directory_path = output_path + "0-19/"
             slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-            run_experiment_with_evaluation(config, client, 0, slr_name)
+            run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
             torch.cuda.empty_cache()
 
         if index == 3:
@@ -84,19 +87,23 @@ def main(index):
             config.relevance_upper_value = "24"
             config.llm_client_output_directory_path = output_path + "0-24/"
             slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-            run_experiment_with_evaluation(config, client, 0, slr_name)
+            run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
             torch.cuda.empty_cache()
 
             print("Run 8: zero-shot, sm with rqs, scale: 0-29, re-ranker: default")
             config.relevance_upper_value = "29"
             config.llm_client_output_directory_path = output_path + "0-29/"
             slr_name = slr_name = os.path.basename(slr).split(".csv")[0]
-            run_experiment_with_evaluation(config, client, 0, slr_name)
+            run_experiment_with_evaluation(config, client, 0, slr_name, scheduler)
             torch.cuda.empty_cache()
+    if scheduler is not None:
+        scheduler.run()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Process some integers.')
     parser.add_argument('--index', type=int, required=True, help='Index of the job')
+    parser.add_argument('--batched', action='store_true', help='Evaluate all experiments of the job together with one scheduler')
+    parser.add_argument('--max_batch_size', type=int, default=None, help='Maximal number of prompts per submission in batched mode')
     args = parser.parse_args()
-    main(args.index)
+    main(args.index, args.batched, args.max_batch_size)
@@ -1,6 +1,7 @@
 import sys
 import os
 
+# streams the qrel file line by line and writes the lines in their original order, so it does not need the (sorted, cached) QrelStore
 def main(qrelFile, threshold):
 
 
@@ -2,7 +2,7 @@ __author__ = "Leif Azzopardi"
 
 import os
 import sys
-from seeker.trec_qrel_handler import TrecQrelHandler
+from seeker.qrel_store import QrelStore
 
 
 def save_topic(cFileHandler, topic_id, doc_dict):
@@ -63,8 +63,8 @@ def count_rels(tqh, topic_id):
 
 def main(pFile,aFile,dFile,cFile):
     print(pFile,aFile,dFile)
-    aqr = TrecQrelHandler(aFile)
-    dqr = TrecQrelHandler(dFile)
+    aqr = QrelStore.read_file(aFile)
+    dqr = QrelStore.read_file(dFile)
 
     curr_topic_id = None
     topic_id = ""
@@ -1,24 +1,27 @@
 import sys
 import os
-from seeker.trec_qrel_handler import TrecQrelHandler
+from seeker.qrel_store import QrelStore
 
 
 def main(qrelFile, pidFile, fullqrelFilename):
     # Read in partial set of qrels (i.e. rels only file)
-    cqrels = TrecQrelHandler(qrelFile)
+    cqrels = QrelStore.read_file(qrelFile)
 
     # Read in the full set of associated pids
+    pid_topics, pid_docs = [], []
     with open(pidFile, "r") as f:
         while f:
             line = f.readline()
             if not line:
                 break
             (topic_id, doc_id) = line.split()
-            # Make full qrels by adding in the non-relevant items
-            if cqrels.get_value_if_exists(topic_id, doc_id) is None:
-                cqrels.add_topic_doc(topic_id, doc_id, 0)
+            pid_topics.append(topic_id)
+            pid_docs.append(doc_id)
 
-    cqrels.save_file(fullqrelFilename)
+    # Make full qrels by adding in the non-relevant items (the judgements of the qrels come last and take precedence)
+    (topic_ids, doc_ids, judgements) = cqrels.get_entries()
+    fqrels = QrelStore.from_entries(pid_topics + topic_ids.tolist(), pid_docs + doc_ids.tolist(), [0] * len(pid_docs) + judgements.tolist())
+    fqrels.save_file(fullqrelFilename)
 
 
 
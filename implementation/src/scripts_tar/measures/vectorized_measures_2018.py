@@ -0,0 +1,381 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+from typing import Dict, Optional, Sequence
+import numpy as np
+from implementation.src.scripts_tar.measures.eval_measures_2018 import CNS, CRN, CRS
+
+MAXT = 100 # number of recall percentiles of GainBasedMeasures
+LOSS_B = 100.0 # parameter b of LossBasedMeasures
+
+
+def get_num_rels_95(num_rels: int) -> int:
+    """
+    Get the number of relevant documents that are required to reach 95% recall (same rounding as CountBasedMeasures).
+
+    :param num_rels: Number of relevant documents of the topic.
+    :return: Number of relevant documents for 95% recall.
+    """
+    return round(float(num_rels) * 0.95)
+
+
+def get_cg_95(num_rels: int) -> int:
+    """
+    Get the number of relevant documents at which GainBasedMeasures computes TNR@95% (the first cumulative gain that reaches 95% recall).
+
+    :param num_rels: Number of relevant documents of the topic.
+    :return: Cumulative gain at which TNR@95% is computed.
+    """
+    cg_max = float(num_rels)
+    cg = max(1, int(0.95 * num_rels) - 1)
+    while cg / cg_max < 0.95:
+        cg += 1
+    return cg
+
+
+def get_cgat_ranks(num_docs: int, num_shown: int) -> np.ndarray:
+    """
+    Get the rank whose cumulative gain GainBasedMeasures stores for each recall percentile (0 if no rank of the percentile was reached).
+    The cumulative gain of a percentile is the one of the last rank of the percentile grid that is not beyond the percentile and was shown.
+
+    :param num_docs: Number of documents of the topic.
+    :param num_shown: Number of ranked documents.
+    :return: Array with the rank of each percentile.
+    """
+    rng = np.array([round((num_docs * rg) / MAXT) for rg in range(1, MAXT + 1)])
+    limits = np.minimum(rng, num_shown)
+    positions = np.searchsorted(rng, limits, side="right") - 1
+    ranks = np.where(positions >= 0, rng[np.maximum(positions, 0)], 0)
+    return np.maximum(ranks, 0)
+
+
+def python_round(values: np.ndarray, digits: int) -> np.ndarray:
+    """
+    Round values with the built-in round (numpy rounds the scaled values, which differs in the last digit for some values).
+
+    :param values: Array of floats.
+    :param digits: Number of decimal digits.
+    :return: Array of rounded floats.
+    """
+    return np.array([round(float(value), digits) for value in values], dtype=np.float64)
+
+
+def compute_task2_measures(judgments, num_docs: int, num_rels: int, actions: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+    """
+    Compute the measures of TarRulerTask2 with cumulative sums instead of updating the measures document by document.
+    Each row of the judgments is a ranking of the same topic (e.g., permutations of the same documents).
+
+    :param judgments: Array (number of rankings x number of documents) or list of the judgements of the ranked documents (0 non relevant, 1 or 2 relevant).
+    :param num_docs: Number of documents of the topic in the set.
+    :param num_rels: Number of relevant documents of the topic in the set (must be positive).
+    :param actions: Actions of the ranks (1 indicates the threshold cut off), shared by all rankings (None for no threshold).
+    :return: Dictionary with an array of each measure (one value per ranking); cgat has one row per ranking.
+    """
+    if num_rels <= 0:
+        raise ValueError("Topics without relevant documents can not be evaluated")
+    judgments = np.atleast_2d(np.asarray(judgments, dtype=np.int64))
+    num_rankings, num_shown = judgments.shape
+    ranks = np.arange(1, num_shown + 1)
+    relevant = (judgments > 0) & (judgments < 3)
+    positive = judgments > 0
+    # cumulative number of relevant documents up to each rank (column 0 for rank 0)
+    rels_cum = np.zeros((num_rankings, num_shown + 1), dtype=np.int64)
+    np.cumsum(relevant, axis=1, out=rels_cum[:, 1:])
+    rels_found = rels_cum[:, -1]
+
+    # documents up to the first threshold action are seen; the last threshold action sets the threshold
+    num_seen = num_shown
+    threshold_rank = None
+    if actions is not None:
+        action_ranks = np.flatnonzero(np.asarray(actions, dtype=np.int64)[:num_shown] == 1) + 1
+        if len(action_ranks) > 0:
+            num_seen = int(action_ranks[0])
+            threshold_rank = int(action_ranks[-1])
+
+    # CountBasedMeasures
+    count_num_docs = max(num_docs, num_shown)
+    num_rels_95 = get_num_rels_95(num_rels)
+    last_rel = np.where(relevant, ranks, 0).max(axis=1, initial=0)
+    # rank of the relevant document that reaches 95% recall (or of the last relevant document if 95% recall is not reached)
+    k_95 = np.minimum(num_rels_95, rels_found)
+    last_rel_95 = np.where(k_95 > 0, np.argmax(rels_cum >= np.maximum(k_95, 1)[:, None], axis=1), 0)
+    wss_100 = np.where(rels_found < num_rels, 0.0, (count_num_docs - last_rel) / float(count_num_docs))
+    wss_95 = np.where(rels_found < num_rels_95, 0.0, (count_num_docs - last_rel_95) / float(count_num_docs) - 0.05)
+    threshold = threshold_rank if threshold_rank is not None else num_docs
+
+    # GainBasedMeasures
+    cg_max = float(num_rels)
+    cg_total = rels_found.astype(np.float64)
+    cgat = rels_cum[:, get_cgat_ranks(num_docs, num_shown)].astype(np.float64)
+    cgat = np.concatenate([cgat, cg_total[:, None]], axis=1)
+    cg_threshold = rels_cum[:, threshold_rank].astype(np.float64) if threshold_rank is not None else np.zeros(num_rankings)
+    if threshold == num_docs:
+        cg_threshold = cg_total
+    # TNR@95% is computed at the rank that reaches 95% recall and, if it is zero, again at the next rank with the same gain
+    cg_95 = get_cg_95(num_rels)
+    reached = rels_found >= cg_95
+    rank_95 = np.argmax(rels_cum >= cg_95, axis=1)
+    if num_docs == num_rels and reached.any():
+        raise ZeroDivisionError("float division by zero")
+    fp = (rank_95 - float(cg_95))
+    tn = (num_docs - rank_95) - (cg_max - cg_95)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tnr95 = tn / (tn + fp)
+        next_rank = np.minimum(rank_95 + 1, num_shown)
+        retry = reached & (tnr95 == 0.0) & (rank_95 < num_shown) & (rels_cum[np.arange(num_rankings), next_rank] == cg_95)
+        tnr95 = np.where(retry, (tn - 1.0) / ((tn - 1.0) + (fp + 1.0)), tnr95)
+    tnr95 = np.where(reached, tnr95, 0.0)
+
+    # UtilityBasedMeasure
+    positive_seen = positive[:, :num_seen].sum(axis=1)
+    positive_not_seen = positive[:, num_seen:].sum(axis=1)
+    total_cost = (num_seen - positive_seen) * CNS + positive_seen * CRS + positive_not_seen * CRN + (num_rels - positive_seen) * CRN
+
+    # AreaBasedMeasures (the area is a multiple of 0.5 and is computed exactly)
+    area = (2 * rels_cum[:, :-1].sum(axis=1) + rels_found) / 2.0
+    num_not_shown = num_docs - num_shown
+    if num_not_shown > 0:
+        area = area + num_not_shown * cg_total
+    max_area = num_rels * (num_docs if num_not_shown >= 0 else num_shown) - (num_rels * num_rels) / 2.0
+    norm_area = python_round(area / max_area, 3) if max_area > 0.0 else np.zeros(num_rankings)
+
+    # MAPBasedMeasures (cumsum adds the precisions in the same order as the ruler)
+    precisions = np.where(relevant, rels_cum[:, 1:] / ranks, 0.0)
+    ap = (np.cumsum(precisions, axis=1)[:, -1] if num_shown > 0 else np.zeros(num_rankings)) / float(num_rels)
+
+    # LossBasedMeasures
+    r = relevant[:, :num_seen].sum(axis=1) / float(num_rels)
+    loss_r = np.power(1 - r, 2.0)
+    loss_e = np.full(num_rankings, pow(LOSS_B / max(num_docs, num_seen), 2.0) * pow(num_seen / (num_rels + LOSS_B), 2.0))
+
+    return {
+        "num_shown": np.full(num_rankings, num_shown),
+        "rels_found": rels_found,
+        "num_rels": np.full(num_rankings, num_rels),
+        "last_rel": last_rel,
+        "norm_last_rel": python_round(last_rel / float(count_num_docs), 3),
+        "threshold": np.full(num_rankings, threshold),
+        "norm_threshold": np.full(num_rankings, round(float(threshold) / float(count_num_docs), 3)),
+        "wss_100": wss_100,
+        "wss_95": wss_95,
+        "cg_total": cg_total,
+        "cg_max": np.full(num_rankings, cg_max),
+        "cgat": cgat,
+        "cg_threshold": cg_threshold,
+        "ncg_threshold": cg_threshold / cg_max,
+        "tnr95": tnr95,
+        "total_cost": total_cost.astype(np.float64),
+        "norm_area": norm_area,
+        "ap": ap,
+        "r": r,
+        "loss_e": loss_e,
+        "loss_r": loss_r,
+        "loss_er": loss_r + loss_e,
+    }
+
+
+def compute_task2_recall_at(measures: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Compute the recall at each percentile (R@1% to R@100%) from the cumulative gains of the measures.
+
+    :param measures: Measures of compute_task2_measures.
+    :return: Dictionary with an array of the recall of each percentile (one value per ranking).
+    """
+    return {f"R@{p + 1}%": measures["cgat"][:, p] / measures["cg_max"] for p in range(MAXT)}
+
+
+def compute_task2_metrics(judgments: Sequence[int], num_docs: int, num_rels: int, actions: Optional[Sequence[int]] = None) -> Dict:
+    """
+    Compute the metrics of one ranking; the result is the same as the one of TarRulerTask2.finalize after updating the ruler with each judgement.
+
+    :param judgments: Judgements of the ranked documents (0 non relevant, 1 or 2 relevant).
+    :param num_docs: Number of documents of the topic in the set.
+    :param num_rels: Number of relevant documents of the topic in the set (must be positive).
+    :param actions: Actions of the ranks (1 indicates the threshold cut off; None for no threshold).
+    :return: Dictionary of the metrics with Python numbers (cgat is a list).
+    """
+    measures = compute_task2_measures(judgments, num_docs, num_rels, actions)
+    metric_dict = {}
+    for key, values in measures.items():
+        if key == "cgat":
+            metric_dict[key] = values[0].tolist()
+        else:
+            metric_dict[key] = values[0].item()
+        if key == "tnr95":
+            # the ruler adds the recall of each percentile after the outputs of GainBasedMeasures
+            for recall_key, recall_values in compute_task2_recall_at(measures).items():
+                metric_dict[recall_key] = recall_values[0].item()
+    return metric_dict
+
+
+class VectorizedTarRulerTask2(object):
+
+    def __init__(self, topic_id, num_docs, num_rels):
+        """
+        Initialize the VectorizedTarRulerTask2 class, which can replace TarRulerTask2: the judgements are collected by update, and the measures are computed at once by finalize.
+
+        :param topic_id: ID of the topic.
+        :param num_docs: Number of documents of the topic in the set.
+        :param num_rels: Number of relevant documents of the topic in the set.
+        """
+        self.topic_id = topic_id
+        self.num_docs = num_docs
+        self.num_rels = num_rels
+        self.judgments = []
+        self.actions = []
+        self.metric_dict = {}
+
+    def update(self, judgment, value, action):
+        """
+        Add the next ranked document.
+
+        :param judgment: Judgement of the document.
+        :param value: Value of the document (the same as the judgement in tar_eval_2018).
+        :param action: 1 indicates the threshold cut off.
+        """
+        self.judgments.append(judgment)
+        self.actions.append(int(action))
+
+    def finalize(self):
+        """
+        Compute the measures of the ranking.
+
+        :return: Dictionary of the metrics (the same as the one of TarRulerTask2.finalize).
+        """
+        self.metric_dict = compute_task2_metrics(self.judgments, self.num_docs, self.num_rels, self.actions)
+        return self.metric_dict
+
+    def print_scores(self):
+        for measure, val in self.metric_dict.items():
+            if isinstance(val, float):
+                if val < 1:
+                    val = round(val,3)
+                else:
+                    val = round(val,0)
+            print("{0}\t{1}\t{2}".format(self.topic_id, measure, val))
+
+
+def get_group_codes(groups) -> np.ndarray:
+    """
+    Number the (tie) groups of a ranking in the order of their first occurrence.
+
+    :param groups: Group of each ranked document (e.g., the relevance score of the document).
+    :return: Array with the number of the group of each document.
+    """
+    _, first_index, inverse = np.unique(np.asarray(groups), return_index=True, return_inverse=True)
+    return np.argsort(np.argsort(first_index))[inverse.reshape(-1)]
+
+
+def permute_within_groups(values, groups, num_permutations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Create random permutations of ranked values in which only values of the same (tie) group change places. The groups keep the order of their first occurrence.
+
+    :param values: Values in the order of the ranking (e.g., judgements).
+    :param groups: Group of each value (e.g., the relevance score of the document).
+    :param num_permutations: Number of permutations.
+    :param rng: Random number generator.
+    :return: Array (number of permutations x number of values) of the permuted values.
+    """
+    values = np.asarray(values)
+    codes = get_group_codes(groups)
+    # noise below 0.5 keeps the groups apart despite rounding
+    keys = codes[None, :] + 0.5 * rng.random((num_permutations, len(values)))
+    return values[np.argsort(keys, axis=1)]
+
+
+def compute_task2_measures_of_permutations(judgments, groups, num_docs: int, num_rels: int, num_permutations: int, seed: int = 0, max_elements: int = 2**22) -> Dict[str, np.ndarray]:
+    """
+    Compute the measures (including R@1% to R@100%) of random permutations of a ranking within its tie groups, e.g., for a random tie-breaking baseline.
+    The permutations are evaluated in chunks, so that the arrays of a chunk have at most max_elements elements.
+
+    :param judgments: Judgements of the ranked documents.
+    :param groups: Tie group of each ranked document.
+    :param num_docs: Number of documents of the topic in the set.
+    :param num_rels: Number of relevant documents of the topic in the set (must be positive).
+    :param num_permutations: Number of permutations.
+    :param seed: Seed of the random number generator.
+    :param max_elements: Maximal number of elements of the judgement array of a chunk.
+    :return: Dictionary with an array of each measure (one value per permutation); cgat has one row per permutation.
+    """
+    rng = np.random.default_rng(seed)
+    chunk_size = max(1, max_elements // max(len(judgments), 1))
+    chunks = []
+    for start in range(0, num_permutations, chunk_size):
+        permuted = permute_within_groups(judgments, groups, min(chunk_size, num_permutations - start), rng)
+        measures = compute_task2_measures(permuted, num_docs, num_rels)
+        measures.update(compute_task2_recall_at(measures))
+        chunks.append(measures)
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+def compute_task2_expected_measures(judgments, groups, num_docs: int, num_rels: int) -> Dict[str, float]:
+    """
+    Compute the expected measures of a ranking whose documents are ordered randomly within their tie groups, without sampling.
+    The expected cumulative gain at a rank follows from the hypergeometric distribution of the relevant documents of its group; the expected rank of the
+    m-th of r relevant documents in a group of n documents is m * (n + 1) / (r + 1); the expected precision at a relevant document of a group is averaged
+    over its (uniform) position in the group. Recall, WSS and AP are linear in these quantities, so their expectations are exact. TNR@95% is exact for
+    rankings of all documents of the topic (the ruler's second computation at a zero TNR can not occur for them).
+
+    :param judgments: Judgements of the ranked documents (0 non relevant, 1 or 2 relevant).
+    :param groups: Tie group of each ranked document; the documents of a group are ranked consecutively.
+    :param num_docs: Number of documents of the topic in the set.
+    :param num_rels: Number of relevant documents of the topic in the set (must be positive).
+    :return: Dictionary with the expected values of ap, wss_100, wss_95, tnr95 and R@1% to R@100%.
+    """
+    if num_rels <= 0:
+        raise ValueError("Topics without relevant documents can not be evaluated")
+    judgments = np.asarray(judgments, dtype=np.int64)
+    num_shown = len(judgments)
+    relevant = (judgments > 0) & (judgments < 3)
+    codes = get_group_codes(groups)
+    sizes = np.bincount(codes).astype(np.float64)
+    rels = np.bincount(codes, weights=relevant).astype(np.float64)
+    # documents and relevant documents before each group
+    starts = np.concatenate([[0.0], np.cumsum(sizes)[:-1]])
+    rels_before = np.concatenate([[0.0], np.cumsum(rels)[:-1]])
+    rels_found = int(rels.sum())
+
+    def expected_gain(rank: int) -> float:
+        if rank <= 0:
+            return 0.0
+        g = int(np.searchsorted(starts + sizes, rank))
+        return rels_before[g] + rels[g] * (rank - starts[g]) / sizes[g]
+
+    def expected_rank_of_relevant(k: int) -> float:
+        # expected rank of the k-th relevant document
+        g = int(np.searchsorted(rels_before + rels, k))
+        m = k - rels_before[g]
+        return starts[g] + m * (sizes[g] + 1) / (rels[g] + 1)
+
+    # CountBasedMeasures
+    count_num_docs = max(num_docs, num_shown)
+    num_rels_95 = get_num_rels_95(num_rels)
+    wss_100 = 0.0
+    if rels_found >= num_rels and rels_found > 0:
+        wss_100 = (count_num_docs - expected_rank_of_relevant(rels_found)) / float(count_num_docs)
+    wss_95 = 0.0
+    if rels_found >= num_rels_95:
+        last_rel_95 = expected_rank_of_relevant(num_rels_95) if num_rels_95 > 0 else 0.0
+        wss_95 = (count_num_docs - last_rel_95) / float(count_num_docs) - 0.05
+
+    # GainBasedMeasures
+    cg_95 = get_cg_95(num_rels)
+    tnr95 = 0.0
+    if rels_found >= cg_95:
+        if num_docs == num_rels:
+            raise ZeroDivisionError("float division by zero")
+        tnr95 = (num_docs - expected_rank_of_relevant(cg_95) - (num_rels - cg_95)) / float(num_docs - num_rels)
+    cgat_ranks = get_cgat_ranks(num_docs, num_shown)
+
+    # MAPBasedMeasures: E[precision at a relevant document at position j of group g] = (c_g + 1 + (j - 1) (r_g - 1) / (n_g - 1)) / (s_g + j)
+    ap = 0.0
+    for g in np.flatnonzero(rels > 0):
+        positions = np.arange(1, sizes[g] + 1)
+        other_rels_above = (positions - 1) * (rels[g] - 1) / (sizes[g] - 1) if sizes[g] > 1 else np.zeros(1)
+        ap += rels[g] / sizes[g] * float(np.sum((rels_before[g] + 1 + other_rels_above) / (starts[g] + positions)))
+    ap = ap / float(num_rels)
+
+    expected_measures = {"ap": ap, "wss_100": wss_100, "wss_95": wss_95, "tnr95": tnr95}
+    for p in range(MAXT):
+        expected_measures[f"R@{p + 1}%"] = expected_gain(int(cgat_ranks[p])) / float(num_rels)
+    return expected_measures
@@ -0,0 +1,208 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import hashlib
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+DEFAULT_CACHE_DIR = "./cache/qrels"
+
+
+def hash_file(filename: str) -> str:
+    """
+    Compute the SHA-256 hash of the content of a file.
+
+    :param filename: Path to the file.
+    :return: Hex digest of the content.
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class QrelStore(object):
+
+    def __init__(self, topics: np.ndarray, topic_offsets: np.ndarray, doc_ids: np.ndarray, judgements: np.ndarray) -> None:
+        """
+        Initialize the QrelStore class, which holds qrels in columns: the documents of the i-th topic are doc_ids[topic_offsets[i]:topic_offsets[i + 1]],
+        sorted by their id, with their judgements as int8. Lookups are binary searches and do not change the store.
+        It provides the query API of TrecQrelHandler (get_value, get_value_if_exists, get_doc_list, get_topic_list, ...) but can not be modified;
+        combined qrels are created with from_entries.
+
+        :param topics: Topic ids in the order of their first occurrence.
+        :param topic_offsets: Start of the documents of each topic (and the number of documents as last element).
+        :param doc_ids: Document ids, sorted within each topic.
+        :param judgements: Judgement of each document.
+        """
+        self.topics = topics
+        self.topic_offsets = topic_offsets
+        self.doc_ids = doc_ids
+        self.judgements = judgements
+        self.topic_index = {topic: i for i, topic in enumerate(topics.tolist())}
+
+    @classmethod
+    def from_entries(cls, topic_ids: Sequence, doc_ids: Sequence, judgements: Sequence) -> "QrelStore":
+        """
+        Create a store from (topic, document, judgement) entries. If a document of a topic occurs several times, the last judgement is used.
+
+        :param topic_ids: Topic id of each entry.
+        :param doc_ids: Document id of each entry.
+        :param judgements: Judgement of each entry.
+        :return: QrelStore with the entries.
+        """
+        topic_ids = np.asarray(topic_ids, dtype=str)
+        doc_ids = np.asarray(doc_ids, dtype=str)
+        judgements = np.asarray(judgements, dtype=np.int8)
+        if len(topic_ids) == 0:
+            return cls(np.array([], dtype=str), np.zeros(1, dtype=np.int64), doc_ids, judgements)
+        topics, first_index, inverse = np.unique(topic_ids, return_index=True, return_inverse=True)
+        topic_order = np.argsort(first_index)
+        topic_codes = np.argsort(topic_order)[inverse.reshape(-1)]
+        # lexsort is stable, so the last entry of a document is the last one of its run
+        order = np.lexsort((doc_ids, topic_codes))
+        topic_codes, doc_ids, judgements = topic_codes[order], doc_ids[order], judgements[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (topic_codes[1:] != topic_codes[:-1]) | (doc_ids[1:] != doc_ids[:-1])
+        topic_codes, doc_ids, judgements = topic_codes[last], doc_ids[last], judgements[last]
+        topic_offsets = np.searchsorted(topic_codes, np.arange(len(topics) + 1)).astype(np.int64)
+        return cls(topics[topic_order], topic_offsets, doc_ids, judgements)
+
+    @classmethod
+    def read_file(cls, filename: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> "QrelStore":
+        """
+        Read a TREC qrel file (topic iteration document judgement). The parsed columns are stored in a binary cache file that is keyed by the
+        hash of the qrel file and are loaded from it as long as the qrel file does not change.
+
+        :param filename: Path to the qrel file.
+        :param cache_dir: Directory of the cache files (None to always parse the file).
+        :return: QrelStore with the qrels.
+        """
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = os.path.join(cache_dir, f"{os.path.basename(filename)}_{hash_file(filename)[:16]}.npz")
+            if os.path.exists(cache_path):
+                with np.load(cache_path, allow_pickle=False) as data:
+                    return cls(data["topics"], data["topic_offsets"], data["doc_ids"], data["judgements"])
+        topic_ids, doc_ids, judgements = [], [], []
+        with open(filename, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 4:
+                    continue
+                topic_ids.append(parts[0])
+                doc_ids.append(parts[2])
+                judgements.append(int(parts[3]))
+        store = cls.from_entries(topic_ids, doc_ids, judgements)
+        if cache_path is not None:
+            store.save_cache(cache_path)
+        return store
+
+    def save_cache(self, cache_path: str) -> None:
+        """
+        Save the columns to a binary file (written to a temporary file and renamed afterwards).
+
+        :param cache_path: Path of the cache file.
+        """
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_path) or ".", suffix=".npz.tmp", delete=False) as f:
+            np.savez(f, topics=self.topics, topic_offsets=self.topic_offsets, doc_ids=self.doc_ids, judgements=self.judgements)
+        os.replace(f.name, cache_path)
+
+    def get_topic_range(self, topic: str) -> Tuple[int, int]:
+        """
+        Get the range of the documents of a topic in the columns.
+
+        :param topic: Topic id.
+        :return: Start and end of the documents of the topic (empty range for unknown topics).
+        """
+        i = self.topic_index.get(topic)
+        if i is None:
+            return 0, 0
+        return int(self.topic_offsets[i]), int(self.topic_offsets[i + 1])
+
+    def get_judgements(self, topic: str) -> np.ndarray:
+        """
+        Get the judgements of all documents of a topic.
+
+        :param topic: Topic id.
+        :return: Array of the judgements (ordered by document id).
+        """
+        start, end = self.get_topic_range(topic)
+        return self.judgements[start:end]
+
+    def get_values(self, topic: str, doc_ids: Sequence[str]) -> np.ndarray:
+        """
+        Look up the judgements of several documents of a topic at once.
+
+        :param topic: Topic id.
+        :param doc_ids: Document ids.
+        :return: Array with the judgement of each document (0 for documents without judgement).
+        """
+        start, end = self.get_topic_range(topic)
+        doc_ids = np.asarray(doc_ids, dtype=str)
+        values = np.zeros(len(doc_ids), dtype=np.int64)
+        if end > start and len(doc_ids) > 0:
+            topic_docs = self.doc_ids[start:end]
+            positions = np.minimum(np.searchsorted(topic_docs, doc_ids), end - start - 1)
+            found = topic_docs[positions] == doc_ids
+            values[found] = self.judgements[start:end][positions[found]]
+        return values
+
+    def find(self, topic: str, doc: str) -> Optional[int]:
+        """
+        Find the position of a document of a topic in the columns.
+
+        :param topic: Topic id.
+        :param doc: Document id.
+        :return: Position of the document (None if the document has no judgement).
+        """
+        start, end = self.get_topic_range(topic)
+        i = start + int(np.searchsorted(self.doc_ids[start:end], doc))
+        if i < end and self.doc_ids[i] == doc:
+            return i
+        return None
+
+    def get_value(self, topic, doc):
+        i = self.find(topic, doc)
+        if i is None:
+            return 0
+        return int(self.judgements[i])
+
+    def get_value_if_exists(self, topic, doc):
+        # like TopicDocumentFileHandler, a judgement of 0 is reported as None
+        value = self.get_value(topic, doc)
+        if value:
+            return value
+        return None
+
+    def get_doc_list(self, topic) -> List[str]:
+        start, end = self.get_topic_range(topic)
+        return self.doc_ids[start:end].tolist()
+
+    def get_topic_list(self) -> List[str]:
+        return self.topics.tolist()
+
+    def get_topic_doc_dict(self) -> Dict[str, Dict[str, int]]:
+        return {topic: dict(zip(self.get_doc_list(topic), self.get_judgements(topic).tolist())) for topic in self.get_topic_list()}
+
+    def get_entries(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get all entries of the store.
+
+        :return: Topic id, document id and judgement of each entry.
+        """
+        return np.repeat(self.topics, np.diff(self.topic_offsets)), self.doc_ids, self.judgements
+
+    def save_file(self, filename, append=False):
+        with open(filename, "a" if append else "w") as outfile:
+            for (topic, doc, judgement) in zip(*(column.tolist() for column in self.get_entries())):
+                outfile.write("%s 0 %s %d\n" % (topic, doc, judgement))
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __str__(self):
+        return 'TOPICS READ IN: ' + str(len(self.topics))
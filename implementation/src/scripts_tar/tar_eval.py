@@ -5,12 +5,12 @@ import os
 import sys
 import re
 from measures.tar_rulers import TarRuler, TarAggRuler
-from seeker.trec_qrel_handler import TrecQrelHandler
+from seeker.qrel_store import QrelStore
 
 
 def main(results_file, qrel_file):
 
-    qrh = TrecQrelHandler(qrel_file)
+    qrh = QrelStore.read_file(qrel_file)
     #print(qrh.get_topic_list()) # show what qrel topics have been read in
     #print( len(qrh.get_topic_list())) # show how many
 
@@ -4,38 +4,19 @@ import os
 import sys
 import re
 import math
+import itertools
 from implementation.src.scripts_tar.measures.tar_rulers_2018 import TarRulerTask2, TarRulerTask1, TarAggRuler
-from implementation.src.scripts_tar.seeker.trec_qrel_handler import TrecQrelHandler
+from implementation.src.scripts_tar.measures.vectorized_measures_2018 import VectorizedTarRulerTask2
+from implementation.src.scripts_tar.seeker.qrel_store import QrelStore, DEFAULT_CACHE_DIR
 
 
-def main(task, results_file, qrel_file):
+def read_results(results_file):
+    """
+    Read a TREC result file.
 
-    qrh = TrecQrelHandler(qrel_file)
-    #print(qrh.get_doc_list('CD009263')) # show the documents in the qrels for the particular topic
-    #print(qrh.get_topic_list()) # show what qrel topics have been read in
-    #print( len(qrh.get_topic_list())) # show how many
-
-
-    def get_value_and_check(qrh, seen_dict, topic_id, doc_id):
-        # checks to make sure the document is in the qrels and was retrieved by the pubmed query
-        v = 0
-        if doc_id in seen_dict:
-            print("{} Duplicate {}".format(topic_id, doc_id))
-            v = None
-        else:
-            seen_dict[d] = 1
-            v = qrh.get_value(topic_id, doc_id)
-            if v >= 3:
-                v = None
-        return v
-
-    skip_topic = False
-    curr_topic_id = ""
-    seen_dict = {}
-
-    tml = []
-    tar_ruler = None
-    average_metrics_new_dict = {} # added to be able to average metrics with macro calculation
+    :param results_file: Path to the TREC format result file.
+    :return: Generator of (topic_id, action, doc_id) tuples in the order of the file.
+    """
     with open(results_file,"r") as rf:
         while rf:
             line = rf.readline()
@@ -43,101 +24,121 @@ def main(task, results_file, qrel_file):
                 break
             # (topic_id, action,doc_id, rank, score, team) = re.split(" |\t",line)
             (topic_id, action, doc_id, rank, score, team) = line.split()
+            yield topic_id, action, doc_id
+
+
+def average_metrics(topic_metrics):
+    """
+    Macro-average the metrics of topics.
+
+    :param topic_metrics: List of the metric dictionaries of the topics (e.g., of TarRulerTask2.finalize).
+    :return: Dictionary of the averaged metrics (None for metrics without numeric values).
+    """
+    average_metrics_new_dict = {}
+    for metric_dict in topic_metrics:
+        for key, value in metric_dict.items():
+            if key not in average_metrics_new_dict:
+                average_metrics_new_dict[key] = []
+            average_metrics_new_dict[key].append(value)
+    averaged_metrics = {}
+    for key, values in average_metrics_new_dict.items():
+        # Ensure values are numeric before summing
+        numeric_values = [v for v in values if isinstance(v, (int, float))]
+        if numeric_values:
+            averaged_metrics[key] = sum(numeric_values) / len(numeric_values)
+        else:
+            averaged_metrics[key] = None # or some default value
+    return averaged_metrics
+
+
+def evaluate(task, qrels, results, verbose=True, vectorized=False):
+    """
+    Evaluate ranked documents against qrels.
+
+    :param task: CLEF TAR task (1 or 2).
+    :param qrels: QrelStore with the judgements of the documents.
+    :param results: Iterable of (topic_id, action, doc_id) tuples, ordered by topic and rank.
+    :param verbose: Whether the scores of each topic and the aggregated scores are printed.
+    :param vectorized: Whether the measures of task 2 are computed with cumulative sums (VectorizedTarRulerTask2) instead of TarRulerTask2; the metrics are the same, but the aggregated scores are not printed.
+    :return: Dictionary of the metrics, macro-averaged over the topics.
+    """
+    tml = []
+    topic_metrics = [] # added to be able to average metrics with macro calculation
+    # the documents of a topic are judged at once; a topic that occurs again later starts a new block
+    for (topic_id, block) in itertools.groupby(results, key=lambda result: result[0]):
+        judgements = qrels.get_judgements(topic_id)
+        if task == 1:
+            num_docs = 5000
+        else:
+            num_docs = len(judgements)
+        num_rels_in_set = int(((judgements == 1) | (judgements == 2)).sum())
+        num_docs_in_set = num_docs - int(((judgements == -1) | (judgements > 2)).sum())
 
-            if (topic_id == curr_topic_id):
-                if (skip_topic is False):
-                    # accumulate
-                    #v = qrh.get_value(curr_topic_id, doc_id.strip())
-                    d = doc_id.strip()
-                    v = get_value_and_check(qrh, seen_dict, curr_topic_id, d)
-
-                    if v is not None:
-                        tar_ruler.update(v,v,action)
-                else:
-                    continue
+        if (num_rels_in_set == 0):
+            print("Skipping topic: {0}".format(topic_id))
+            continue
+
+        #print("D: {0} DS: {1} RS: {2} ".format(num_docs,num_docs_in_set, num_rels_in_set))
+        if task == 1:
+            tar_ruler = TarRulerTask1(topic_id, num_docs_in_set, num_rels_in_set)
+        else:
+            if vectorized:
+                tar_ruler = VectorizedTarRulerTask2(topic_id, num_docs_in_set, num_rels_in_set)
             else:
-                if curr_topic_id != "":
-                    if skip_topic is False:
-                        # begin: modified code
-                        metric_dict = tar_ruler.finalize()
-                        for key, value in metric_dict.items():
-                            if key not in average_metrics_new_dict:
-                                average_metrics_new_dict[key] = []
-                            average_metrics_new_dict[key].append(value)
-                        # end: modified code
-                        tml.append(tar_ruler)
-                        tar_ruler.print_scores()
-                    else:
-                        skip_topic = False
-
-                # new topic
-                curr_topic_id = topic_id
-                dl = qrh.get_doc_list(topic_id)
-                if task == 1:
-                    num_docs = 5000
-                else:
-                    num_docs = len(dl)
-                num_rels = 0
-                num_rels_in_set = 0
-                num_docs_in_set = num_docs
-                for d in dl:
-                    val = qrh.get_value(topic_id, d)
-                    if val > 0:
-                        num_rels = num_rels + 1
-                    if val == 1 or val == 2:
-                        num_rels_in_set = num_rels_in_set + 1
-
-                    if val == -1 or val > 2:
-                        num_docs_in_set = num_docs_in_set - 1
-
-                if (num_rels_in_set == 0):
-                    print("Skipping topic: {0}".format(curr_topic_id))
-                    skip_topic = True
-                    continue
-
-                #print("D: {0} DS: {1} R: {2} RS: {3} ".format(num_docs,num_docs_in_set,num_rels, num_rels_in_set))
-                if task == 1:
-                    tar_ruler = TarRulerTask1(topic_id, num_docs_in_set, num_rels_in_set)
-                else:
-                    tar_ruler = TarRulerTask2(topic_id, num_docs_in_set, num_rels_in_set)
-
-                # reset seen list
-                seen_dict = {}
-                d = doc_id.strip()
-
-
-                v = get_value_and_check(qrh, seen_dict, topic_id, d)
-                if v is not None:
-                    tar_ruler.update(v,v,action)
-
-        if skip_topic is False:
-            # begin: modified code
-            metric_dict = tar_ruler.finalize()
-            for key, value in metric_dict.items():
-                if key not in average_metrics_new_dict:
-                    average_metrics_new_dict[key] = []
-                average_metrics_new_dict[key].append(value)
-            # end: modified code
-            tml.append(tar_ruler)
+                tar_ruler = TarRulerTask2(topic_id, num_docs_in_set, num_rels_in_set)
+
+        block = [(action, doc_id.strip()) for (_, action, doc_id) in block]
+        values = qrels.get_values(topic_id, [d for (_, d) in block]).tolist()
+        seen_dict = {}
+        for ((action, d), v) in zip(block, values):
+            # checks to make sure the document is in the qrels and was retrieved by the pubmed query
+            if d in seen_dict:
+                print("{} Duplicate {}".format(topic_id, d))
+                continue
+            seen_dict[d] = 1
+            if v < 3:
+                tar_ruler.update(v,v,action)
+
+        topic_metrics.append(tar_ruler.finalize())
+        tml.append(tar_ruler)
+        if verbose:
             tar_ruler.print_scores()
 
+    if verbose and not vectorized:
         agg_tar = TarAggRuler(task)
 
         for tar in tml:
             agg_tar.update(tar)
         metric_dict = agg_tar.finalize()
         agg_tar.print_scores()
-        averaged_metrics = {}
-        # begin: modified code
-        for key, values in average_metrics_new_dict.items():
-            # Ensure values are numeric before summing
-            numeric_values = [v for v in values if isinstance(v, (int, float))]
-            if numeric_values:
-                averaged_metrics[key] = sum(numeric_values) / len(numeric_values)
-            else:
-                averaged_metrics[key] = None # or some default value
-        return averaged_metrics
-        # end: modified code
+    return average_metrics(topic_metrics)
+
+
+def evaluate_rankings(task, rankings, verbose=False):
+    """
+    Evaluate rankings that are held in memory, without writing TREC files. The metrics are the same as the ones of main for the equivalent
+    result file (rank i, score -i, action 0) and qrel file (the labels of the ranked documents).
+
+    :param task: CLEF TAR task (1 or 2).
+    :param rankings: List of (topic_id, doc_ids, labels) tuples; doc_ids are ordered by rank and labels are the judgements of the documents.
+    :param verbose: Whether the scores of each topic and the aggregated scores are printed.
+    :return: Dictionary of the metrics, macro-averaged over the topics.
+    """
+    qrels = QrelStore.from_entries([str(topic_id) for (topic_id, doc_ids, labels) in rankings for _ in doc_ids],
+                                   [str(doc_id) for (topic_id, doc_ids, labels) in rankings for doc_id in doc_ids],
+                                   [int(label) for (topic_id, doc_ids, labels) in rankings for label in labels])
+    results = ((str(topic_id), "0", str(doc_id)) for (topic_id, doc_ids, labels) in rankings for doc_id in doc_ids)
+    return evaluate(task, qrels, results, verbose, vectorized=(task == 2))
+
+
+def main(task, results_file, qrel_file, cache_dir=None):
+
+    qrels = QrelStore.read_file(qrel_file, cache_dir=cache_dir)
+    #print(qrels.get_doc_list('CD009263')) # show the documents in the qrels for the particular topic
+    #print(qrels.get_topic_list()) # show what qrel topics have been read in
+    #print( len(qrels.get_topic_list())) # show how many
+    return evaluate(task, qrels, read_results(results_file))
+
 
 def usage(args):
     print("Usage: {0} <task> <qrel_file> <results_file>".format(args[0]))
@@ -158,6 +159,6 @@ if __name__ == "__main__":
         usage(sys.argv)
         exit(1)
     if os.path.exists( results ) and os.path.exists(qrels):
-        main(task, results,qrels)
+        main(task, results,qrels, cache_dir=DEFAULT_CACHE_DIR)
     else:
         usage(sys.argv)
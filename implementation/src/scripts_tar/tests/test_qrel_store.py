@@ -0,0 +1,73 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from implementation.src.scripts_tar.seeker.qrel_store import QrelStore
+from implementation.src.scripts_tar.seeker.trec_qrel_handler import TrecQrelHandler
+
+
+def write_random_qrels(filename, rng):
+    with open(filename, "w") as f:
+        for t in rng.sample(range(100), 5):
+            for d in rng.sample(range(10000), rng.randint(1, 300)):
+                f.write("CD{0}\t0\t{1}\t{2}\n".format(t, d, rng.choice([-1, 0, 0, 0, 1, 2, 3, 4])))
+        # a document that is judged again (the last judgement is used)
+        f.write("CD{0} 0 {1} {2}\n".format(t, d, 2))
+
+
+class QrelStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.qrel_file = os.path.join(self.tmp_dir, "qrels.txt")
+        write_random_qrels(self.qrel_file, random.Random(0))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def testHandlerApi(self):
+        qrh = TrecQrelHandler(self.qrel_file)
+        qrels = QrelStore.read_file(self.qrel_file, cache_dir=None)
+        self.assertEqual(qrels.get_topic_list(), qrh.get_topic_list())
+        self.assertEqual(qrels.get_topic_doc_dict(), qrh.get_topic_doc_dict())
+        for topic_id in qrh.get_topic_list() + ["CD-1"]:
+            doc_list = list(qrh.get_doc_list(topic_id))
+            self.assertEqual(sorted(qrels.get_doc_list(topic_id)), sorted(doc_list))
+            for doc_id in doc_list + ["-1"]:
+                self.assertEqual(qrels.get_value_if_exists(topic_id, doc_id), qrh.get_value_if_exists(topic_id, doc_id))
+                self.assertEqual(qrels.get_value(topic_id, doc_id), qrh.get_value(topic_id, doc_id))
+            self.assertEqual(qrels.get_values(topic_id, doc_list + ["-1"]).tolist(), [qrh.get_value(topic_id, d) for d in doc_list + ["-1"]])
+
+    def testLookupHasNoSideEffects(self):
+        qrels = QrelStore.read_file(self.qrel_file, cache_dir=None)
+        num_entries = len(qrels)
+        topic_id = qrels.get_topic_list()[0]
+        self.assertEqual(qrels.get_value(topic_id, "-1"), 0)
+        self.assertEqual(qrels.get_value("CD-1", "-1"), 0)
+        self.assertEqual(len(qrels), num_entries)
+        self.assertNotIn("-1", qrels.get_doc_list(topic_id))
+        self.assertNotIn("CD-1", qrels.get_topic_list())
+
+    def testCache(self):
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        qrels = QrelStore.read_file(self.qrel_file, cache_dir=cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        cached_qrels = QrelStore.read_file(self.qrel_file, cache_dir=cache_dir)
+        self.assertEqual(cached_qrels.get_topic_doc_dict(), qrels.get_topic_doc_dict())
+        # a changed qrel file is parsed again
+        with open(self.qrel_file, "a") as f:
+            f.write("CD-1 0 1 1\n")
+        changed_qrels = QrelStore.read_file(self.qrel_file, cache_dir=cache_dir)
+        self.assertEqual(changed_qrels.get_value("CD-1", "1"), 1)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def testSaveFile(self):
+        qrels = QrelStore.read_file(self.qrel_file, cache_dir=None)
+        saved_file = os.path.join(self.tmp_dir, "saved.txt")
+        qrels.save_file(saved_file)
+        self.assertEqual(TrecQrelHandler(saved_file).get_topic_doc_dict(), TrecQrelHandler(self.qrel_file).get_topic_doc_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import itertools
+import random
+import unittest
+import numpy as np
+from implementation.src.scripts_tar.measures.tar_rulers_2018 import TarRulerTask2
+from implementation.src.scripts_tar.measures.vectorized_measures_2018 import compute_task2_expected_measures, compute_task2_measures, compute_task2_measures_of_permutations
+from implementation.src.scripts_tar.measures.vectorized_measures_2018 import compute_task2_metrics, compute_task2_recall_at, permute_within_groups
+from implementation.src.scripts_tar.tar_eval_2018 import average_metrics, evaluate_rankings, evaluate
+from implementation.src.scripts_tar.seeker.qrel_store import QrelStore
+
+
+def ruler_metrics(judgments, num_docs, num_rels, actions=None):
+    tar_ruler = TarRulerTask2('A', num_docs, num_rels)
+    for i, judgment in enumerate(judgments):
+        tar_ruler.update(judgment, judgment, str(actions[i]) if actions else '0')
+    return tar_ruler.finalize()
+
+
+def random_topic(rng, max_docs=300):
+    num_shown = rng.randint(0, max_docs)
+    p = rng.random()
+    judgments = [rng.choice([1, 2]) if rng.random() < p else rng.choice([0, 0, 0, -1]) for _ in range(num_shown)]
+    num_rels = max(1, sum(1 for v in judgments if 0 < v < 3) + rng.choice([0, 0, 0, 1, 4]))
+    num_docs = max(num_rels + 1, num_shown + rng.choice([0, 0, -3, 10, 200]))
+    return judgments, num_docs, num_rels
+
+
+def tie_group_arrangements(sizes, rels):
+    # all placements of the relevant documents within each group (each placement is equally likely under random tie-breaking)
+    placements = []
+    for size, num_rels in zip(sizes, rels):
+        placements.append([[int(i in positions) for i in range(size)] for positions in itertools.combinations(range(size), num_rels)])
+    return np.array([sum(combination, []) for combination in itertools.product(*placements)])
+
+
+class VectorizedMeasuresTests(unittest.TestCase):
+
+    def testRandomRankings(self):
+        rng = random.Random(0)
+        for _ in range(1000):
+            judgments, num_docs, num_rels = random_topic(rng)
+            self.assertEqual(compute_task2_metrics(judgments, num_docs, num_rels), ruler_metrics(judgments, num_docs, num_rels))
+
+    def testKeyOrder(self):
+        judgments = [0, 1, 0, 0, 1, 1, 0]
+        self.assertEqual(list(compute_task2_metrics(judgments, 20, 3)), list(ruler_metrics(judgments, 20, 3)))
+
+    def testThresholdActions(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            judgments, num_docs, num_rels = random_topic(rng)
+            if len(judgments) == 0:
+                continue
+            actions = [0] * len(judgments)
+            for _ in range(rng.randint(1, 3)):
+                actions[rng.randrange(len(judgments))] = 1
+            self.assertEqual(compute_task2_metrics(judgments, num_docs, num_rels, actions), ruler_metrics(judgments, num_docs, num_rels, actions))
+
+    def testTnr95AtLastNonRelevant(self):
+        # the true negatives are zero at the rank reaching 95% recall, so the ruler computes TNR@95% again at the next rank
+        rng = random.Random(2)
+        for _ in range(500):
+            judgments = [int(rng.random() < 0.8) for _ in range(rng.randint(1, 40))]
+            num_rels = max(1, sum(judgments))
+            num_docs = num_rels + rng.choice([1, 2])
+            self.assertEqual(compute_task2_metrics(judgments, num_docs, num_rels), ruler_metrics(judgments, num_docs, num_rels))
+
+    def testBatch(self):
+        rng = np.random.default_rng(3)
+        judgments = (rng.random(200) < 0.1).astype(int)
+        num_rels = int(judgments.sum())
+        permutations = np.stack([rng.permutation(judgments) for _ in range(20)])
+        measures = compute_task2_measures(permutations, 250, num_rels)
+        for i in range(len(permutations)):
+            expected = ruler_metrics(permutations[i].tolist(), 250, num_rels)
+            self.assertEqual(measures['ap'][i], expected['ap'])
+            self.assertEqual(measures['tnr95'][i], expected['tnr95'])
+            self.assertEqual(measures['cgat'][i].tolist(), expected['cgat'])
+
+    def testPermuteWithinGroups(self):
+        groups = np.repeat([3, 1, 2, 0], [10, 1, 25, 40])
+        permutations = permute_within_groups(np.arange(len(groups)), groups, 100, np.random.default_rng(5))
+        self.assertTrue((groups[permutations] == groups).all())
+        for permutation in permutations:
+            self.assertEqual(sorted(permutation.tolist()), list(range(len(groups))))
+        self.assertGreater(len(set(tuple(permutation[36:]) for permutation in permutations)), 90)
+
+    def testPermutationChunks(self):
+        rng = np.random.default_rng(6)
+        judgments = (rng.random(150) < 0.2).astype(int)
+        groups = np.sort(rng.integers(0, 3, 150))
+        num_rels = int(judgments.sum())
+        measures = compute_task2_measures_of_permutations(judgments, groups, 160, num_rels, 25, seed=1, max_elements=1000)
+        permutations = permute_within_groups(judgments, groups, 25, np.random.default_rng(1))
+        self.assertEqual(len(measures['ap']), 25)
+        for i in range(25):
+            expected = ruler_metrics(permutations[i].tolist(), 160, num_rels)
+            self.assertEqual(measures['ap'][i], expected['ap'])
+            self.assertEqual(measures['R@10%'][i], expected['R@10%'])
+
+    def testExpectedMeasures(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            sizes = [rng.randint(1, 6) for _ in range(rng.randint(1, 4))]
+            rels = [rng.randint(0, size) for size in sizes]
+            if sum(rels) == 0:
+                continue
+            num_rels = sum(rels) + rng.choice([0, 0, 1])
+            num_docs = sum(sizes) + rng.choice([0, 0, 3])
+            if num_docs == num_rels:
+                num_docs += 1
+            judgments = tie_group_arrangements(sizes, rels)
+            groups = np.repeat(np.arange(len(sizes))[::-1], sizes)
+            measures = compute_task2_measures(judgments, num_docs, num_rels)
+            measures.update(compute_task2_recall_at(measures))
+            for key, value in compute_task2_expected_measures(judgments[0], groups, num_docs, num_rels).items():
+                self.assertAlmostEqual(value, measures[key].mean(), places=12)
+
+    def testEvaluateRankings(self):
+        rng = random.Random(4)
+        rankings = []
+        for t in range(5):
+            doc_ids = rng.sample(range(100000), rng.randint(2, 200))
+            labels = [int(rng.random() < 0.1) for _ in doc_ids]
+            labels[0] = 1
+            rankings.append(('CD{0}'.format(t), doc_ids, labels))
+        qrels = QrelStore.from_entries([topic_id for (topic_id, doc_ids, labels) in rankings for _ in doc_ids],
+                                       [str(doc_id) for (topic_id, doc_ids, labels) in rankings for doc_id in doc_ids],
+                                       [label for (topic_id, doc_ids, labels) in rankings for label in labels])
+        results = [(topic_id, '0', str(doc_id)) for (topic_id, doc_ids, labels) in rankings for doc_id in doc_ids]
+        self.assertEqual(evaluate_rankings(2, rankings), evaluate(2, qrels, results, verbose=False))
+
+    def testAverageOfRunMetrics(self):
+        # the metrics of the runs of an experiment can be evaluated (and cached) one by one
+        rng = random.Random(8)
+        rankings = []
+        for t in range(6):
+            doc_ids = rng.sample(range(100000), rng.randint(2, 300))
+            labels = [int(rng.random() < 0.1) for _ in doc_ids]
+            rankings.append(('CD{0}'.format(t), doc_ids, labels))
+        self.assertEqual(average_metrics([evaluate_rankings(2, [ranking]) for ranking in rankings]), evaluate_rankings(2, rankings))
+
+
+if __name__ == '__main__':
+    unittest.main()
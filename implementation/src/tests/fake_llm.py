@@ -0,0 +1,160 @@
+import json
+from typing import Callable, Dict, List, Optional
+import pandas as pd
+from implementation.src.client.response_cache import CachedCompletionOutput, CachedRequestOutput
+from implementation.src.config.config import Config
+from implementation.src.prompts.prompt_builder import PromptBuilder
+from implementation.src.prompts.prompt_handler import PromptHandler
+from implementation.src.prompts.prompt_templates import zero_shot_prompt_template
+from implementation.src.prompts.system_message_templates import system_message_rq
+
+SLR_INFOS = {
+    "title": "Test review",
+    "research_questions": "Does the test pass?",
+    "inclusion_criteria": "- Papers about tests",
+    "exclusion_criteria": "- Papers about anything else",
+}
+
+# keys of a log file that depend on the time of the run
+VOLATILE_LOG_KEYS = ["Date and Time", "total_computation_time"]
+
+# temperature of the resubmissions of prompts without a valid decision
+RETRY_TEMPERATURE = 0.5
+
+
+class Interrupt(BaseException):
+    # like a killed job, the interrupt is not caught by the error handling of the PromptHandler
+    pass
+
+
+class FakeLLM:
+    def __init__(self, respond: Callable[[str, int, int], str], interrupt: Optional[Callable[[List[List[Dict[str, str]]]], bool]] = None, tokenizer=None) -> None:
+        """
+        Fake vllm LLM instance. The response to a prompt only depends on the prompt (the last user message), the attempt and the number of the sample,
+        so that the same prompts get the same responses regardless of how they are batched. A submission with the retry temperature is the next attempt
+        of the previous submission of the same message list; any other submission is attempt 0.
+
+        :param respond: Function that creates the response text from the prompt, the attempt and the number of the sample.
+        :param interrupt: Optional function that gets the message lists of a submission and returns True if the submission raises an Interrupt.
+        :param tokenizer: Optional tokenizer that is returned by get_tokenizer.
+        """
+        self.respond = respond
+        self.interrupt = interrupt
+        self.tokenizer = tokenizer
+        self.attempts: Dict[str, int] = {}
+        self.calls: List[int] = []
+
+    def get_tokenizer(self):
+        return self.tokenizer
+
+    def chat(self, messages, sampling_params, **kwargs):
+        if len(messages) > 0 and isinstance(messages[0], dict):
+            messages = [messages]
+        params = sampling_params if isinstance(sampling_params, list) else [sampling_params] * len(messages)
+        if self.interrupt is not None and self.interrupt(messages):
+            raise Interrupt()
+        self.calls.append(len(messages))
+        responses = []
+        for message_list, prompt_params in zip(messages, params):
+            key = json.dumps(message_list, sort_keys=True)
+            attempt = self.attempts.get(key, -1) + 1 if prompt_params.temperature == RETRY_TEMPERATURE else 0
+            self.attempts[key] = attempt
+            outputs = []
+            for sample in range(prompt_params.n):
+                text = self.respond(message_list[-1]["content"], attempt, sample)
+                outputs.append(CachedCompletionOutput(index=sample, text=text, token_ids=list(range(len(text.split()))), finish_reason="stop", stop_reason=None, logprobs=None))
+            prompt_token_ids = list(range(len(" ".join(message["content"] for message in message_list).split())))
+            responses.append(CachedRequestOutput(prompt_token_ids=prompt_token_ids, outputs=outputs, num_cached_tokens=len(prompt_token_ids) // 2))
+        return responses
+
+
+def create_config(output_dir: str, relevance_upper_value: int = 4, **llm_client_config) -> Config:
+    """
+    Create the configuration of a test run.
+
+    :param output_dir: Output directory of the run.
+    :param relevance_upper_value: Upper value of the scale.
+    :param llm_client_config: Settings of the LLM client that differ from the defaults of the test.
+    :return: Configuration object.
+    """
+    return Config(
+        folder_path_slrs="",
+        file_path_slr_infos="",
+        llm_client_output_directory_path=output_dir,
+        relevance_lower_value="0",
+        relevance_upper_value=str(relevance_upper_value),
+        folder_path_few_shot_examples="",
+        llm_client_config={
+            "is_few_shot": False,
+            "few_shot_example_seed": 42,
+            "prompting_technique": "zero_shot",
+            "temperature": 0,
+            "number_consistency_path": 0,
+            "system_message_type": "system_message_rq",
+            "ordering_few_shot_examples": "",
+            "num_of_max_requests": 3,
+            "name_of_model": "Llama3.1-8B",
+            "path_to_model": "path/to/model",
+            "path_to_reranker": "",
+            "different_examples": False,
+            **llm_client_config,
+        },
+    )
+
+
+def create_dataset(num_papers: int) -> pd.DataFrame:
+    """
+    Create a dataset of papers with the titles "paper 0", "paper 1", ...
+
+    :param num_papers: Number of papers.
+    :return: Dataframe of the papers.
+    """
+    return pd.DataFrame({
+        "id": list(range(1, num_papers + 1)),
+        "title": [f"paper {k}" for k in range(num_papers)],
+        "abstract": [f"abstract of paper {k}" for k in range(num_papers)],
+        "label": [int(k % 3 == 0) for k in range(num_papers)],
+    })
+
+
+def create_prompt_handler(config: Config, client, dataset: pd.DataFrame, slr_name: str = "test_slr") -> PromptHandler:
+    """
+    Create a PromptHandler for a test run with the zero-shot prompt.
+
+    :param config: Configuration object.
+    :param client: (Fake) LLM client.
+    :param dataset: Dataset of papers.
+    :param slr_name: Name of the SLR.
+    :return: PromptHandler.
+    """
+    return PromptHandler(
+        config=config,
+        slr_infos_df=SLR_INFOS,
+        client=client,
+        dataset=dataset,
+        prompt_builder=PromptBuilder(config),
+        prompt_template=[zero_shot_prompt_template],
+        system_message=system_message_rq,
+        few_shot_examples=None,
+        slr_name=slr_name,
+    )
+
+
+def get_paper_number(prompt: str) -> int:
+    """
+    Get the number of the paper from a prompt of a dataset created by create_dataset.
+
+    :param prompt: Prompt (last user message).
+    :return: Number of the paper.
+    """
+    return int(prompt.split("Title: 'paper ")[1].split("'")[0])
+
+
+def strip_log_file(log_file: Dict) -> Dict:
+    """
+    Remove the entries of a log file that depend on the time of the run.
+
+    :param log_file: Content of a log file.
+    :return: Log file without these entries.
+    """
+    return {key: value for key, value in log_file.items() if key not in VOLATILE_LOG_KEYS}
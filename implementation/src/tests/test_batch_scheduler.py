@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+from implementation.src.prompts.batch_scheduler import BatchScheduler
+from implementation.src.tests.fake_llm import FakeLLM, create_config, create_dataset, create_prompt_handler, get_paper_number, strip_log_file
+from implementation.src.utils.file_utils import load_json_file
+
+MAX_BATCH_SIZE = 7
+
+
+def respond(prompt: str, attempt: int, sample: int) -> str:
+    paper_number = get_paper_number(prompt)
+    if attempt < paper_number % 4:
+        return f"I am not sure about paper {paper_number} (attempt {attempt})."
+    return f"The paper is relevant.\nDecision: {paper_number % 5}"
+
+
+class BatchSchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        # cells with different scales, SLRs, dataset sizes and numbers of runs (12 + 9 + 2 * 5 = 31 prompts in the first run)
+        self.cells = [
+            {"slr_name": "slr_a", "relevance_upper_value": 4, "num_papers": 12, "llm_client_config": {}},
+            {"slr_name": "slr_a", "relevance_upper_value": 9, "num_papers": 9, "llm_client_config": {}},
+            {"slr_name": "slr_b", "relevance_upper_value": 4, "num_papers": 5, "llm_client_config": {"number_consistency_path": 1}},
+        ]
+
+    def create_prompt_handlers(self, client):
+        prompt_handlers = []
+        for cell in self.cells:
+            config = create_config(tempfile.mkdtemp() + "/", relevance_upper_value=cell["relevance_upper_value"], **cell["llm_client_config"])
+            prompt_handlers.append(create_prompt_handler(config, client, create_dataset(cell["num_papers"]), slr_name=cell["slr_name"]))
+        return prompt_handlers
+
+    @staticmethod
+    def load_log_files(prompt_handler, foldername, file_names):
+        return [strip_log_file(load_json_file(prompt_handler.llm_client_output_directory_path + foldername + file_name)) for file_name in file_names]
+
+    def testSameLogFilesAsSequentialCells(self):
+        expected = []
+        for prompt_handler in self.create_prompt_handlers(FakeLLM(respond)):
+            foldername, file_names = prompt_handler.evaluate_papers_by_llm_client(0)
+            expected.append(self.load_log_files(prompt_handler, foldername, file_names))
+
+        client = FakeLLM(respond)
+        scheduler = BatchScheduler(client, max_batch_size=MAX_BATCH_SIZE)
+        prompt_handlers = self.create_prompt_handlers(client)
+        for prompt_handler in prompt_handlers:
+            scheduler.add_cell(prompt_handler, 0)
+        results = scheduler.run()
+
+        # the prompts of the first run were split into several submissions
+        self.assertGreater(len(client.calls), 31 // MAX_BATCH_SIZE)
+        self.assertTrue(all(num_prompts <= MAX_BATCH_SIZE for num_prompts in client.calls))
+        self.assertEqual([len(file_names) for _, file_names in results], [1, 1, 2])
+        for prompt_handler, (foldername, file_names), expected_log_files in zip(prompt_handlers, results, expected):
+            self.assertEqual(self.load_log_files(prompt_handler, foldername, file_names), expected_log_files)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import io
+import random
+import shutil
+import tempfile
+import unittest
+import sentencepiece as spm
+import torch
+from transformers import T5Config, T5ForConditionalGeneration, T5Tokenizer
+from implementation.src.client.monoT5_client import MonoT5Client
+
+# maximal absolute difference between the scores of the batched scorer and of generate (float32 on CPU, padded vs. unpadded inputs)
+SCORE_TOLERANCE = 1e-4
+
+QUERY = "Screening of studies  on covid-19 in children: a systematic review"
+
+DOCUMENTS = [
+    "true",
+    "A randomized trial of the effect of screening on patients.",
+    "Background:\n methods,  results and conclusion of the study (2019).",
+    "Ünïcode dätä analysis – with “quotes”, tabs\tand 123 numbers",
+    " leading and trailing whitespace ",
+    "false false false",
+    " ".join(["machine learning model of the review data"] * 120),
+]
+
+
+def create_sentencepiece_model() -> bytes:
+    # small vocabulary (with "▁true" and "▁false") trained offline, so that the test does not need to download a model
+    rng = random.Random(0)
+    words = "Query: Document: Relevant: true false the of and a in to for is on with study patients effect trial review systematic screening results methods data".split()
+    syllables = ["ba", "ko", "ri", "tu", "me", "sa", "lo", "ne", "pi", "da", "ge", "fu", "zy", "xo", "qu"]
+
+    def create_word():
+        if rng.random() < 0.6:
+            return rng.choice(words)
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(1, 4)))
+    sentences = [" ".join(create_word() for _ in range(12)) for _ in range(3000)]
+    model = io.BytesIO()
+    spm.SentencePieceTrainer.train(
+        sentence_iterator=iter(sentences), model_writer=model, vocab_size=300, model_type="unigram",
+        pad_id=0, eos_id=1, unk_id=2, bos_id=-1, hard_vocab_limit=False, minloglevel=2,
+    )
+    return model.getvalue()
+
+
+def get_relevance_scores_per_document(model, tokenizer, query, documents):
+    # reference: the scoring that generated two tokens for each document on its own with the slow tokenizer
+    relevance_scores = []
+    for doc in documents:
+        input_text = f"Query: {query} Document: {doc} Relevant:"
+        inputs = tokenizer.encode(input_text, return_tensors="pt", truncation=True, max_length=512)
+        with torch.no_grad():
+            outputs = model.generate(inputs, max_length=2, return_dict_in_generate=True, output_scores=True)
+        logits = outputs.scores[0].squeeze()
+        true_logit = logits[tokenizer.convert_tokens_to_ids("▁true")].item()
+        false_logit = logits[tokenizer.convert_tokens_to_ids("▁false")].item()
+        relevance_scores.append(true_logit - false_logit)
+    return relevance_scores
+
+
+class MonoT5ClientTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # tiny randomly initialised T5 with the tokenizer files of a monoT5 checkpoint (only spiece.model)
+        cls.model_path = tempfile.mkdtemp() + "/monoT5_tiny"
+        torch.manual_seed(0)
+        config = T5Config(vocab_size=400, d_model=32, d_kv=8, d_ff=64, num_layers=2, num_decoder_layers=2, num_heads=4, decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+        T5ForConditionalGeneration(config).eval().save_pretrained(cls.model_path)
+        with open(cls.model_path + "/spiece.model", "wb") as file:
+            file.write(create_sentencepiece_model())
+        cls.client = MonoT5Client(cls.model_path)
+        cls.slow_tokenizer = T5Tokenizer.from_pretrained(cls.model_path, legacy=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.model_path, ignore_errors=True)
+
+    def testTrueAndFalseAreSingleTokens(self):
+        self.assertNotIn(self.client.tokenizer.unk_token_id, [self.client.true_token_id, self.client.false_token_id])
+
+    def testSameTokenizationAsSlowTokenizer(self):
+        input_texts = [f"Query: {QUERY} Document: {doc} Relevant:" for doc in DOCUMENTS]
+        expected = [self.slow_tokenizer.encode(input_text, truncation=True, max_length=512) for input_text in input_texts]
+        self.assertEqual(self.client.tokenizer(input_texts, truncation=True, max_length=512)["input_ids"], expected)
+        self.assertEqual([self.client.true_token_id, self.client.false_token_id], self.slow_tokenizer.convert_tokens_to_ids(["▁true", "▁false"]))
+
+    def testSameScoresAsGenerate(self):
+        expected = get_relevance_scores_per_document(self.client.model, self.slow_tokenizer, QUERY, DOCUMENTS)
+        # small token budget, so that documents of different lengths are padded in the same batch
+        relevance_scores = self.client.get_relevance_scores(QUERY, DOCUMENTS, batch_size=2)
+        self.assertEqual(len(relevance_scores), len(DOCUMENTS))
+        for score, expected_score in zip(relevance_scores, expected):
+            self.assertAlmostEqual(score, expected_score, delta=SCORE_TOLERANCE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from implementation.src.tests.fake_llm import create_config
+from implementation.src.utils import parallel_evaluation
+from implementation.src.utils.file_utils import save_to_json
+from implementation.src.utils.parallel_evaluation import evaluate_runs
+
+NUM_PAPERS = 20
+
+
+class MetricsCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp() + "/"
+        self.folder_path_slrs = self.tmp_dir + "synergy/"
+        os.makedirs(self.folder_path_slrs)
+        for slr_name in ["slr_a", "slr_b"]:
+            pd.DataFrame({
+                "doi": [f"10.1/{k}" for k in range(NUM_PAPERS)],
+                "title": [f"paper {k}" for k in range(NUM_PAPERS)],
+                "abstract": [f"abstract of paper {k}" for k in range(NUM_PAPERS)],
+                "label_included": [int(k % 4 == 0) for k in range(NUM_PAPERS)],
+            }).to_csv(f"{self.folder_path_slrs}{slr_name}.csv", index=False)
+        self.runs = []
+        for k, slr_name in enumerate(["slr_a", "slr_b"]):
+            run = f"{self.tmp_dir}experiment/{slr_name}_zero_shot_Llama3.1-8B_2025.01.01_00-00-00_{NUM_PAPERS}_{k}"
+            os.makedirs(run)
+            self.write_ranking(run, list(range(1, NUM_PAPERS + 1)))
+            self.runs.append((run, self.folder_path_slrs))
+        self.config = create_config(self.tmp_dir)
+        self.config.folder_path_slrs = self.folder_path_slrs
+        self.cache_path = self.tmp_dir + "metrics.sqlite"
+
+    @staticmethod
+    def write_ranking(run, ids):
+        save_to_json({"ids": ids}, "ranked_df.json", run + "/")
+
+    def evaluate(self, config=None):
+        # counts the runs that are evaluated (not served from the cache)
+        with mock.patch.object(parallel_evaluation, "evaluate_run", wraps=parallel_evaluation.evaluate_run) as evaluate_run:
+            metrics = evaluate_runs(self.runs, config or self.config, "ranking", False, 1, self.cache_path)
+        return metrics, [call.args[0] for call in evaluate_run.call_args_list]
+
+    def testOnlyChangedRunsAreEvaluated(self):
+        metrics, evaluated = self.evaluate()
+        self.assertEqual(evaluated, [run for run, _ in self.runs])
+
+        cached_metrics, evaluated = self.evaluate()
+        self.assertEqual(evaluated, [])
+        self.assertEqual(cached_metrics, metrics)
+
+        self.write_ranking(self.runs[0][0], list(range(NUM_PAPERS, 0, -1)))
+        changed_metrics, evaluated = self.evaluate()
+        self.assertEqual(evaluated, [self.runs[0][0]])
+        self.assertNotEqual(changed_metrics[0]["ap"], metrics[0]["ap"])
+        self.assertEqual(changed_metrics[1], metrics[1])
+
+    def testChangedSettingsAreEvaluated(self):
+        self.evaluate()
+        config = self.config.model_copy(deep=True)
+        config.relevance_upper_value = "9"
+        _, evaluated = self.evaluate(config)
+        self.assertEqual(len(evaluated), 2)
+
+        settings = parallel_evaluation.get_evaluation_settings(self.config, self.folder_path_slrs, False)
+        run = self.runs[0][0]
+        self.assertNotEqual(
+            parallel_evaluation.get_run_hash(run, "ranking", settings),
+            parallel_evaluation.get_run_hash(run, "ranking", {**settings, "self_consistency_mode": "n_samples"}),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
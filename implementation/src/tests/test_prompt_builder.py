@@ -0,0 +1,93 @@
+import math
+import re
+import tempfile
+import unittest
+from types import SimpleNamespace
+from implementation.src.client.response_cache import CachedCompletionOutput, CachedLogprob
+from implementation.src.prompts.prompt_builder import PromptBuilder, extract_decision_top_logprobs
+from implementation.src.tests.fake_llm import FakeLLM, create_config, create_dataset, create_prompt_handler
+
+
+def create_output(positions, token_ids):
+    # fake vllm output: one dict from token id to logprob per generated position
+    logprobs = [{token_id: CachedLogprob(math.log(probability), rank, token) for rank, (token_id, token, probability) in enumerate(position, start=1)} for position in positions]
+    return CachedCompletionOutput(index=0, text="", token_ids=token_ids, finish_reason="length", stop_reason=None, logprobs=logprobs)
+
+
+def create_prompt_builder(lower_value, upper_value):
+    llm_client_config = SimpleNamespace(is_few_shot=False, prompting_technique="zero_shot", prompt_layout="default", few_shot_example_seed=0)
+    config = SimpleNamespace(file_path_slr_infos="", llm_client_config=llm_client_config, relevance_lower_value=str(lower_value), relevance_upper_value=str(upper_value))
+    return PromptBuilder(config)
+
+
+class DecisionLogprobsTests(unittest.TestCase):
+
+    def testSpaceSplitTokenizer(self):
+        # Llama-3 and Qwen2.5 emit the space after "Decision:" as its own token before the digit
+        output = create_output([[(220, " ", 0.97), (16, "1", 0.02), (17, "2", 0.01)], [(16, "1", 0.6), (17, "2", 0.3), (15, "0", 0.1)]], [220, 16])
+        top_logprobs = extract_decision_top_logprobs(output)
+        distribution = create_prompt_builder(0, 2).extract_decision_distribution(top_logprobs)
+        self.assertEqual(list(distribution), [0, 1, 2])
+        self.assertAlmostEqual(distribution[1], 0.6)
+        self.assertAlmostEqual(distribution[2], 0.3)
+
+    def testSentencePieceSpaceToken(self):
+        # Mistral emits "▁" before the digit
+        output = create_output([[(29473, "▁", 0.99), (29508, "1", 0.01)], [(29508, "1", 0.2), (29518, "2", 0.8)]], [29473, 29518])
+        distribution = create_prompt_builder(1, 2).extract_decision_distribution(extract_decision_top_logprobs(output))
+        self.assertAlmostEqual(distribution[2], 0.8)
+
+    def testDigitAsFirstToken(self):
+        output = create_output([[(16, " 1", 0.7), (17, " 2", 0.2), (0, "\n", 0.1)], [(0, "\n", 1.0)]], [16, 0])
+        distribution = create_prompt_builder(1, 2).extract_decision_distribution(extract_decision_top_logprobs(output))
+        self.assertAlmostEqual(distribution[1], 0.7 / 0.9)
+
+    def testNoDecision(self):
+        output = create_output([[(220, " ", 1.0)], [(198, "\n", 1.0)]], [220, 198])
+        self.assertEqual(create_prompt_builder(0, 2).extract_decision_distribution(extract_decision_top_logprobs(output)), {})
+
+
+
+class FakeTokenizer:
+    def __init__(self, pattern: str, space_token: str = " ") -> None:
+        # splits the text by a regular expression; every distinct piece is one token
+        self.pattern = pattern
+        self.space_token = space_token
+        self.vocab = {}
+
+    def encode(self, text, add_special_tokens=True):
+        return [self.vocab.setdefault(piece, len(self.vocab)) for piece in re.findall(self.pattern, text.replace(" ", self.space_token))]
+
+    def decode(self, token_ids):
+        tokens = {token_id: piece for piece, token_id in self.vocab.items()}
+        return "".join(tokens[token_id] for token_id in token_ids).replace("\u2581", " ")
+
+
+def create_llama3_tokenizer():
+    # numbers are split into chunks of up to three digits, the space before a number is a separate token
+    return FakeTokenizer(r"\d{1,3}|[A-Za-z]+|:| ")
+
+
+def create_mistral_tokenizer():
+    # sentencepiece with one token per digit and "▁" as space
+    return FakeTokenizer(r"\d|[A-Za-z]+|:|\u2581", space_token="\u2581")
+
+
+class ScaleTokenizationTests(unittest.TestCase):
+
+    def testLlama3EncodesScaleUpTo19AsSingleTokens(self):
+        self.assertEqual(create_prompt_builder(0, 19).find_multi_token_values(create_llama3_tokenizer()), [])
+
+    def testDigitTokenizerOnlySupportsSingleDigits(self):
+        self.assertEqual(create_prompt_builder(0, 9).find_multi_token_values(create_mistral_tokenizer()), [])
+        self.assertEqual(create_prompt_builder(0, 19).find_multi_token_values(create_mistral_tokenizer()), list(range(10, 20)))
+
+    def testPromptHandlerChecksTokenizer(self):
+        config = create_config(tempfile.mkdtemp() + "/", relevance_upper_value=19, scoring_mode="logprobs")
+        create_prompt_handler(config, FakeLLM(None, tokenizer=create_llama3_tokenizer()), create_dataset(1))
+        with self.assertRaises(ValueError):
+            create_prompt_handler(config, FakeLLM(None, tokenizer=create_mistral_tokenizer()), create_dataset(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
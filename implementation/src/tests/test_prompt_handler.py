@@ -0,0 +1,122 @@
+import os
+import tempfile
+import unittest
+from vllm import SamplingParams
+from implementation.src.tests.fake_llm import FakeLLM, Interrupt, create_config, create_dataset, create_prompt_handler, get_paper_number, strip_log_file
+from implementation.src.utils.file_utils import load_json_file
+
+# number of responses without a decision per paper (papers 6 and 7 never get a valid decision within num_of_max_requests=3)
+NUM_FAILURES = {0: 0, 1: 1, 2: 0, 3: 2, 4: 1, 5: 0, 6: 5, 7: 3, 8: 1, 9: 0}
+
+
+def respond(prompt: str, attempt: int, sample: int) -> str:
+    paper_number = get_paper_number(prompt)
+    if attempt < NUM_FAILURES[paper_number]:
+        return f"I am not sure about paper {paper_number} (attempt {attempt})."
+    return f"The paper is relevant.\nDecision: {paper_number % 5}"
+
+
+def run_per_paper_loop(prompt_handler, messages, row_batch):
+    # reference: the loop that resent each failed prompt on its own until num_of_max_requests was reached
+    responses = prompt_handler.send_prompts_to_llm(messages)
+    for response, row, message_list in zip(responses, row_batch, messages):
+        for j in range(prompt_handler.num_of_max_requests):
+            response_text, response_prompt_tokens, response_completion_tokens = prompt_handler.extract_response_data(response)
+            relevance_of_paper = prompt_handler.prompt_builder.extract_decision(response_text)
+            threshold_value = prompt_handler.prompt_builder.extract_threshold_value(relevance_of_paper)
+            prompt_handler.update_token_counts(response_prompt_tokens, response_completion_tokens)
+            result = {
+                "response_text": response_text,
+                "relevance_of_paper": relevance_of_paper,
+                "threshold_value": threshold_value,
+                "response_prompt_tokens": response_prompt_tokens,
+                "response_completion_tokens": response_completion_tokens,
+            }
+            if threshold_value != -1 or j == prompt_handler.num_of_max_requests - 1:
+                prompt_handler.save_response(row=row, message_list=message_list, **result)
+                break
+            prompt_handler.save_response_failed(row=row, message_list=message_list, try_number=j, **result)
+            response = prompt_handler.client.chat(messages=message_list, sampling_params=SamplingParams(max_tokens=1024, temperature=0.5, top_p=1))[0]
+
+
+class RetryRoundTests(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp() + "/"
+        self.config = create_config(self.output_dir)
+        self.dataset = create_dataset(len(NUM_FAILURES))
+
+    def testRetriesAreBatchedPerRound(self):
+        client = FakeLLM(respond)
+        prompt_handler = create_prompt_handler(self.config, client, self.dataset)
+        prompt_handler.start_run(0, "run/")
+        messages, row_batch = prompt_handler.build_messages(0)
+        prompt_handler.process_batch(prompt_handler.send_prompts_to_llm(messages), row_batch, messages, 1, 0, "run/")
+        # one submission of all papers and one submission per retry round with all papers that failed in the previous round
+        self.assertEqual(client.calls, [10, sum(n >= 1 for n in NUM_FAILURES.values()), sum(n >= 2 for n in NUM_FAILURES.values())])
+
+    def testSameResultsAsPerPaperLoop(self):
+        prompt_handler = create_prompt_handler(self.config, FakeLLM(respond), self.dataset)
+        prompt_handler.start_run(0, "run/")
+        messages, row_batch = prompt_handler.build_messages(0)
+        prompt_handler.process_batch(prompt_handler.send_prompts_to_llm(messages), row_batch, messages, 1, 0, "run/")
+
+        reference_handler = create_prompt_handler(self.config, FakeLLM(respond), self.dataset)
+        reference_handler.start_run(0, "reference/")
+        run_per_paper_loop(reference_handler, messages, row_batch)
+
+        self.assertEqual(list(prompt_handler.responses["failed_responses"]), list(reference_handler.responses["failed_responses"]))
+        self.assertEqual(prompt_handler.responses["failed_responses"], reference_handler.responses["failed_responses"])
+        self.assertEqual(prompt_handler.responses["papers"], reference_handler.responses["papers"])
+        self.assertEqual(prompt_handler.total_prompt_tokens, reference_handler.total_prompt_tokens)
+        self.assertEqual(prompt_handler.total_response_tokens, reference_handler.total_response_tokens)
+        # paper 6 (id 7) fails in every round
+        self.assertIn("7_0", prompt_handler.responses["failed_responses"])
+        self.assertEqual(prompt_handler.responses["papers"]["7"]["relevance_of_paper"], -1)
+
+
+class CheckpointResumeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dataset = create_dataset(len(NUM_FAILURES))
+
+    def run_evaluation(self, output_dir, interrupt=None):
+        config = create_config(output_dir, number_consistency_path=1, shard_size=4)
+        prompt_handler = create_prompt_handler(config, FakeLLM(respond, interrupt=interrupt), self.dataset)
+        foldername, file_names = prompt_handler.evaluate_papers_by_llm_client(0)
+        return [strip_log_file(load_json_file(output_dir + foldername + file_name)) for file_name in file_names]
+
+    def interrupt_at_submission(self, number):
+        # interrupts the given submission of the shard with paper 5 (which never fails, so retries do not count)
+        submissions = []
+
+        def interrupt(messages):
+            if any("Title: 'paper 5'" in message_list[-1]["content"] for message_list in messages):
+                submissions.append(messages)
+            return len(submissions) == number
+        return interrupt
+
+    def assertResumedRunEqualsUninterruptedRun(self, submission_number):
+        expected = self.run_evaluation(tempfile.mkdtemp() + "/")
+
+        output_dir = tempfile.mkdtemp() + "/"
+        with self.assertRaises(Interrupt):
+            self.run_evaluation(output_dir, interrupt=self.interrupt_at_submission(submission_number))
+        foldername = os.listdir(output_dir)[0]
+        self.assertIn(f"checkpoint_{submission_number - 1}.jsonl", os.listdir(output_dir + foldername))
+
+        resumed = self.run_evaluation(output_dir)
+        self.assertEqual(os.listdir(output_dir), [foldername])
+        self.assertEqual(resumed, expected)
+
+    def testResumeAfterFirstShard(self):
+        # interrupted in the second shard of the first run
+        self.assertResumedRunEqualsUninterruptedRun(1)
+
+    def testResumeInSecondRun(self):
+        # interrupted in the second shard of the second run, the first run is restored from its log file
+        self.assertResumedRunEqualsUninterruptedRun(2)
+
+
+if __name__ == '__main__':
+    unittest.main()
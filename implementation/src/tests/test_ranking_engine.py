@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.tests.fake_llm import SLR_INFOS, create_config
+from implementation.src.utils.data_utils import create_ranking_pointwise
+
+
+class FakeRerankerClient(BaselineClient):
+    def __init__(self, descending: bool) -> None:
+        """
+        Deterministic reranker: the score of a document only depends on its text, and several documents get the same score.
+
+        :param descending: True to rank high scores first (like monoT5), False to rank low scores first (like monoBERT).
+        """
+        super().__init__("path/to/monoT5")
+        self.descending = descending
+
+    def get_relevance_scores(self, query, documents, batch_size=32):
+        return [float(sum(map(ord, document)) % 13) for document in documents]
+
+    def get_ranked_ids(self, relevance_scores, doc_ids):
+        ranked_indices = sorted(range(len(relevance_scores)), key=lambda i: relevance_scores[i], reverse=self.descending)
+        return [doc_ids[i] for i in ranked_indices]
+
+
+def create_ranking_per_group(result_df, query, client):
+    # reference: the loop that sorted the papers by relevance and re-ranked each group of equal relevance on its own
+    result_df["relevance_of_paper"] = result_df["relevance_of_paper"].astype(float)
+    result_df.loc[result_df["relevance_of_paper"] == -1, "relevance_of_paper"] = result_df["relevance_of_paper"].mean()
+    result_df = result_df.sort_values(by="relevance_of_paper", ascending=False, kind="mergesort")
+    result_df_grouped = result_df.groupby("relevance_of_paper")
+    new_df = pd.DataFrame()
+    for val in result_df["relevance_of_paper"].unique():
+        new_group = result_df_grouped.get_group(val)
+        if new_group.shape[0] > 1:
+            documents = [str(row["title"]) + " " + str(row["abstract"]) for _, row in new_group.iterrows()]
+            doc_ids = new_group["id"].apply(str).to_list()
+            scores = client.get_relevance_scores(query=query, documents=documents, batch_size=32)
+            ranked_ids = client.get_ranked_ids(scores, doc_ids)
+            group_df = pd.DataFrame({"id": ranked_ids})
+            group_df["id"] = pd.to_numeric(group_df["id"])
+            new_df = pd.concat([new_df, pd.merge(group_df, new_group, how="inner", on="id")])
+        else:
+            new_df = pd.concat([new_df, new_group])
+    return new_df
+
+
+def create_result_df(seed: int) -> pd.DataFrame:
+    # many tie groups, a few singleton groups and papers without a valid decision (-1)
+    rng = np.random.default_rng(seed)
+    relevances = rng.integers(-1, 10, size=300).astype(float)
+    relevances[:4] = [2.5, 7.5, 11, 12]
+    rng.shuffle(relevances)
+    return pd.DataFrame({
+        "id": rng.permutation(np.arange(1000, 1300)),
+        "title": [f"paper {k}" for k in range(300)],
+        "abstract": [f"abstract {k * 7919 % 1013} of paper {k}" for k in range(300)],
+        "relevance_of_paper": relevances,
+    })
+
+
+class RankingEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.config = create_config("", path_to_reranker="path/to/monoT5")
+        self.query = SLR_INFOS["title"] + " " + SLR_INFOS["research_questions"].replace("\n", "").replace("- ", "")
+
+    def assertSameOrderAsPerGroupLoop(self, client, seed):
+        expected = create_ranking_per_group(create_result_df(seed), self.query, client)
+        with mock.patch("implementation.src.utils.data_utils.reranker_registry.get", return_value=client):
+            ranked_df = create_ranking_pointwise(create_result_df(seed), SLR_INFOS, self.config)
+        self.assertEqual(ranked_df["id"].to_list(), expected["id"].to_list())
+        self.assertEqual(ranked_df["relevance_of_paper"].to_list(), expected["relevance_of_paper"].to_list())
+
+    def testSameOrderAsPerGroupLoopDescending(self):
+        for seed in range(3):
+            self.assertSameOrderAsPerGroupLoop(FakeRerankerClient(descending=True), seed)
+
+    def testSameOrderAsPerGroupLoopAscending(self):
+        for seed in range(3):
+            self.assertSameOrderAsPerGroupLoop(FakeRerankerClient(descending=False), seed)
+
+
+if __name__ == '__main__':
+    unittest.main()
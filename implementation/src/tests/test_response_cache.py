@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from vllm import SamplingParams
+from implementation.src.client.response_cache import CachedLLM, ResponseCache
+from implementation.src.tests.fake_llm import FakeLLM
+
+MESSAGE_LIST = [
+    {"role": "system", "content": "You are a helpful assistant."},
+    {"role": "user", "content": "Title: 'paper 1'"},
+]
+
+
+def respond(prompt: str, attempt: int, sample: int) -> str:
+    return f"Response to {prompt} (sample {sample}). Decision: 1"
+
+
+def get_cache_entries(cache_dir):
+    return [os.path.join(root, name) for root, _, files in os.walk(cache_dir) for name in files if name.endswith(".json")]
+
+
+class ResponseCacheKeyTests(unittest.TestCase):
+
+    def testKeyIsStable(self):
+        key = ResponseCache.create_key("path/to/model", MESSAGE_LIST, SamplingParams(max_tokens=100, temperature=0), {})
+        # equal requests built from new objects (with a different order of the message keys) get the same key
+        message_list = [{"content": message["content"], "role": message["role"]} for message in MESSAGE_LIST]
+        self.assertEqual(ResponseCache.create_key("path/to/model", message_list, SamplingParams(max_tokens=100, temperature=0), {}), key)
+        self.assertEqual(len(key), 64)
+
+    def testKeyDependsOnRequest(self):
+        key = ResponseCache.create_key("path/to/model", MESSAGE_LIST, SamplingParams(max_tokens=100, temperature=0), {})
+        other_message_list = MESSAGE_LIST[:-1] + [{"role": "user", "content": "Title: 'paper 2'"}]
+        other_keys = [
+            ResponseCache.create_key("path/to/other_model", MESSAGE_LIST, SamplingParams(max_tokens=100, temperature=0), {}),
+            ResponseCache.create_key("path/to/model", other_message_list, SamplingParams(max_tokens=100, temperature=0), {}),
+            ResponseCache.create_key("path/to/model", MESSAGE_LIST, SamplingParams(max_tokens=200, temperature=0), {}),
+            ResponseCache.create_key("path/to/model", MESSAGE_LIST, SamplingParams(max_tokens=100, temperature=0, logprobs=5), {}),
+            ResponseCache.create_key("path/to/model", MESSAGE_LIST, SamplingParams(max_tokens=100, temperature=0), {"continue_final_message": True}),
+        ]
+        self.assertEqual(len(set(other_keys + [key])), len(other_keys) + 1)
+
+
+class CachedLLMTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.client = FakeLLM(respond)
+
+    def create_cached_llm(self, max_size_bytes=10**9):
+        return CachedLLM(self.client, ResponseCache(self.cache_dir, max_size_bytes), "path/to/model")
+
+    def testDeterministicRequestIsServedFromCache(self):
+        cached_llm = self.create_cached_llm()
+        first = cached_llm.chat(messages=[MESSAGE_LIST], sampling_params=SamplingParams(max_tokens=100, temperature=0))
+        # a new instance reads the entries written by the previous one
+        second = self.create_cached_llm().chat(messages=[MESSAGE_LIST], sampling_params=SamplingParams(max_tokens=100, temperature=0))
+        self.assertEqual(self.client.calls, [1])
+        self.assertEqual(second[0].outputs[0].text, first[0].outputs[0].text)
+        self.assertEqual(second[0].prompt_token_ids, first[0].prompt_token_ids)
+
+    def testNonDeterministicRequestIsNotCached(self):
+        cached_llm = self.create_cached_llm()
+        for _ in range(2):
+            cached_llm.chat(messages=[MESSAGE_LIST], sampling_params=SamplingParams(max_tokens=100, temperature=0.5))
+        self.assertEqual(self.client.calls, [1, 1])
+        self.assertEqual(get_cache_entries(self.cache_dir), [])
+        self.assertEqual(cached_llm.response_cache.hits + cached_llm.response_cache.misses, 0)
+
+    def testSeededRequestIsCached(self):
+        cached_llm = self.create_cached_llm()
+        for _ in range(2):
+            cached_llm.chat(messages=[MESSAGE_LIST], sampling_params=SamplingParams(max_tokens=100, temperature=0.5, seed=42))
+        self.assertEqual(self.client.calls, [1])
+
+    def testOnlyMissingPromptsAreSubmitted(self):
+        cached_llm = self.create_cached_llm()
+        other_message_list = MESSAGE_LIST[:-1] + [{"role": "user", "content": "Title: 'paper 2'"}]
+        cached_llm.chat(messages=[MESSAGE_LIST], sampling_params=SamplingParams(max_tokens=100, temperature=0))
+        responses = cached_llm.chat(messages=[other_message_list, MESSAGE_LIST], sampling_params=SamplingParams(max_tokens=100, temperature=0))
+        self.assertEqual(self.client.calls, [1, 1])
+        self.assertEqual([response.outputs[0].text for response in responses], [respond(message_list[-1]["content"], 0, 0) for message_list in [other_message_list, MESSAGE_LIST]])
+
+    def testEvictionKeepsCacheUnderMaximalSize(self):
+        cached_llm = self.create_cached_llm()
+        cached_llm.chat(messages=[MESSAGE_LIST], sampling_params=SamplingParams(max_tokens=100, temperature=0))
+        entry_size = os.path.getsize(get_cache_entries(self.cache_dir)[0])
+        # room for about five entries
+        max_size_bytes = int(5.5 * entry_size)
+        cached_llm = self.create_cached_llm(max_size_bytes)
+        for k in range(20):
+            message_list = MESSAGE_LIST[:-1] + [{"role": "user", "content": f"Title: 'paper {k + 10}'"}]
+            cached_llm.chat(messages=[message_list], sampling_params=SamplingParams(max_tokens=100, temperature=0))
+            self.assertLessEqual(sum(os.path.getsize(file_path) for file_path in get_cache_entries(self.cache_dir)), max_size_bytes)
+        self.assertGreater(len(get_cache_entries(self.cache_dir)), 0)
+        # the most recent entry is kept
+        cached_llm.chat(messages=[message_list], sampling_params=SamplingParams(max_tokens=100, temperature=0))
+        self.assertEqual(len(self.client.calls), 21)
+
+
+if __name__ == '__main__':
+    unittest.main()
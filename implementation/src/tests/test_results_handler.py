@@ -0,0 +1,49 @@
+import math
+import tempfile
+import unittest
+from types import SimpleNamespace
+from implementation.src.data.results_handler import ResultHandler
+from implementation.src.prompts.prompt_builder import PromptBuilder
+from implementation.src.utils.file_utils import save_to_json
+
+
+def create_prompt_builder(lower_value, upper_value):
+    llm_client_config = SimpleNamespace(is_few_shot=False, prompting_technique="zero_shot", prompt_layout="default", few_shot_example_seed=0)
+    config = SimpleNamespace(file_path_slr_infos="", llm_client_config=llm_client_config, relevance_lower_value=str(lower_value), relevance_upper_value=str(upper_value))
+    return PromptBuilder(config)
+
+
+def create_top_logprobs(probabilities):
+    return {f" {value}": math.log(probability) for value, probability in probabilities.items()}
+
+
+class RecomputeRelevanceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder_path = tempfile.mkdtemp() + "/"
+        self.result_handler = ResultHandler(config=None, folder_path=self.folder_path)
+
+    def save_log_file(self, papers):
+        save_to_json({"Date and Time": "", "path_of_additional_ranker": "", "papers": papers, "failed_responses": {}}, "log_file_0.json", self.folder_path)
+        return self.folder_path + "log_file_0.json"
+
+    def testPartialValueMapping(self):
+        file_path = self.save_log_file({"1": {"relevance_of_paper": 1.0, "top_logprobs": create_top_logprobs({0: 0.5, 1: 0.25, 2: 0.25})}})
+        # 2 is merged into 1, the other values are kept
+        llm_df = self.result_handler.recompute_relevance_from_logprobs(file_path, create_prompt_builder(0, 2), value_mapping={2: 1})
+        self.assertAlmostEqual(llm_df["relevance_of_paper"][0], 0.5)
+
+    def testSamplesOfNSampleRuns(self):
+        samples = [
+            {"relevance_of_paper": 0.0, "top_logprobs": create_top_logprobs({0: 1.0})},
+            {"relevance_of_paper": 2.0, "top_logprobs": create_top_logprobs({1: 0.5, 2: 0.5})},
+        ]
+        file_path = self.save_log_file({"1": {"relevance_of_paper": 0.75, "samples": samples}})
+        llm_df = self.result_handler.recompute_relevance_from_logprobs(file_path, create_prompt_builder(0, 2))
+        self.assertAlmostEqual(llm_df["relevance_of_paper"][0], 0.75)
+        llm_df = self.result_handler.recompute_relevance_from_logprobs(file_path, create_prompt_builder(0, 2), value_mapping={1: 0, 2: 4})
+        self.assertAlmostEqual(llm_df["relevance_of_paper"][0], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.client.score_cache import RerankerScoreCache
+from implementation.src.tests.fake_llm import SLR_INFOS, create_config
+from implementation.src.utils.data_utils import create_ranking_pointwise
+
+
+class CountingRerankerClient(BaselineClient):
+    def __init__(self, model_path: str) -> None:
+        """
+        Deterministic reranker that counts the documents it scores.
+
+        :param model_path: Path to the model (part of the key of the score cache).
+        """
+        super().__init__(model_path)
+        self.scored_documents = []
+
+    def get_relevance_scores(self, query, documents, batch_size=32):
+        self.scored_documents.extend(documents)
+        return [float(sum(map(ord, document)) % 17) for document in documents]
+
+    def get_ranked_ids(self, relevance_scores, doc_ids):
+        ranked_indices = sorted(range(len(relevance_scores)), key=lambda i: relevance_scores[i], reverse=True)
+        return [doc_ids[i] for i in ranked_indices]
+
+
+def create_result_df() -> pd.DataFrame:
+    # 30 papers in three tie groups and two singleton groups
+    return pd.DataFrame({
+        "id": list(range(100, 132)),
+        "title": [f"paper {k}" for k in range(32)],
+        "abstract": [f"abstract of paper {k}" for k in range(32)],
+        "relevance_of_paper": [float(k % 3) for k in range(30)] + [5.0, 7.0],
+    })
+
+
+class ScoreCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.config = create_config("", path_to_reranker="path/to/monoT5", reranker_score_cache_path=tempfile.mkdtemp() + "/scores.sqlite")
+
+    def rank(self, client, result_df):
+        with mock.patch("implementation.src.utils.data_utils.reranker_registry.get", return_value=client):
+            return create_ranking_pointwise(result_df, SLR_INFOS, self.config)["id"].to_list()
+
+    def testOnlyMissingDocumentsAreScored(self):
+        client = CountingRerankerClient("path/to/monoT5")
+        first_ranking = self.rank(client, create_result_df())
+        self.assertEqual(len(client.scored_documents), 30)
+
+        # the same ranking again (e.g., by another experiment) does not call the reranker
+        client.scored_documents = []
+        self.assertEqual(self.rank(client, create_result_df()), first_ranking)
+        self.assertEqual(client.scored_documents, [])
+
+        # only the document with a changed text is scored again
+        result_df = create_result_df()
+        result_df.loc[result_df["id"] == 105, "abstract"] = "changed abstract of paper 5"
+        changed_ranking = self.rank(client, result_df)
+        self.assertEqual(client.scored_documents, ["paper 5 changed abstract of paper 5"])
+
+        # same order as without the cache
+        self.config.llm_client_config.reranker_score_cache_path = None
+        self.assertEqual(self.rank(CountingRerankerClient("path/to/monoT5"), result_df), changed_ranking)
+
+    def testKeyContainsModelAndQuery(self):
+        self.rank(CountingRerankerClient("path/to/monoT5"), create_result_df())
+        other_model_client = CountingRerankerClient("path/to/other_monoT5")
+        self.rank(other_model_client, create_result_df())
+        self.assertEqual(len(other_model_client.scored_documents), 30)
+
+        client = CountingRerankerClient("path/to/monoT5")
+        self.config.llm_client_config.system_message_type = "system_message_basic"
+        self.rank(client, create_result_df())
+        self.assertEqual(len(client.scored_documents), 30)
+
+    def testScoresOfSeveralLogits(self):
+        score_cache = RerankerScoreCache(tempfile.mkdtemp() + "/scores.sqlite")
+        score_cache.put_scores("path/to/monoBERT", "query", ["1", "2"], ["a", "b"], [[0.5, -0.5], [1.0, 2.0]])
+        self.assertEqual(score_cache.get_scores("path/to/monoBERT", "query", ["2", "1", "3"], ["b", "a", "c"]), [[1.0, 2.0], [0.5, -0.5], None])
+        self.assertEqual((score_cache.hits, score_cache.misses), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
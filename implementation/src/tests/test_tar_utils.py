@@ -0,0 +1,26 @@
+import unittest
+from implementation.src.utils.tar_utils import average_expected_tar_metrics, get_expected_tar_metrics, get_tar_metrics_of_permutations
+
+# rankings as (slr name, labels of the ranked documents, tie group of each ranked document)
+RANKINGS_WITHOUT_RELEVANT = [("slr_a", [0, 0, 0], [0, 0, 1]), ("slr_b", [0, -1], [0, 0])]
+RANKING = ("slr_c", [1, 0, 0, 1, 0], [0, 0, 1, 1, 2])
+
+
+class SkippedTopicsTests(unittest.TestCase):
+
+    def testAllTopicsSkipped(self):
+        self.assertEqual(average_expected_tar_metrics([None, None]), {})
+        self.assertEqual(average_expected_tar_metrics([]), {})
+        self.assertEqual(get_expected_tar_metrics(RANKINGS_WITHOUT_RELEVANT), {})
+        self.assertEqual(get_tar_metrics_of_permutations(RANKINGS_WITHOUT_RELEVANT, num_permutations=4), {})
+
+    def testSkippedTopicsAreNotAveraged(self):
+        expected = get_expected_tar_metrics([RANKING])
+        self.assertEqual(get_expected_tar_metrics(RANKINGS_WITHOUT_RELEVANT + [RANKING]), expected)
+        metrics = get_tar_metrics_of_permutations(RANKINGS_WITHOUT_RELEVANT + [RANKING], num_permutations=4)
+        self.assertEqual(set(metrics), set(expected))
+        self.assertEqual(len(metrics["MAP"]), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import hashlib
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+import bm25s
+import numpy as np
+from implementation.src.utils.profiling import profiler
+
+IDS_FILE = "ids.txt"
+
+
+def get_bm25_index_root(folder_path_slrs: str) -> str:
+    """
+    Get the directory of the BM25 indexes of a dataset (next to the CSV files of the SLRs).
+
+    :param folder_path_slrs: Folder of the SLRs of the dataset.
+    :return: Directory of the BM25 indexes.
+    """
+    return os.path.join(os.path.dirname(folder_path_slrs), "bm25_index")
+
+
+def create_fingerprint(ids: List[str], texts: List[str]) -> str:
+    """
+    Create the fingerprint of a corpus (the index is rebuilt if the ids or texts change).
+
+    :param ids: Ids of the documents.
+    :param texts: Texts of the documents.
+    :return: SHA-256 hash of the corpus.
+    """
+    corpus_hash = hashlib.sha256()
+    for doc_id, text in zip(ids, texts):
+        corpus_hash.update(doc_id.encode("utf-8") + b"\0" + text.encode("utf-8") + b"\0")
+    return corpus_hash.hexdigest()
+
+
+class BM25Index:
+    def __init__(self, ids: List[str], texts: List[str], index_dir: Optional[str] = None) -> None:
+        """
+        Initialize the BM25Index class. The corpus (e.g., all abstracts of an SLR) is indexed once; if an index directory is given, the index is saved there
+        and loaded by later runs. Queries can be scored against any subset of the documents (e.g., one tie group) without indexing again.
+
+        :param ids: Ids of the documents.
+        :param texts: Texts of the documents.
+        :param index_dir: Directory of the saved index (None to keep the index only in memory).
+        """
+        self.ids = [str(doc_id) for doc_id in ids]
+        self.positions = {doc_id: position for position, doc_id in enumerate(self.ids)}
+        self.retriever = None
+        if index_dir is not None and os.path.exists(os.path.join(index_dir, IDS_FILE)):
+            try:
+                self.retriever = bm25s.BM25.load(index_dir)
+            except Exception as e:
+                print(f"Could not load BM25 index {index_dir} ({e}); the index is created again.")
+        if self.retriever is None:
+            with profiler.span("bm25_indexing", items=len(texts)):
+                self.retriever = bm25s.BM25()
+                self.retriever.index(bm25s.tokenize(texts))
+            if index_dir is not None:
+                self.save(index_dir)
+
+    def save(self, index_dir: str) -> None:
+        """
+        Save the index. The index is written to a temporary directory first and renamed afterwards, so that concurrent jobs never load partially written indexes.
+
+        :param index_dir: Directory of the saved index.
+        """
+        os.makedirs(os.path.dirname(index_dir), exist_ok=True)
+        temp_dir = tempfile.mkdtemp(dir=os.path.dirname(index_dir))
+        self.retriever.save(temp_dir)
+        with open(os.path.join(temp_dir, IDS_FILE), "w", encoding="utf-8") as file:
+            file.write("\n".join(self.ids))
+        try:
+            os.replace(temp_dir, index_dir)
+        except OSError:
+            # another job has saved the same index in the meantime
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def get_scores(self, query: str, ids: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Compute the BM25 scores of documents for a query.
+
+        :param query: Query string.
+        :param ids: Ids of the documents that should be scored (None for all documents of the index).
+        :return: Array with the score of each document.
+        """
+        with profiler.span("bm25_scoring", items=len(self.ids) if ids is None else len(ids)):
+            scores = self.retriever.get_scores(bm25s.tokenize(query, return_ids=False)[0])
+            if ids is None:
+                return scores
+            return scores[[self.positions[str(doc_id)] for doc_id in ids]]
+
+    def retrieve(self, queries: List[str], k: Optional[int] = None) -> Tuple[List[List[str]], np.ndarray]:
+        """
+        Rank the documents of the index for several queries at once.
+
+        :param queries: List of query strings.
+        :param k: Number of retrieved documents per query (None for all documents).
+        :return: Ids of the retrieved documents of each query (most relevant first) and their scores.
+        """
+        k = len(self.ids) if k is None else min(k, len(self.ids))
+        with profiler.span("bm25_retrieval", items=len(queries)):
+            results, scores = self.retriever.retrieve(bm25s.tokenize(queries), k=k)
+        return [[self.ids[position] for position in positions] for positions in results.tolist()], scores
+
+
+# indexes that are shared by all callers of a process (one per corpus)
+bm25_indexes: Dict[str, BM25Index] = {}
+
+
+def get_bm25_index(ids: List[str], texts: List[str], index_root: Optional[str] = None) -> BM25Index:
+    """
+    Get the BM25 index of a corpus. The index is created (or loaded) once per process; saved indexes are named by the fingerprint of the corpus.
+
+    :param ids: Ids of the documents.
+    :param texts: Texts of the documents.
+    :param index_root: Directory of the saved indexes (None to keep the index only in memory).
+    :return: BM25Index.
+    """
+    ids = [str(doc_id) for doc_id in ids]
+    fingerprint = create_fingerprint(ids, texts)
+    if fingerprint not in bm25_indexes:
+        index_dir = os.path.join(index_root, fingerprint[:32]) if index_root is not None else None
+        bm25_indexes[fingerprint] = BM25Index(ids, texts, index_dir)
+    return bm25_indexes[fingerprint]
@@ -2,15 +2,19 @@ import traceback
 from typing import List, Dict
 import pandas as pd
 import random
-import bm25s
-from implementation.src.client.monoBERT_client import MonoBERTClient
-from implementation.src.client.monoT5_client import MonoT5Client
+import numpy as np
+from implementation.src.client.reranker_registry import reranker_registry
+from implementation.src.client.score_cache import get_score_cache
 from implementation.src.config.config import Config
+from implementation.src.utils.bm25_index import get_bm25_index, get_bm25_index_root
 from implementation.src.utils.file_utils import load_json_file
+from implementation.src.utils.profiling import profiler
+from implementation.src.utils.ranking_engine import BM25ScoreSource, RerankerScoreSource, rank_with_tie_breaking
 
 def create_ranking_pointwise(result_df: pd.DataFrame, slr_infos_df: pd.DataFrame, config: Config) -> pd.DataFrame:
     """
-    Creates a list of articles that is ranked by the relevance of the papers.
+    Creates a list of articles that is ranked by the relevance of the papers. Papers with the same relevance are ordered by the configured re-ranker
+    (all tie groups are scored in one pass); if no valid re-ranker is provided, BM25 (one index over the abstracts of the SLR) is used as fallback.
 
     :param result_df: Result dataframe (unsorted).
     :param slr_infos_df: Dataframe with metadata of SLR.
@@ -19,10 +23,6 @@ def create_ranking_pointwise(result_df: pd.DataFrame, slr_infos_df: pd.DataFrame
     """
     result_df["relevance_of_paper"] = result_df["relevance_of_paper"].astype(float)
     result_df.loc[result_df["relevance_of_paper"] == -1, "relevance_of_paper"] = result_df["relevance_of_paper"].mean()
-    result_df = result_df.sort_values(by="relevance_of_paper", ascending=False, kind="mergesort") # use stable sort
-    result_df_grouped = result_df.groupby("relevance_of_paper")
-    unique_vals = result_df["relevance_of_paper"].unique()
-    new_df = pd.DataFrame()
     query = slr_infos_df["title"]
     if config.llm_client_config.system_message_type == "system_message_rq":
         print("Using title and research questions as query.")
@@ -31,33 +31,20 @@ def create_ranking_pointwise(result_df: pd.DataFrame, slr_infos_df: pd.DataFrame
         query = slr_infos_df["title"] + " " + research_questions
     else:
         print("Using only title as query.")
-    for val in unique_vals:
-        new_group = result_df_grouped.get_group(val)
-        if new_group.shape[0] > 1:
-            try:
-                client = None
-                path_to_reranker = config.llm_client_config.path_to_reranker
-                if "monoBERT" in path_to_reranker:
-                    client = MonoBERTClient(path_to_reranker)
-                elif "monoT5" in path_to_reranker:
-                    client = MonoT5Client(path_to_reranker)
-                documents = [str(row["title"]) + " " + str(row["abstract"]) for _, row in new_group.iterrows()]
-                doc_ids = new_group["id"].apply(str).to_list()
-                scores = client.get_relevance_scores(query=query, documents=documents, batch_size=32)
-                ranked_ids = client.get_ranked_ids(scores, doc_ids)
-                result_df = pd.DataFrame({"id": ranked_ids})
-                result_df["id"] = pd.to_numeric(result_df["id"])
-                result_df = pd.merge(result_df, new_group, how="inner", on="id")
-                new_df = pd.concat([new_df, result_df])
-                print(f"used {path_to_reranker} for re-ranking group")
-            except Exception as e:
-                print(f"Error: {e}, provided path {path_to_reranker}")
-                print("No valid path for re-ranker provided; BM25 will be used as fallback.")
-                traceback.print_exc()
-                new_df = pd.concat([new_df, create_bm_25_ranking(new_group, query=query)])
-        else:
-            new_df = pd.concat([new_df, new_group])
-    return new_df
+    path_to_reranker = config.llm_client_config.path_to_reranker
+    # the BM25 index is built on first use, so the source is only indexed if it is needed
+    bm25_source = BM25ScoreSource(result_df, get_bm25_index_root(config.folder_path_slrs))
+    score_sources = []
+    try:
+        # the model is loaded once per process and reused for all SLRs
+        score_sources.append(RerankerScoreSource(reranker_registry.get(path_to_reranker), score_cache=get_score_cache(config.llm_client_config.reranker_score_cache_path)))
+        print(f"using {path_to_reranker} for re-ranking groups")
+    except Exception as e:
+        print(f"Error: {e}, provided path {path_to_reranker}")
+        print("No valid path for re-ranker provided; BM25 will be used as fallback.")
+        traceback.print_exc()
+        score_sources.append(bm25_source)
+    return rank_with_tie_breaking(result_df, query=query, score_sources=score_sources, fallback_source=bm25_source)
 
 def get_ids_of_few_shot_examples(few_shot_examples: Dict) -> List[int]:
     """
@@ -144,29 +131,18 @@ def initialize_few_shot_examples(config: Config, index: int, slr_name: str) -> L
             print("Configuration should be changed because you want to have a few shot run, but specified a few shot pattern which uses 0 few shot examples.")
     return few_shot_examples
 
-def create_bm_25_ranking(dataframe: pd.DataFrame, query: str) -> pd.DataFrame:
+def create_bm_25_ranking(dataframe: pd.DataFrame, query: str, index_root: str = None) -> pd.DataFrame:
     """
     Creates a dataframe of the given papers which is ranked by relevance to the query by using BM-25.
 
     :param dataframe: Datframe of papers.
     :param query: Query to which the relevance of each paper is determined.
+    :param index_root: Directory of the saved BM25 indexes (None to keep the index only in memory).
     :return: Dataframe of papers in ranked order (most relevant papers first).
     """
     abstracts = dataframe["abstract"].astype(str).to_list()
     ids = dataframe["id"].astype(str).tolist()
-    corpus_json = []
-    for i in range(len(dataframe)):
-        corpus_json.append({"text": abstracts[i], "id": ids[i]})
-    corpus_text = [doc["text"] for doc in corpus_json]
-    corpus_tokens = bm25s.tokenize(corpus_text)
-    retriever = bm25s.BM25(corpus=corpus_json)
-    retriever.index(corpus_tokens)
-
-    # Query the corpus
-    results, _ = retriever.retrieve(bm25s.tokenize(query), k=len(dataframe))
-    results = pd.DataFrame(results[0].tolist())
-    results["id"] = results["id"].astype(int)
-
-    # create result dataframe
-    result_df = pd.merge(results, dataframe, on="id", validate="one_to_one")
-    return result_df
+    with profiler.span("bm25_ranking", items=len(dataframe)):
+        index = get_bm25_index(ids, abstracts, index_root)
+        ranking = np.argsort(-index.get_scores(query), kind="stable")
+    return dataframe.iloc[ranking].reset_index(drop=True)
@@ -2,7 +2,7 @@ import sys
 import os
 import time
 import copy
-from typing import Tuple
+from typing import List, Optional, Tuple
 sys.path.append(os.getcwd())
 from implementation.src.data.guo_data_provider import GuoDataProvider
 from implementation.src.data.tar_data_provider import TarDataProvider
@@ -14,16 +14,37 @@ from implementation.src.prompts.prompt_builder import PromptBuilder
 from implementation.src.utils.file_utils import generate_foldername, load_json_file
 from implementation.src.prompts.prompt_templates import CoT_prompt_template
 from implementation.src.prompts.prompt_handler import PromptHandler
+from implementation.src.prompts.batch_scheduler import BatchScheduler
 from implementation.src.data.results_handler import ResultHandler
 from implementation.src.utils.file_utils import save_to_json
 from implementation.src.data.synergy_data_provider import SynergyDataProvider
 from implementation.src.prompts.prompt_templates import zero_shot_prompt_template, CoT_prompt_template, zero_shot_prompt_template_binary
+from implementation.src.prompts.prompt_templates import zero_shot_prompt_template_prefix, CoT_prompt_template_prefix, zero_shot_prompt_template_binary_prefix
 from implementation.src.prompts.system_message_templates import system_message_rq, system_message_basic
 from implementation.src.utils.data_utils import initialize_few_shot_examples
 from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.client.score_cache import get_score_cache
+from implementation.src.utils.profiling import profiler
 
 CONFIG_PATH = "config.json"
 
+def get_prompt_template(config: Config) -> List[str]:
+    """
+    Selects the prompt template based on the prompting technique, the scale, and the prompt layout.
+
+    :param config: Configuration object.
+    :return: List with the prompt template.
+    """
+    is_prefix_cached = config.llm_client_config.prompt_layout == "prefix_cached"
+    prompt_template = []
+    if config.llm_client_config.prompting_technique == "CoT":
+        prompt_template.append(CoT_prompt_template_prefix if is_prefix_cached else CoT_prompt_template)
+    elif int(config.relevance_upper_value) - int(config.relevance_lower_value) == 1:
+        prompt_template.append(zero_shot_prompt_template_binary_prefix if is_prefix_cached else zero_shot_prompt_template_binary)
+    else:
+        prompt_template.append(zero_shot_prompt_template_prefix if is_prefix_cached else zero_shot_prompt_template)
+    return prompt_template
+
 def create_few_shot_examples(client, index: int, slr_name: str):
     """
     Creates few shot examples.
@@ -58,14 +79,8 @@ def create_few_shot_examples(client, index: int, slr_name: str):
     # load metadata of SLR
     slr_infos_df = load_json_file(config.file_path_slr_infos)[slr_name]
 
-    prompt_template = []
     prompting_type = config.llm_client_config.prompting_technique
-    if prompting_type == "CoT":
-        prompt_template.append(CoT_prompt_template)
-    elif int(config.relevance_upper_value) - int(config.relevance_lower_value) == 1:
-        prompt_template.append(zero_shot_prompt_template_binary)
-    else:
-        prompt_template.append(zero_shot_prompt_template)
+    prompt_template = get_prompt_template(config)
     system_message = system_message_rq
     backup_temp = copy.deepcopy(config.llm_client_config.temperature)
     backup_sm = copy.deepcopy(config.llm_client_config.system_message_type)
@@ -122,14 +137,15 @@ def create_few_shot_examples(client, index: int, slr_name: str):
     config.llm_client_config.is_few_shot = backup_is_few_s
     config.llm_client_config.ordering_few_shot_examples = backup_few_s_order
 
-def run_experiment_with_evaluation(config: Config, client, index: int, slr_name: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+def create_prompt_handler(config: Config, client, index: int, slr_name: str) -> PromptHandler:
     """
-    Runs an experiment with evaluation for the given index of the cross-validation split.
+    Creates the prompt handler of an experiment for the given index of the cross-validation split.
 
     :param config: Configuration object.
     :param client: LLM client.
     :param index: Index of the cross-validation split.
     :param slr_name: Name of slr.
+    :return: PromptHandler of the experiment.
     """
     # initialization
     data_provider = SynergyDataProvider(config)
@@ -151,18 +167,10 @@ def run_experiment_with_evaluation(config: Config, client, index: int, slr_name:
     # load metadata of SLR
     slr_infos_df = load_json_file(config.file_path_slr_infos)[slr_name]
 
-   # get prompting technique (either default prompting or CoT)
-    prompting_type = config.llm_client_config.prompting_technique
     print("Creating prompt handler ...", end="\n")
 
     # set the prompt template based on the prompting technique
-    prompt_template = []
-    if prompting_type == "CoT":
-        prompt_template.append(CoT_prompt_template)
-    elif int(config.relevance_upper_value) - int(config.relevance_lower_value) == 1:
-        prompt_template.append(zero_shot_prompt_template_binary)
-    else:
-        prompt_template.append(zero_shot_prompt_template)
+    prompt_template = get_prompt_template(config)
     
     system_message = None
     if config.llm_client_config.system_message_type == "system_message_rq":
@@ -170,7 +178,7 @@ def run_experiment_with_evaluation(config: Config, client, index: int, slr_name:
     else:
         system_message = system_message_basic
 
-    prompt_handler = PromptHandler(
+    return PromptHandler(
         config=config,
         client=client,
         prompt_builder=prompt_builder,
@@ -181,6 +189,25 @@ def run_experiment_with_evaluation(config: Config, client, index: int, slr_name:
         few_shot_examples=few_shot_examples,
         slr_name=slr_name
     )
+
+def run_experiment_with_evaluation(config: Config, client, index: int, slr_name: str, scheduler: Optional[BatchScheduler] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Runs an experiment with evaluation for the given index of the cross-validation split.
+    If a scheduler is given, the experiment is only added to the scheduler (with a copy of the config) and evaluated together with the other experiments when the scheduler is run.
+
+    :param config: Configuration object.
+    :param client: LLM client.
+    :param index: Index of the cross-validation split.
+    :param slr_name: Name of slr.
+    :param scheduler: Optional BatchScheduler that collects the prompts of several experiments.
+    """
+    if scheduler is not None:
+        # the scripts modify the config between experiments
+        prompt_handler = create_prompt_handler(copy.deepcopy(config), client, index, slr_name)
+        scheduler.add_cell(prompt_handler, index)
+        print(f"Scheduled experiment: {config.llm_client_output_directory_path}{slr_name}", end="\n")
+        return
+    prompt_handler = create_prompt_handler(config, client, index, slr_name)
     # analyse papers of dataset with llm
     print("Sending prompts to LLM ...", end="\n")
     folder_name, _ = prompt_handler.evaluate_papers_by_llm_client(index)
@@ -221,8 +248,11 @@ def run_experiment_bert_0_shot(config: Config, client: BaselineClient, label: st
     doc_ids = slr_df["id"].apply(str).to_list()
 
     start_time = time.time()
+    profile_start = profiler.mark()
 
-    relevance_scores = client.get_relevance_scores(query, documents, batch_size=32)
+    client.set_embedding_store(config.llm_client_config.embedding_store_dir, config.folder_path_slrs, slr_name)
+    with profiler.span("reranker_scoring", items=len(documents)):
+        relevance_scores = client.get_cached_relevance_scores(query, documents, doc_ids, batch_size=32, score_cache=get_score_cache(config.llm_client_config.reranker_score_cache_path))
 
     result_ids = client.get_ranked_ids(relevance_scores, doc_ids)
     elapsed_time = time.time() - start_time
@@ -235,3 +265,4 @@ def run_experiment_bert_0_shot(config: Config, client: BaselineClient, label: st
         folder_path=folder_path,
     )
     result_handler.store_results_bert_eval_only(result_df=result_df, computation_time=elapsed_time, query=query, model_name=label, model_path=client.model_path, slr_name=slr_name)
+    profiler.save_profile("profile.json", folder_path, profile_start)
@@ -1,7 +1,8 @@
 import os
+import re
 import json
 import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 def ensure_directory_exists(path: str) -> None:
     """
@@ -65,6 +66,73 @@ def generate_foldername(
     few_shot = "few_shot" if is_few_shot else "zero_shot"
     return f"{slr_tag}_{few_shot}_{name_of_model}_{current_time}_{length}_{index}/"
 
+def find_resumable_foldername(
+    output_dir: str,
+    name_of_model: str,
+    length: int,
+    slr_tag: str,
+    is_few_shot: bool,
+    index: int,
+    final_filename: str,
+) -> Optional[str]:
+    """
+    Find the most recent result folder of an interrupted run, i.e., a folder generated by generate_foldername for the same parameters that contains a checkpoint but not the final result file.
+
+    :param output_dir: Directory that contains the result folders.
+    :param name_of_model: Name of the model.
+    :param length: Number of entries.
+    :param slr_tag: Tag of the SLR.
+    :param is_few_shot: Boolean, deciding if few shot prompting was used or not.
+    :param index: Index of the experiment.
+    :param final_filename: Name of the file that is written when the run is complete.
+    :return: Foldername of the interrupted run or None if there is none.
+    """
+    if not os.path.exists(output_dir):
+        return None
+    few_shot = "few_shot" if is_few_shot else "zero_shot"
+    pattern = re.compile(rf"{re.escape(slr_tag)}_{few_shot}_{re.escape(name_of_model)}_\d{{4}}\.\d{{2}}\.\d{{2}}_\d{{2}}-\d{{2}}-\d{{2}}_{length}_{index}")
+    candidates = []
+    for folder in os.scandir(output_dir):
+        if not folder.is_dir() or not pattern.fullmatch(folder.name):
+            continue
+        file_names = os.listdir(folder.path)
+        if any(name.startswith("checkpoint_") for name in file_names) and final_filename not in file_names:
+            candidates.append(folder.name)
+    # the timestamp in the foldername sorts chronologically
+    return sorted(candidates)[-1] + "/" if len(candidates) > 0 else None
+
+def append_to_jsonl(data: List[Dict], filename: str, output_dir: str) -> None:
+    """
+    Append data to a JSONL file (one JSON object per line).
+
+    :param data: List of objects that should be appended.
+    :param filename: Filename of the JSONL file.
+    :param output_dir: Output directory.
+    """
+    ensure_directory_exists(output_dir)
+    with open(os.path.join(output_dir, filename), "a") as jsonl_file:
+        jsonl_file.write("".join(json.dumps(entry) + "\n" for entry in data))
+        jsonl_file.flush()
+        os.fsync(jsonl_file.fileno())
+
+def load_jsonl_file(file_path: str) -> List[Any]:
+    """
+    Loads a JSONL file and returns its content. An incomplete last line (e.g., caused by a job that was killed while writing) is ignored.
+
+    :param file_path: Path to the JSONL file.
+    :return: List with one entry per line.
+    """
+    entries = []
+    if not os.path.exists(file_path):
+        return entries
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Skipping incomplete line in {file_path}")
+    return entries
+
 def scan_folder_for_csv(folder_path):
     file_list = os.listdir(folder_path)
     
@@ -0,0 +1,96 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import hashlib
+import json
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+# version of the metric computation; entries of other versions are not used (increase if the metrics of a ranking change)
+METRICS_VERSION = "1"
+
+# maximal number of keys per SQL statement (sqlite limits the number of variables)
+CHUNK_SIZE = 400
+
+
+def hash_files(file_paths: List[str]) -> str:
+    """
+    Hash the names and contents of files, e.g., the ranking artifact of a run or the csv file with the labels of an SLR.
+
+    :param file_paths: Paths to the files.
+    :return: SHA-256 hash of the file names and contents.
+    """
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        digest.update(os.path.basename(file_path).encode("utf-8") + b"\0")
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MetricsCache:
+    def __init__(self, db_path: str) -> None:
+        """
+        Initialize the MetricsCache class. The metrics of runs are stored in an SQLite database, keyed by the kind of the metrics, the hash of the ranking
+        artifact of the run (with the settings of its evaluation) and the hash of its labels (qrels), so that unchanged runs do not have to be evaluated again.
+
+        :param db_path: Path to the SQLite database.
+        """
+        self.db_path = db_path
+        if os.path.dirname(db_path) != "":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # long timeout, since several jobs may write to the same database
+        self.connection = sqlite3.connect(db_path, timeout=600)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS metrics (version TEXT, kind TEXT, run_hash TEXT, qrels_hash TEXT, run TEXT, metrics TEXT, "
+            "PRIMARY KEY (version, kind, run_hash, qrels_hash))"
+        )
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_metrics(self, kind: str, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[Dict]]:
+        """
+        Look up the metrics of runs.
+
+        :param kind: Kind of the metrics (e.g., "ranking" or "tie_expected").
+        :param keys: Hash of the ranking artifact and hash of the labels of each run.
+        :return: Metrics of the cached runs by key (runs that are not cached are missing; metrics of skipped runs are None).
+        """
+        found: Dict = {}
+        run_hashes = sorted(set(run_hash for run_hash, _ in keys))
+        for start in range(0, len(run_hashes), CHUNK_SIZE):
+            chunk = run_hashes[start:start + CHUNK_SIZE]
+            placeholders = ",".join("?" for _ in chunk)
+            rows = self.connection.execute(
+                f"SELECT run_hash, qrels_hash, metrics FROM metrics WHERE version = ? AND kind = ? AND run_hash IN ({placeholders})",
+                [METRICS_VERSION, kind] + chunk,
+            ).fetchall()
+            found.update({(run_hash, qrels_hash): json.loads(metrics) for run_hash, qrels_hash, metrics in rows})
+        found = {key: found[key] for key in keys if key in found}
+        self.hits += sum(key in found for key in keys)
+        self.misses += sum(key not in found for key in keys)
+        return found
+
+    def put_metrics(self, kind: str, key: Tuple[str, str], run: str, metrics: Optional[Dict]) -> None:
+        """
+        Store the metrics of a run.
+
+        :param kind: Kind of the metrics.
+        :param key: Hash of the ranking artifact and hash of the labels of the run.
+        :param run: Folder of the run (for information only).
+        :param metrics: Metrics of the run.
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metrics (version, kind, run_hash, qrels_hash, run, metrics) VALUES (?, ?, ?, ?, ?, ?)",
+                (METRICS_VERSION, kind, key[0], key[1], run, json.dumps(metrics)),
+            )
+
+    def print_statistics(self) -> None:
+        """
+        Print the number of cache hits and misses.
+        """
+        print(f"Metrics cache {self.db_path}: {self.hits} hits, {self.misses} misses")
@@ -0,0 +1,169 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import copy
+import hashlib
+import json
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from implementation.src.config.config import Config
+from implementation.src.scripts_tar.tar_eval_2018 import evaluate_rankings
+from implementation.src.utils.evaluation_utils import extract_prefix
+from implementation.src.utils.metrics_cache import MetricsCache, hash_files
+from implementation.src.utils.tar_utils import create_ranking_of_run, create_tie_group_ranking_of_run, get_data_provider, get_expected_tar_metrics_of_ranking
+
+DEFAULT_METRICS_CACHE_PATH = "./cache/metrics.sqlite"
+
+# state of a worker process (configuration, kind of the metrics)
+worker_state: Dict = {}
+
+
+def get_run_files(run: str, kind: str, is_lm_only: bool) -> List[str]:
+    """
+    Get the files of a run from which its metrics are computed.
+
+    :param run: Folder of the run.
+    :param kind: Kind of the metrics ("ranking": metrics of the ranking, "tie_expected": expected metrics of random tie-breaking of the LLM relevance).
+    :param is_lm_only: Whether the run is of a language model only (ranking in logfile.json instead of ranked_df.json).
+    :return: Paths to the files.
+    """
+    if kind == "tie_expected":
+        return [run + "/" + f for f in sorted(os.listdir(run)) if re.match(r'log_file_\d+\.json', f)]
+    if is_lm_only:
+        return [run + "/logfile.json"]
+    return [run + "/ranked_df.json"]
+
+
+def get_evaluation_settings(config: Config, folder_path_slrs: str, is_lm_only: bool) -> Dict:
+    """
+    Get the settings that determine how the files of a run are read and evaluated (part of the key of the run in the metrics cache).
+
+    :param config: Configuration object.
+    :param folder_path_slrs: Folder of the csv files of the SLRs of the run.
+    :param is_lm_only: Whether the run is of a language model only.
+    :return: Dictionary of the settings.
+    """
+    if config.folder_path_slrs != folder_path_slrs:
+        config = copy.deepcopy(config)
+        config.folder_path_slrs = folder_path_slrs
+    return {
+        "is_lm_only": is_lm_only,
+        "data_provider": type(get_data_provider(config)).__name__,
+        "relevance_lower_value": config.relevance_lower_value,
+        "relevance_upper_value": config.relevance_upper_value,
+        "scoring_mode": config.llm_client_config.scoring_mode,
+        "self_consistency_mode": config.llm_client_config.self_consistency_mode,
+        "number_consistency_path": config.llm_client_config.number_consistency_path,
+    }
+
+
+def get_run_hash(run: str, kind: str, settings: Dict) -> str:
+    """
+    Hash the files of a run together with the settings of its evaluation.
+
+    :param run: Folder of the run.
+    :param kind: Kind of the metrics ("ranking" or "tie_expected").
+    :param settings: Settings of the evaluation (get_evaluation_settings).
+    :return: SHA-256 hash of the files and the settings.
+    """
+    files_hash = hash_files(get_run_files(run, kind, settings["is_lm_only"]))
+    return hashlib.sha256((files_hash + json.dumps(settings, sort_keys=True)).encode("utf-8")).hexdigest()
+
+
+def evaluate_run(run: str, folder_path_slrs: str, config: Config, kind: str, is_lm_only: bool) -> Optional[Dict]:
+    """
+    Compute the metrics of one run.
+
+    :param run: Folder of the run.
+    :param folder_path_slrs: Folder of the csv files of the SLRs (with the labels of the papers).
+    :param config: Configuration object.
+    :param kind: Kind of the metrics ("ranking" or "tie_expected").
+    :param is_lm_only: Whether the run is of a language model only.
+    :return: Metrics of the run: evaluate_rankings of its ranking or the expected reported metrics of random tie-breaking (None if the SLR has no relevant papers).
+    """
+    if config.folder_path_slrs != folder_path_slrs:
+        config = copy.deepcopy(config)
+        config.folder_path_slrs = folder_path_slrs
+    slr_name = extract_prefix(run)
+    slr_df = get_data_provider(config).create_dataframe(f"{slr_name}.csv")
+    if kind == "tie_expected":
+        return get_expected_tar_metrics_of_ranking(slr_name, *create_tie_group_ranking_of_run(run, slr_df, config))
+    return evaluate_rankings(2, [(slr_name, *create_ranking_of_run(run, slr_df, config, is_lm_only))])
+
+
+def init_worker(config: Config, kind: str, is_lm_only: bool) -> None:
+    """
+    Initialize a worker process.
+
+    :param config: Configuration object.
+    :param kind: Kind of the metrics.
+    :param is_lm_only: Whether the runs are of a language model only.
+    """
+    worker_state["config"] = config
+    worker_state["kind"] = kind
+    worker_state["is_lm_only"] = is_lm_only
+
+
+def evaluate_run_in_worker(index: int, run: str, folder_path_slrs: str) -> Tuple[int, Optional[Dict]]:
+    """
+    Compute the metrics of one run in a worker process.
+
+    :param index: Index of the run.
+    :param run: Folder of the run.
+    :param folder_path_slrs: Folder of the csv files of the SLRs.
+    :return: Index and metrics of the run.
+    """
+    return index, evaluate_run(run, folder_path_slrs, worker_state["config"], worker_state["kind"], worker_state["is_lm_only"])
+
+
+def evaluate_runs(runs: List[Tuple[str, str]], config: Config, kind: str = "ranking", is_lm_only: bool = False, num_workers: int = 1,
+                  cache_path: Optional[str] = DEFAULT_METRICS_CACHE_PATH) -> List[Optional[Dict]]:
+    """
+    Compute the metrics of several runs. The metrics are cached by the hash of the files of each run and the settings of the evaluation (e.g., is_lm_only and the scale)
+    and the hash of the csv file of its SLR (labels), so that only new or changed runs are evaluated; with more than one worker, these runs are distributed to a pool of processes. Each run is evaluated on its own,
+    the metrics of an experiment are the macro-average of the metrics of its runs (get_tar_metrics_from_run_metrics or average_expected_tar_metrics).
+
+    :param runs: List of (folder of the run, folder of the csv files of the SLRs) tuples.
+    :param config: Configuration object.
+    :param kind: Kind of the metrics ("ranking" or "tie_expected").
+    :param is_lm_only: Whether the runs are of a language model only.
+    :param num_workers: Number of worker processes (1 to evaluate the runs in the current process).
+    :param cache_path: Path to the SQLite database of the metrics cache (None to evaluate all runs without cache).
+    :return: Metrics of each run.
+    """
+    cache = MetricsCache(cache_path) if cache_path is not None else None
+    qrels_hashes = {}
+    keys = []
+    for run, folder_path_slrs in runs:
+        slr_file_path = f"{folder_path_slrs}{extract_prefix(run)}.csv"
+        if slr_file_path not in qrels_hashes:
+            qrels_hashes[slr_file_path] = hash_files([slr_file_path])
+        keys.append((get_run_hash(run, kind, get_evaluation_settings(config, folder_path_slrs, is_lm_only)), qrels_hashes[slr_file_path]))
+    found = cache.get_metrics(kind, keys) if cache is not None else {}
+    results = [found.get(key) for key in keys]
+    missing = [i for i, key in enumerate(keys) if key not in found]
+    print(f"Evaluating {len(missing)} of {len(runs)} runs ({len(runs) - len(missing)} cached) ...")
+
+    def store(index: int, metrics: Optional[Dict]) -> None:
+        results[index] = metrics
+        if cache is not None:
+            cache.put_metrics(kind, keys[index], runs[index][0], metrics)
+
+    if num_workers <= 1 or len(missing) <= 1:
+        for i in missing:
+            store(i, evaluate_run(runs[i][0], runs[i][1], config, kind, is_lm_only))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(num_workers, len(missing)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(config, kind, is_lm_only),
+        ) as executor:
+            futures = [executor.submit(evaluate_run_in_worker, i, *runs[i]) for i in missing]
+            for future in as_completed(futures):
+                store(*future.result())
+    if cache is not None:
+        cache.print_statistics()
+    return results
@@ -0,0 +1,177 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import multiprocessing
+import pickle
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+import torch
+from implementation.src.client.reranker_registry import reranker_registry
+from implementation.src.config.config import Config
+from implementation.src.data.results_handler import ResultHandler
+from implementation.src.utils.data_utils import create_ranking_pointwise
+from implementation.src.utils.evaluation_utils import extract_prefix
+from implementation.src.utils.file_utils import load_json_file, save_ranked_df_with_reranker
+from implementation.src.utils.profiling import profiler
+
+# state of a worker process (configuration, shared SLR dataframes)
+worker_state: Dict = {}
+
+
+def rerank_run(run: str, config: Config, slr_df: pd.DataFrame) -> float:
+    """
+    Re-rank the papers of one run: load the log files, merge the abstracts, rank the papers with create_ranking_pointwise and save ranked_df.json.
+
+    :param run: Folder of the run.
+    :param config: Configuration object.
+    :param slr_df: Dataframe of the SLR (at least the columns abstract, id and title).
+    :return: Time of the ranking in seconds.
+    """
+    print(f"run: {run}")
+    slr_name = extract_prefix(run)
+    slr_infos_df = load_json_file(config.file_path_slr_infos)[slr_name]
+    run = run + "/"
+    result_handler = ResultHandler(
+        config=config,
+        folder_path=run,
+    )
+    file_names = [f for f in os.listdir(run) if re.match(r'log_file_\d+\.json', f)]
+    result_df = None
+    if len(file_names) == 1:
+        file_path = run + file_names[0]
+        result_df, _, _ = result_handler.process_json_to_dataframe(file_path)
+    else:
+        result_df, _ = result_handler.create_self_consistency_df(file_names)
+    if "abstract" not in result_df.columns:
+        abstracts = slr_df[["abstract", "id", "title"]]
+        result_df["id"] = result_df["id"].astype(int)
+        result_df = pd.merge(abstracts, result_df, on="id", validate="one_to_one")
+    start_time = time.time()
+    with profiler.span("ranking", items=len(result_df), slr=slr_name):
+        result_df = create_ranking_pointwise(result_df, slr_infos_df, config)
+    total_time = time.time() - start_time
+
+    save_ranked_df_with_reranker(result_df["id"].tolist(), config.llm_client_config.path_to_reranker, run + "ranked_df.json", config.llm_client_config.system_message_type, total_time)
+    return total_time
+
+
+def share_dataframes(dataframes: Dict[str, pd.DataFrame]) -> Tuple[List[shared_memory.SharedMemory], Dict[str, Tuple[str, int]]]:
+    """
+    Copy serialized dataframes into shared memory, so that worker processes do not have to parse the CSV files of the SLRs again.
+
+    :param dataframes: Dataframes by SLR name.
+    :return: Shared memory blocks (to be released by the caller) and the name and size of the block of each SLR.
+    """
+    blocks = []
+    specs = {}
+    for slr_name, dataframe in dataframes.items():
+        data = pickle.dumps(dataframe, protocol=pickle.HIGHEST_PROTOCOL)
+        block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        block.buf[:len(data)] = data
+        blocks.append(block)
+        specs[slr_name] = (block.name, len(data))
+    return blocks, specs
+
+
+def get_shared_dataframe(slr_name: str) -> pd.DataFrame:
+    """
+    Load the dataframe of an SLR from shared memory (once per worker).
+
+    :param slr_name: Name of the SLR.
+    :return: Dataframe of the SLR.
+    """
+    if slr_name not in worker_state["dataframes"]:
+        name, size = worker_state["specs"][slr_name]
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            # the block is owned (and unlinked) by the driver process
+            resource_tracker.unregister(block._name, "shared_memory")
+        except Exception:
+            pass
+        worker_state["dataframes"][slr_name] = pickle.loads(bytes(block.buf[:size]))
+        block.close()
+    return worker_state["dataframes"][slr_name]
+
+
+def init_worker(config: Config, specs: Dict[str, Tuple[str, int]], num_threads: int) -> None:
+    """
+    Initialize a worker process: limit the threads of PyTorch (to avoid oversubscription of the cores) and load the reranker once.
+
+    :param config: Configuration object.
+    :param specs: Name and size of the shared memory block of each SLR.
+    :param num_threads: Number of intra-op threads of the worker.
+    """
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    worker_state["config"] = config
+    worker_state["specs"] = specs
+    worker_state["dataframes"] = {}
+    reranker_registry.configure(config.llm_client_config.reranker_memory_budget_gb, config.llm_client_config.reranker_backend, config.llm_client_config.reranker_export_dir)
+    try:
+        reranker_registry.get(config.llm_client_config.path_to_reranker)
+    except Exception as e:
+        # create_ranking_pointwise reports the error and uses BM25 as fallback
+        print(f"Worker {os.getpid()} could not load reranker: {e}")
+
+
+def rerank_run_in_worker(run: str) -> Tuple[str, float, List[Dict]]:
+    """
+    Re-rank one run in a worker process.
+
+    :param run: Folder of the run.
+    :return: Folder of the run, time of the ranking and the profiler spans of the run.
+    """
+    profile_start = profiler.mark()
+    total_time = rerank_run(run, worker_state["config"], get_shared_dataframe(extract_prefix(run)))
+    # the spans are sent to the main process, the worker only keeps the spans of the current run
+    spans = profiler.get_spans(profile_start)
+    profiler.drop_spans(profile_start)
+    return run, total_time, spans
+
+
+def rerank_runs(runs: List[str], config: Config, data_provider, num_workers: int = 1, num_threads: Optional[int] = None) -> None:
+    """
+    Re-rank the papers of several runs. With more than one worker, the runs are distributed to a pool of processes; each worker keeps its reranker loaded,
+    uses a limited number of threads and reads the SLR dataframes from shared memory. The outputs are the same as when the runs are ranked one after another.
+    The workers configure the reranker registry in their initializer; if the runs are ranked in the current process, the caller configures it (once per process).
+
+    :param runs: Folders of the runs.
+    :param config: Configuration object.
+    :param data_provider: Data provider of the dataset.
+    :param num_workers: Number of worker processes (1 to rank the runs in the current process).
+    :param num_threads: Number of intra-op threads per worker (default: number of cores divided by number of workers).
+    """
+    slr_names = sorted(set(extract_prefix(run) for run in runs))
+    dataframes = {slr_name: data_provider.create_dataframe(f"{slr_name}.csv")[["abstract", "id", "title"]] for slr_name in slr_names}
+    if num_workers <= 1 or len(runs) <= 1:
+        for run in runs:
+            rerank_run(run, config, dataframes[extract_prefix(run)])
+        return
+
+    num_workers = min(num_workers, len(runs))
+    num_threads = num_threads if num_threads is not None else max(1, (os.cpu_count() or 1) // num_workers)
+    print(f"Re-ranking {len(runs)} runs with {num_workers} workers ({num_threads} threads each) ...")
+    blocks, specs = share_dataframes(dataframes)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(config, specs, num_threads),
+        ) as executor:
+            futures = [executor.submit(rerank_run_in_worker, run) for run in runs]
+            for future in as_completed(futures):
+                run, total_time, spans = future.result()
+                profiler.spans.extend(spans)
+                print(f"Finished {run} ({total_time:.2f}s)")
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
@@ -0,0 +1,153 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from implementation.src.utils.file_utils import save_to_json
+
+
+class Profiler:
+    def __init__(self) -> None:
+        """
+        Initialize the Profiler class. The profiler records spans (name, start, duration, number of items and tokens) of the stages of the pipeline,
+        so that the wall-clock time of a run can be broken down by stage. Spans before a saved profile are dropped, so that long sessions with many runs
+        do not accumulate all spans.
+        """
+        self.spans: List[Dict] = []
+        self.num_dropped_spans = 0
+        self.origin = time.perf_counter()
+        self.depth = threading.local()
+
+    @contextmanager
+    def span(self, name: str, items: Optional[int] = None, tokens: Optional[int] = None, **metadata) -> Iterator[Dict]:
+        """
+        Record the duration of a stage. The yielded span can be updated inside the block (e.g., with the number of tokens that are only known afterwards).
+
+        :param name: Name of the stage.
+        :param items: Number of processed items (e.g., prompts or documents).
+        :param tokens: Number of processed tokens.
+        :param metadata: Further information that is stored with the span.
+        :return: Span dictionary.
+        """
+        depth = getattr(self.depth, "value", 0)
+        self.depth.value = depth + 1
+        span = {
+            "name": name,
+            "start": time.perf_counter() - self.origin,
+            "duration": 0.0,
+            "items": items,
+            "tokens": tokens,
+            "depth": depth,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            **metadata,
+        }
+        try:
+            yield span
+        finally:
+            span["duration"] = time.perf_counter() - self.origin - span["start"]
+            self.depth.value = depth
+            self.spans.append(span)
+
+    def mark(self) -> int:
+        """
+        Get a marker of the current position in the recorded spans (used to summarize only the spans of one run).
+
+        :return: Number of recorded spans (including dropped spans, so that markers stay valid when spans are dropped).
+        """
+        return self.num_dropped_spans + len(self.spans)
+
+    def get_spans(self, start: int = 0) -> List[Dict]:
+        """
+        Get the recorded spans from a marker on.
+
+        :param start: Marker of the first span that should be included (spans that were already dropped are skipped).
+        :return: List of spans.
+        """
+        return self.spans[max(start - self.num_dropped_spans, 0):]
+
+    def drop_spans(self, end: int) -> None:
+        """
+        Drop the recorded spans before a marker.
+
+        :param end: Marker of the first span that is kept.
+        """
+        num_spans = min(max(end - self.num_dropped_spans, 0), len(self.spans))
+        del self.spans[:num_spans]
+        self.num_dropped_spans += num_spans
+
+    def summarize(self, start: int = 0) -> Dict[str, Dict]:
+        """
+        Summarize the recorded spans by stage.
+
+        :param start: Marker of the first span that should be included.
+        :return: Dictionary with count, total time, items, tokens and throughput of each stage.
+        """
+        spans = self.get_spans(start)
+        wall_time = 0.0
+        if len(spans) > 0:
+            wall_time = max(span["start"] + span["duration"] for span in spans) - min(span["start"] for span in spans)
+        summary = {}
+        for span in spans:
+            stage = summary.setdefault(span["name"], {"count": 0, "total_time": 0.0, "items": None, "tokens": None})
+            stage["count"] += 1
+            stage["total_time"] += span["duration"]
+            for key in ["items", "tokens"]:
+                if span[key] is not None:
+                    stage[key] = (stage[key] or 0) + span[key]
+        for stage in summary.values():
+            stage["items_per_second"] = stage["items"] / stage["total_time"] if stage["items"] is not None and stage["total_time"] > 0 else None
+            stage["tokens_per_second"] = stage["tokens"] / stage["total_time"] if stage["tokens"] is not None and stage["total_time"] > 0 else None
+            stage["share_of_wall_time"] = stage["total_time"] / wall_time if wall_time > 0 else None
+        return summary
+
+    def print_summary(self, start: int = 0) -> None:
+        """
+        Print the summary of the recorded spans.
+
+        :param start: Marker of the first span that should be included.
+        """
+        for name, stage in sorted(self.summarize(start).items(), key=lambda item: -item[1]["total_time"]):
+            throughput = f", {stage['items_per_second']:.1f} items/s" if stage["items_per_second"] is not None else ""
+            throughput += f", {stage['tokens_per_second']:.1f} tokens/s" if stage["tokens_per_second"] is not None else ""
+            print(f"{name}: {stage['total_time']:.2f}s ({stage['count']} spans{throughput})")
+
+    def save_profile(self, file_name: str, output_dir: str, start: int = 0) -> None:
+        """
+        Save the summary and the spans to a JSON file. The spans before the start marker are dropped afterwards, as they belong to profiles
+        that were already saved (the spans of the saved profile are kept, e.g. for export_chrome_trace).
+
+        :param file_name: Name of the profile file.
+        :param output_dir: Output directory.
+        :param start: Marker of the first span that should be included.
+        """
+        save_to_json({"summary": self.summarize(start), "spans": self.get_spans(start)}, file_name, output_dir)
+        self.drop_spans(start)
+
+    def export_chrome_trace(self, file_name: str, output_dir: str, start: int = 0) -> None:
+        """
+        Export the spans in the Chrome trace event format (can be opened with chrome://tracing or Perfetto).
+
+        :param file_name: Name of the trace file.
+        :param output_dir: Output directory.
+        :param start: Marker of the first span that should be included.
+        """
+        events = []
+        for span in self.get_spans(start):
+            args = {key: value for key, value in span.items() if key not in ["name", "start", "duration", "pid", "tid", "depth"] and value is not None}
+            events.append({
+                "name": span["name"],
+                "ph": "X",
+                "ts": span["start"] * 1e6,
+                "dur": span["duration"] * 1e6,
+                "pid": span["pid"],
+                "tid": span["tid"],
+                "args": args,
+            })
+        save_to_json({"traceEvents": events, "displayTimeUnit": "ms"}, file_name, output_dir)
+
+
+# profiler that is shared by all stages of the pipeline
+profiler = Profiler()
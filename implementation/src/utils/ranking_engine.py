@@ -0,0 +1,158 @@
+import sys
+import os
+sys.path.append(os.getcwd())
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from implementation.src.client.baseline_client import BaselineClient
+from implementation.src.client.score_cache import RerankerScoreCache
+from implementation.src.utils.bm25_index import BM25Index, get_bm25_index
+from implementation.src.utils.profiling import profiler
+
+
+class ScoreSource(ABC):
+    # True if the score of a paper depends on the other papers that are scored together (e.g., BM25 statistics); such sources are applied to each tie group separately
+    groupwise = False
+
+    @abstractmethod
+    def get_scores(self, query: str, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Compute the scores of the papers (higher scores are ranked first).
+
+        :param query: Query of the SLR.
+        :param dataframe: Dataframe of the papers that should be scored.
+        :return: Array with one score per paper.
+        """
+        pass
+
+
+class RerankerScoreSource(ScoreSource):
+    def __init__(self, client: BaselineClient, batch_size: int = 32, score_cache: Optional[RerankerScoreCache] = None) -> None:
+        """
+        Initialize the RerankerScoreSource class. The scores are derived from the order of get_ranked_ids of the client, so that the order of the client
+        (e.g., ascending for monoBERT) is preserved and papers with equal scores keep their order.
+
+        :param client: Reranker client.
+        :param batch_size: Batch size of the reranker.
+        :param score_cache: Optional cache of reranker scores (only the papers that are not cached are scored).
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.score_cache = score_cache
+
+    def get_scores(self, query: str, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Compute the scores of the papers in one batched pass of the reranker.
+
+        :param query: Query of the SLR.
+        :param dataframe: Dataframe of the papers that should be scored.
+        :return: Array with one score per paper.
+        """
+        documents = [str(row["title"]) + " " + str(row["abstract"]) for _, row in dataframe.iterrows()]
+        doc_ids = dataframe["id"].apply(str).to_list()
+        relevance_scores = self.client.get_cached_relevance_scores(query=query, documents=documents, doc_ids=doc_ids, batch_size=self.batch_size, score_cache=self.score_cache)
+        ranked_positions = self.client.get_ranked_ids(relevance_scores, list(range(len(documents))))
+        scores = np.empty(len(documents))
+        scores[np.asarray(ranked_positions, dtype=int)] = -np.arange(len(documents))
+        return scores
+
+
+class BM25ScoreSource(ScoreSource):
+    def __init__(self, dataframe: pd.DataFrame, index_root: Optional[str] = None) -> None:
+        """
+        Initialize the BM25ScoreSource class. The abstracts of all papers of the SLR are indexed once (on first use), and the papers of the tie groups are scored against this index.
+
+        :param dataframe: Dataframe of all papers of the SLR.
+        :param index_root: Directory of the saved BM25 indexes (None to keep the index only in memory).
+        """
+        self.ids = dataframe["id"].astype(str).to_list()
+        self.abstracts = dataframe["abstract"].astype(str).to_list()
+        self.index_root = index_root
+        self.index: Optional[BM25Index] = None
+
+    def get_scores(self, query: str, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Compute the BM25 scores of the abstracts of the papers.
+
+        :param query: Query of the SLR.
+        :param dataframe: Dataframe of the papers that should be scored.
+        :return: Array with one score per paper.
+        """
+        if self.index is None:
+            self.index = get_bm25_index(self.ids, self.abstracts, self.index_root)
+        return self.index.get_scores(query, dataframe["id"].astype(str).to_list())
+
+
+class ColumnScoreSource(ScoreSource):
+    def __init__(self, column: str) -> None:
+        """
+        Initialize the ColumnScoreSource class, which uses precomputed scores of a column of the result dataframe (e.g., scores of another ranker).
+
+        :param column: Name of the column.
+        """
+        self.column = column
+
+    def get_scores(self, query: str, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Get the scores of the papers from the column.
+
+        :param query: Query of the SLR (not used).
+        :param dataframe: Dataframe of the papers that should be scored.
+        :return: Array with one score per paper.
+        """
+        return dataframe[self.column].astype(float).to_numpy()
+
+
+def rank_with_tie_breaking(
+    result_df: pd.DataFrame,
+    query: str,
+    score_sources: List[ScoreSource],
+    fallback_source: Optional[ScoreSource] = None,
+    score_column: str = "relevance_of_paper",
+) -> pd.DataFrame:
+    """
+    Rank papers by their LLM score and break ties with secondary score sources. Only papers that share their LLM score with other papers are scored.
+    Non-groupwise sources score all of them in one pass, and the final order is computed with one lexsort on (LLM score desc, secondary scores desc, original position).
+
+    :param result_df: Result dataframe (unsorted).
+    :param query: Query of the SLR.
+    :param score_sources: Secondary score sources in the order of their priority.
+    :param fallback_source: Score source that replaces the secondary sources if one of them fails.
+    :param score_column: Column with the LLM score.
+    :return: Dataframe that is sorted by relevance (descending).
+    """
+    primary = result_df[score_column].astype(float).to_numpy()
+    positions = np.arange(len(result_df))
+    # papers of tie groups, in the order of the stable sort by LLM score
+    order = np.argsort(-primary, kind="stable")
+    group_sizes = result_df.groupby(score_column)[score_column].transform("size").to_numpy()
+    tied = order[group_sizes[order] > 1]
+
+    def compute_keys(sources: List[ScoreSource]) -> List[np.ndarray]:
+        keys = []
+        for source in sources:
+            key = np.zeros(len(result_df))
+            if len(tied) > 0:
+                with profiler.span("tie_breaking", items=len(tied), source=type(source).__name__):
+                    if source.groupwise:
+                        for value in np.unique(primary[tied]):
+                            group = tied[primary[tied] == value]
+                            key[group] = source.get_scores(query, result_df.iloc[group])
+                    else:
+                        key[tied] = source.get_scores(query, result_df.iloc[tied])
+            keys.append(key)
+        return keys
+
+    try:
+        keys = compute_keys(score_sources)
+    except Exception as e:
+        if fallback_source is None:
+            raise
+        print(f"Error: {e}")
+        print(f"Secondary score source failed; {type(fallback_source).__name__} will be used as fallback.")
+        keys = compute_keys([fallback_source])
+
+    # np.lexsort sorts by the last key first
+    ranking = np.lexsort([positions] + [-key for key in reversed(keys)] + [-primary])
+    return result_df.iloc[ranking]
@@ -1,6 +1,8 @@
 import os
+import re
 import sys
 sys.path.append(os.getcwd())
+import numpy as np
 import pandas as pd
 from implementation.src.data.results_handler import ResultHandler
 from implementation.src.config.config_loader import ConfigLoader
@@ -10,13 +12,20 @@ from implementation.src.data.tar_data_provider import TarDataProvider
 from implementation.src.utils.evaluation_utils import extract_prefix
 from implementation.src.utils.file_utils import load_json_file, scan_folder_for_csv
 from implementation.src.config.config import Config
-from implementation.src.scripts_tar.tar_eval_2018 import main
+from typing import Dict, List, Optional, Tuple
+from implementation.src.scripts_tar.measures.vectorized_measures_2018 import compute_task2_expected_measures, compute_task2_measures_of_permutations
+from implementation.src.scripts_tar.tar_eval_2018 import average_metrics, evaluate_rankings, main
+from implementation.src.utils.profiling import profiler
 
 CONFIG_PATH = "config.json"
 
-def get_tar_metrics(label_file_path: str, result_file_path: str):
-    metric_dict = main(2, results_file=result_file_path, qrel_file=label_file_path)
+def select_tar_metrics(metric_dict):
+    """
+    Select the reported metrics (in percent) from the metrics of the CLEF TAR evaluation.
 
+    :param metric_dict: Macro-averaged metrics of tar_eval_2018.
+    :return: Dictionary of the reported metrics.
+    """
     # filter out metrics that we want
     metrics = {
         "MAP": metric_dict["ap"] * 100,
@@ -31,31 +40,244 @@ def get_tar_metrics(label_file_path: str, result_file_path: str):
     }
     return metrics
 
+def get_tar_metrics(label_file_path: str, result_file_path: str):
+    with profiler.span("metric_computation"):
+        metric_dict = main(2, results_file=result_file_path, qrel_file=label_file_path)
+    return select_tar_metrics(metric_dict)
+
+def get_tar_metrics_from_rankings(rankings: List[Tuple[str, List, List]]):
+    """
+    Compute the metrics of rankings in memory (same metrics as get_tar_metrics for the TREC files of the rankings).
+
+    :param rankings: List of (slr name, ranked document ids, labels of the documents) tuples.
+    :return: Dictionary of the reported metrics.
+    """
+    with profiler.span("metric_computation", items=sum(len(doc_ids) for _, doc_ids, _ in rankings)):
+        metric_dict = evaluate_rankings(2, rankings)
+    return select_tar_metrics(metric_dict)
+
+def get_tar_metrics_from_run_metrics(run_metrics: List[Dict]):
+    """
+    Compute the metrics of several runs from the metrics of each run (evaluate_rankings of the ranking of the run), e.g., loaded from the metrics cache.
+    The metrics are the same as get_tar_metrics_from_rankings for the rankings of all runs.
+
+    :param run_metrics: List of the metric dictionaries of the runs.
+    :return: Dictionary of the reported metrics.
+    """
+    return select_tar_metrics(average_metrics(run_metrics))
+
+def get_tar_metrics_of_permutations(rankings: List[Tuple[str, List, List]], num_permutations: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Compute the metrics of random permutations of rankings within their tie groups (random tie-breaking), all permutations of an SLR at once.
+
+    :param rankings: List of (slr name, labels of the ranked documents, tie group of each ranked document) tuples.
+    :param num_permutations: Number of permutations of each ranking.
+    :param seed: Seed of the random number generator.
+    :return: Dictionary with an array of each reported metric (one value per permutation, macro-averaged over the SLRs; empty if all SLRs are skipped).
+    """
+    all_metrics = []
+    with profiler.span("metric_computation", items=num_permutations * sum(len(labels) for _, labels, _ in rankings)):
+        for i, (slr_name, labels, groups) in enumerate(rankings):
+            topic = get_evaluated_topic(slr_name, labels, groups)
+            if topic is not None:
+                measures = compute_task2_measures_of_permutations(*topic, num_permutations, seed + i)
+                all_metrics.append(select_tar_metrics(measures))
+    if len(all_metrics) == 0:
+        return {}
+    return {key: np.mean([metrics[key] for metrics in all_metrics], axis=0) for key in all_metrics[0]}
+
+def get_expected_tar_metrics(rankings: List[Tuple[str, List, List]]):
+    """
+    Compute the expected metrics of rankings whose papers are ordered randomly within their tie groups (e.g., papers with the same LLM relevance),
+    in closed form without sampling. This is the baseline of a random reranker for the tie groups of a run.
+
+    :param rankings: List of (slr name, labels of the ranked documents, tie group of each ranked document) tuples.
+    :return: Dictionary of the reported metrics (expected values, macro-averaged over the SLRs).
+    """
+    all_metrics = []
+    with profiler.span("metric_computation", items=sum(len(labels) for _, labels, _ in rankings)):
+        for slr_name, labels, groups in rankings:
+            all_metrics.append(get_expected_tar_metrics_of_ranking(slr_name, labels, groups))
+    return average_expected_tar_metrics(all_metrics)
+
+def get_expected_tar_metrics_of_ranking(slr_name: str, labels: List, groups: List) -> Optional[Dict]:
+    """
+    Compute the expected metrics of one ranking whose papers are ordered randomly within their tie groups.
+
+    :param slr_name: Name of the SLR.
+    :param labels: Labels of the ranked documents.
+    :param groups: Tie group of each ranked document.
+    :return: Dictionary of the reported metrics (None if the SLR has no relevant documents).
+    """
+    topic = get_evaluated_topic(slr_name, labels, groups)
+    if topic is None:
+        return None
+    return select_tar_metrics(compute_task2_expected_measures(*topic))
+
+def average_expected_tar_metrics(all_metrics: List[Optional[Dict]]):
+    """
+    Macro-average the expected metrics of rankings.
+
+    :param all_metrics: List of the expected metrics of the rankings (None for skipped SLRs).
+    :return: Dictionary of the averaged metrics (empty if all SLRs are skipped).
+    """
+    all_metrics = [metrics for metrics in all_metrics if metrics is not None]
+    if len(all_metrics) == 0:
+        return {}
+    return {key: sum(metrics[key] for metrics in all_metrics) / len(all_metrics) for key in all_metrics[0]}
+
+def get_evaluated_topic(slr_name: str, labels: List, groups: List):
+    """
+    Get the judgements and tie groups of the documents of a ranking that are evaluated, with the same document counts as tar_eval_2018
+    (documents judged with 3 or more are not evaluated, documents judged with -1 are not counted).
+
+    :param slr_name: Name of the SLR.
+    :param labels: Labels of the ranked documents.
+    :param groups: Tie group of each ranked document.
+    :return: Judgements, tie groups, number of documents and number of relevant documents (None if the SLR has no relevant documents).
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    groups = np.asarray(groups)
+    num_docs = len(labels) - int(((labels == -1) | (labels > 2)).sum())
+    num_rels = int(((labels == 1) | (labels == 2)).sum())
+    if num_rels == 0:
+        print(f"Skipping topic: {slr_name}")
+        return None
+    evaluated = labels < 3
+    return labels[evaluated], groups[evaluated], num_docs, num_rels
+
+def summarize_permutation_metrics(metrics: Dict[str, np.ndarray], percentiles: Tuple[float, float] = (2.5, 97.5)) -> pd.DataFrame:
+    """
+    Summarize the metrics of permutations by their mean and percentile interval.
+
+    :param metrics: Dictionary with an array of each metric (one value per permutation).
+    :param percentiles: Lower and upper percentile of the interval.
+    :return: Dataframe with the rows mean, std and the percentiles and a column per metric.
+    """
+    summary = {
+        "mean": {key: float(np.mean(values)) for key, values in metrics.items()},
+        "std": {key: float(np.std(values)) for key, values in metrics.items()},
+    }
+    for percentile in percentiles:
+        summary[f"p{percentile:g}"] = {key: float(np.percentile(values, percentile)) for key, values in metrics.items()}
+    return pd.DataFrame(summary).T
+
 def write_to_output_file(folder_path: str, data_results, data_label):
-    res_file_path = f'{folder_path}output.res'
-    with open(res_file_path, 'w') as file:
-        for line in data_results:
-            file.write(line + '\n')
-    label_file_path = f'{folder_path}label_file'
-    with open(label_file_path, "w") as file:
-        for line in data_label:
-            file.write(line + '\n')
+    with profiler.span("trec_file_writing", items=len(data_results)):
+        res_file_path = f'{folder_path}output.res'
+        with open(res_file_path, 'w') as file:
+            for line in data_results:
+                file.write(line + '\n')
+        label_file_path = f'{folder_path}label_file'
+        with open(label_file_path, "w") as file:
+            for line in data_label:
+                file.write(line + '\n')
     return res_file_path, label_file_path
 
-def create_tar_output_files(folder_path: str, config: Config, is_lm_only: bool):
+def write_rankings_to_output_file(folder_path: str, rankings: List[Tuple[str, List, List]]):
     """
-    Create the output.res and label_file files for the TREC Ad-hoc Retrieval track evaluation.
+    Write rankings to the output.res and label_file files for the TREC Ad-hoc Retrieval track evaluation.
+
+    :param folder_path: The path to the folder of the files.
+    :param rankings: List of (slr name, ranked document ids, labels of the documents) tuples.
+    :return: The paths to the output.res and label_file files.
+    """
+    data_results, data_label = [], []
+    for slr_name, doc_ids, labels in rankings:
+        for i, (doc_id, label) in enumerate(zip(doc_ids, labels)):
+            data_results.append(f"{slr_name} 0 {doc_id} {i + 1} {float(-(i + 1))} pubmed")
+            data_label.append(f"{slr_name} 0 {doc_id} {label}")
+    return write_to_output_file(folder_path, data_results, data_label)
+
+def create_ranking_of_run(run: str, slr_df: pd.DataFrame, config: Config, is_lm_only: bool) -> Tuple[List, List]:
+    """
+    Load the ranked papers of a run and their labels.
+
+    :param run: Folder of the run.
+    :param slr_df: Dataframe of the SLR (at least the columns id and label).
+    :param config: The configuration object.
+    :param is_lm_only: Whether the evaluation is of runs with only language models.
+    :return: The ranked document ids and their labels.
+    """
+    result_df = None
+    if is_lm_only:
+        json_file_path = run + "/logfile.json"
+        result_handler = ResultHandler(config=config, folder_path=run)
+        result_df = result_handler.process_ranked_df_json_to_df(json_file_path)
+    else:
+        json_file_path = run + "/" + "ranked_df.json"
+        json_data = load_json_file(json_file_path)
+        result_df = pd.DataFrame(json_data["ids"], columns=["id"])
+    result_df["id"] = result_df["id"].apply(int)
+    slr_df_sub = pd.merge(result_df["id"], slr_df, on="id", how="left", validate="one_to_one")
+    return slr_df_sub["id"].to_list(), slr_df_sub["label"].to_list()
+
+def create_tie_group_ranking_of_run(run: str, slr_df: pd.DataFrame, config: Config) -> Tuple[List, List]:
+    """
+    Load the ranking of the LLM of a run (papers sorted by their relevance), the labels of the papers and their tie groups (papers with the same relevance).
+
+    :param run: Folder of the run.
+    :param slr_df: Dataframe of the SLR (at least the columns abstract, id and title).
+    :param config: The configuration object.
+    :return: The labels and the relevance (tie group) of the ranked papers.
+    """
+    run = run + "/"
+    result_handler = ResultHandler(
+        config=config,
+        folder_path=run,
+    )
+    file_names = [f for f in os.listdir(run) if re.match(r'log_file_\d+\.json', f)]
+    result_df = None
+    if len(file_names) == 1:
+        file_path = run + file_names[0]
+        result_df, _, _ = result_handler.process_json_to_dataframe(file_path)
+    else:
+        result_df, _ = result_handler.create_self_consistency_df(file_names)
+    if "abstract" not in result_df.columns:
+        abstracts = slr_df[["abstract", "id", "title"]]
+        result_df["id"] = result_df["id"].astype(int)
+        result_df = pd.merge(abstracts, result_df, on="id", validate="one_to_one")
+    result_df["relevance_of_paper"] = result_df["relevance_of_paper"].astype(float)
+
+    result_df.loc[result_df["relevance_of_paper"] == -1, "relevance_of_paper"] = result_df["relevance_of_paper"].mean()
+    result_df = result_df.sort_values(by="relevance_of_paper", ascending=False, kind="mergesort") # use stable sort
+    return result_df["ground_truth"].to_list(), result_df["relevance_of_paper"].to_list()
+
+def create_tie_group_rankings(folder_path: str, config: Config) -> List[Tuple[str, List, List]]:
+    """
+    Create the LLM rankings of the runs of a folder with their tie groups, e.g., for the expected metrics of random tie-breaking.
+
+    :param folder_path: The path to the folder containing the runs.
+    :param config: The configuration object.
+    :return: List of (slr name, labels of the ranked papers, tie group of each ranked paper) tuples.
+    """
+    sub_folder_paths = [f.path.replace("\\", "/") for f in os.scandir(folder_path) if f.is_dir()]
+    rankings = []
+    data_provider = SynergyDataProvider(config)
+    if "tar2019" in config.folder_path_slrs:
+        data_provider = TarDataProvider(config)
+    elif "guo" in config.folder_path_slrs:
+        data_provider = GuoDataProvider(config)
+    for run in sub_folder_paths:
+        slr_name = extract_prefix(run)
+        slr_df = data_provider.create_dataframe(f"{slr_name}.csv")
+        rankings.append((slr_name, *create_tie_group_ranking_of_run(run, slr_df, config)))
+    return rankings
+
+def create_tar_rankings(folder_path: str, config: Config, is_lm_only: bool) -> List[Tuple[str, List, List]]:
+    """
+    Create the rankings of the runs of a folder for the evaluation.
 
     :param folder_path: The path to the folder containing the runs (folder which contains runs of which the results should be averaged).
     :param config: The configuration object.
     :param is_lm_only: Whether the evaluation is of runs with only language models.
-    :return: The paths to the output.res and label_file files.
+    :return: List of (slr name, ranked document ids, labels of the documents) tuples.
     """
     # load and validate config
     config_loader = ConfigLoader(CONFIG_PATH)
     config = config_loader.config
     sub_folder_paths = [f.path.replace("\\", "/") for f in os.scandir(folder_path) if f.is_dir()]
-    data_results, data_label = [], []
+    rankings = []
     data_provider = SynergyDataProvider(config)
     if "tar2019" in config.folder_path_slrs:
         data_provider = TarDataProvider(config)
@@ -66,33 +288,31 @@ def create_tar_output_files(folder_path: str, config: Config, is_lm_only: bool):
         slr_name = extract_prefix(run)
         slr_df = data_provider.create_dataframe(f"{slr_name}.csv")
         # load the dataset (potential relevant papers for the SLR)
-        result_df = None
-        if is_lm_only:
-            json_file_path = run + "/logfile.json"
-            result_handler = ResultHandler(config=config, folder_path=run)
-            result_df = result_handler.process_ranked_df_json_to_df(json_file_path)
-        else:
-            json_file_path = run + "/" + "ranked_df.json"
-            json_data = load_json_file(json_file_path)
-            result_df = pd.DataFrame(json_data["ids"], columns=["id"])
-        result_df["id"] = result_df["id"].apply(int)
-        slr_df_sub = pd.merge(result_df["id"], slr_df, on="id", how="left", validate="one_to_one")
-        for i in range(len(slr_df_sub)):
-            data_results.append(f"{slr_name} 0 {slr_df_sub.iloc[i]["id"]} {i + 1} {float(-(i + 1))} pubmed")
-            data_label.append(f"{slr_name} 0 {slr_df_sub.iloc[i]["id"]} {slr_df_sub.iloc[i]["label"]}")
-    return write_to_output_file(folder_path, data_results, data_label)
+        rankings.append((slr_name, *create_ranking_of_run(run, slr_df, config, is_lm_only)))
+    return rankings
 
+def create_tar_output_files(folder_path: str, config: Config, is_lm_only: bool):
+    """
+    Create the output.res and label_file files for the TREC Ad-hoc Retrieval track evaluation.
 
-def create_tar_output_files_random_all_tar_slrs(folder_path: str, seed: int, config: Config):
+    :param folder_path: The path to the folder containing the runs (folder which contains runs of which the results should be averaged).
+    :param config: The configuration object.
+    :param is_lm_only: Whether the evaluation is of runs with only language models.
+    :return: The paths to the output.res and label_file files.
     """
-    Create the output.res and label_file files for the TREC Ad-hoc Retrieval track evaluation of a random baseline. Each file of the folder will occur once in the created output files.
+    return write_rankings_to_output_file(folder_path, create_tar_rankings(folder_path, config, is_lm_only))
+
+def create_tar_rankings_random_all_tar_slrs(folder_path: str, seed: int, config: Config) -> List[Tuple[str, List, List]]:
+    """
+    Create random rankings of the SLRs of all subfolders (datasets) of a folder. Each file of the folders will occur once in the rankings.
 
     :param folder_path: Path to the folder containing the csv files of the slr or a dataset collection.
     :param seed: seed for shuffling the documents in each slr dataframe.
     :param config: The configuration object.
+    :return: List of (slr name, ranked document ids, labels of the documents) tuples.
     """
     subfolder_paths = [f.path.replace("\\", "/") for f in os.scandir(folder_path) if f.is_dir()]
-    data_results, data_label = [], []
+    rankings = []
     for subfolder in subfolder_paths:
         subfolder = subfolder + "/"
         files = scan_folder_for_csv(folder_path=subfolder)
@@ -101,12 +321,10 @@ def create_tar_output_files_random_all_tar_slrs(folder_path: str, seed: int, con
             data_provider = TarDataProvider(config)
             slr_df = data_provider.create_dataframe(file_name)
             slr_df = slr_df.sample(frac=1, random_state=seed).reset_index(drop=True)
-            for i in range(len(slr_df)):
-                data_results.append(f"{file_name.split(".csv")[0]} 0 {slr_df.iloc[i]["id"]} {i + 1} {float(-(i + 1))} pubmed")
-                data_label.append(f"{file_name.split(".csv")[0]} 0 {slr_df.iloc[i]["id"]} {slr_df.iloc[i]["label"]}")
-    return write_to_output_file(folder_path, data_results, data_label)
+            rankings.append((file_name.split(".csv")[0], slr_df["id"].to_list(), slr_df["label"].to_list()))
+    return rankings
 
-def create_tar_output_files_random(folder_path: str, seed: int, config: Config):
+def create_tar_output_files_random_all_tar_slrs(folder_path: str, seed: int, config: Config):
     """
     Create the output.res and label_file files for the TREC Ad-hoc Retrieval track evaluation of a random baseline. Each file of the folder will occur once in the created output files.
 
@@ -114,9 +332,20 @@ def create_tar_output_files_random(folder_path: str, seed: int, config: Config):
     :param seed: seed for shuffling the documents in each slr dataframe.
     :param config: The configuration object.
     """
+    return write_rankings_to_output_file(folder_path, create_tar_rankings_random_all_tar_slrs(folder_path, seed, config))
+
+def create_tar_rankings_random(folder_path: str, seed: int, config: Config) -> List[Tuple[str, List, List]]:
+    """
+    Create random rankings of the SLRs of a folder. Each file of the folder will occur once in the rankings.
+
+    :param folder_path: Path to the folder containing the csv files of the slr or a dataset collection.
+    :param seed: seed for shuffling the documents in each slr dataframe.
+    :param config: The configuration object.
+    :return: List of (slr name, ranked document ids, labels of the documents) tuples.
+    """
 
     files = scan_folder_for_csv(folder_path=folder_path)
-    data_results, data_label = [], []
+    rankings = []
     data_provider = SynergyDataProvider(config)
     if "tar2019" in config.folder_path_slrs:
         data_provider = TarDataProvider(config)
@@ -126,65 +355,93 @@ def create_tar_output_files_random(folder_path: str, seed: int, config: Config):
         file_name = os.path.basename(slr_paths)
         slr_df = data_provider.create_dataframe(file_name)
         slr_df = slr_df.sample(frac=1, random_state=seed).reset_index(drop=True)
-        for i in range(len(slr_df)):
-            data_results.append(f"{file_name.split(".csv")[0]} 0 {slr_df.iloc[i]["id"]} {i + 1} {float(-(i + 1))} pubmed")
-            data_label.append(f"{file_name.split(".csv")[0]} 0 {slr_df.iloc[i]["id"]} {slr_df.iloc[i]["label"]}")
-    return write_to_output_file(folder_path, data_results, data_label)
+        rankings.append((file_name.split(".csv")[0], slr_df["id"].to_list(), slr_df["label"].to_list()))
+    return rankings
 
-def create_tar_output_tar_slrs(folder_path: str, config: Config, label: str, is_lm_only: bool):
+def create_tar_output_files_random(folder_path: str, seed: int, config: Config):
     """
-    Create the output.res and label_file files for the TREC Ad-hoc Retrieval track evaluation.
+    Create the output.res and label_file files for the TREC Ad-hoc Retrieval track evaluation of a random baseline. Each file of the folder will occur once in the created output files.
+
+    :param folder_path: Path to the folder containing the csv files of the slr or a dataset collection.
+    :param seed: seed for shuffling the documents in each slr dataframe.
+    :param config: The configuration object.
+    """
+    return write_rankings_to_output_file(folder_path, create_tar_rankings_random(folder_path, seed, config))
+
+def create_tar_rankings_tar_slrs(folder_path: str, config: Config, label: str, is_lm_only: bool) -> List[Tuple[str, List, List]]:
+    """
+    Create the rankings of the runs with a label of all TAR datasets for the evaluation.
 
     :param folder_path: The path to the folder containing the runs (folder which contains runs of which the results should be averaged).
     :param config: The configuration object.
     :param label: The label of the subofolder.
     :param is_lm_only: Whether the evaluation is of runs with only language models.
-    :return: The paths to the output.res and label_file files.
+    :return: List of (slr name, ranked document ids, labels of the documents) tuples.
+    """
+    # load and validate config
+    config_loader = ConfigLoader(CONFIG_PATH)
+    config = config_loader.config
+    rankings = []
+    for run, folder_path_slrs in get_tar_slrs_runs(folder_path, label):
+        print(f"run: {run}")
+        slr_name = extract_prefix(run)
+        config.folder_path_slrs = folder_path_slrs
+
+        # initialization
+        data_provider = get_data_provider(config)
+        slr_df = data_provider.create_dataframe(f"{slr_name}.csv")
+        rankings.append((slr_name, *create_ranking_of_run(run, slr_df, config, is_lm_only)))
+    return rankings
+
+def get_tar_slrs_runs(folder_path: str, label: str) -> List[Tuple[str, str]]:
+    """
+    Get the runs with a label of all TAR datasets (subfolders of the folder, except synergy).
+
+    :param folder_path: The path to the folder containing a folder of runs for each dataset.
+    :param label: The label of the subfolder.
+    :return: List of (folder of the run, folder of the csv files of the SLRs of the dataset) tuples.
     """
     def get_label_folder(sub_folder_paths, label):
         for path in sub_folder_paths:
             if label in path:
                 return path
         return None
-    # load and validate config
-    config_loader = ConfigLoader(CONFIG_PATH)
-    config = config_loader.config
     dataset_dirs = [f.path.replace("\\", "/") for f in os.scandir(folder_path) if f.is_dir()]
-    data_results, data_label = [], []
+    runs = []
     for experiment in dataset_dirs:
+        if experiment.split("/")[-1] == "synergy":
+            continue
         sub_folder_paths = [f.path.replace("\\", "/") for f in os.scandir(experiment) if f.is_dir()]
         label_folder = get_label_folder(sub_folder_paths, label)
         sub_folder_paths = [f.path.replace("\\", "/") for f in os.scandir(label_folder) if f.is_dir()]
-        if experiment.split("/")[-1] == "synergy":
-            continue
-        for run in sub_folder_paths:
-            print(f"run: {run}")
-            slr_name = extract_prefix(run)
-            config.folder_path_slrs = "./implementation/data/tar2019/" + experiment.split("/")[-1] + "/"
-
-            # initialization
-            data_provider = SynergyDataProvider(config)
-            if "tar2019" in config.folder_path_slrs:
-                data_provider = TarDataProvider(config)
-            elif "guo" in config.folder_path_slrs:
-                data_provider = GuoDataProvider(config)
-            slr_df = data_provider.create_dataframe(f"{slr_name}.csv")
-            result_df = None
-
-            if is_lm_only:
-                json_file_path = run + "/logfile.json"
-                result_handler = ResultHandler(config=config, folder_path=run)
-                result_df = result_handler.process_ranked_df_json_to_df(json_file_path)
-            else:
-                json_file_path = run + "/" + "ranked_df.json"
-                json_data = load_json_file(json_file_path)
-                result_df = pd.DataFrame(json_data["ids"], columns=["id"])
-            result_df["id"] = result_df["id"].apply(int)
-            slr_df_sub = pd.merge(result_df["id"], slr_df, on="id", how="left", validate="one_to_one")
-            for i in range(len(slr_df_sub)):
-                data_results.append(f"{slr_name} 0 {slr_df_sub.iloc[i]["id"]} {i + 1} {float(-(i + 1))} pubmed")
-                data_label.append(f"{slr_name} 0 {slr_df_sub.iloc[i]["id"]} {slr_df_sub.iloc[i]["label"]}")
-    return write_to_output_file(folder_path, data_results, data_label)
+        runs.extend((run, "./implementation/data/tar2019/" + experiment.split("/")[-1] + "/") for run in sub_folder_paths)
+    return runs
+
+def get_data_provider(config: Config):
+    """
+    Get the data provider of the dataset of config.folder_path_slrs.
+
+    :param config: The configuration object.
+    :return: Data provider of the dataset.
+    """
+    data_provider = SynergyDataProvider(config)
+    if "tar2019" in config.folder_path_slrs:
+        data_provider = TarDataProvider(config)
+    elif "guo" in config.folder_path_slrs:
+        data_provider = GuoDataProvider(config)
+    return data_provider
+
+def create_tar_output_tar_slrs(folder_path: str, config: Config, label: str, is_lm_only: bool):
+    """
+    Create the output.res and label_file files for the TREC Ad-hoc Retrieval track evaluation.
+
+    :param folder_path: The path to the folder containing the runs (folder which contains runs of which the results should be averaged).
+    :param config: The configuration object.
+    :param label: The label of the subofolder.
+    :param is_lm_only: Whether the evaluation is of runs with only language models.
+    :return: The paths to the output.res and label_file files.
+    """
+    return write_rankings_to_output_file(folder_path, create_tar_rankings_tar_slrs(folder_path, config, label, is_lm_only))
 
 def remove_tar_output_files(res_file_path: str, label_file_path: str):
     """